@@ -0,0 +1,98 @@
+"""
+Write-behind ``UserDevice.last_seen``.
+
+Access tokens carry the session's device id (``did`` claim, see
+accounts.sessions). ``ClaimsJWTAuthentication`` puts it on the request and
+``ActivityMiddleware`` calls ``tracker.touch(did)`` once the response is
+ready. That is a dict assignment, with no query. A daemon thread flushes the
+latest timestamp per device every ``ACTIVITY_FLUSH_INTERVAL`` seconds with one
+``bulk_update``, so a busy device costs at most one UPDATE per interval
+(per process) instead of one per request.
+
+Timestamps not flushed yet are visible to ``list_devices`` in the same
+process through ``pending``; a crash loses at most one interval of activity.
+"""
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _interval() -> float:
+    return getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 60)
+
+
+class ActivityTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # device id -> latest activity
+        self._written = {}  # device id -> last flushed activity
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def touch(self, device_id, at=None) -> None:
+        at = at or timezone.now()
+        with self._lock:
+            written = self._written.get(device_id)
+            # Activity within the interval after the last write is not worth another UPDATE
+            if written is not None and at - written < timedelta(seconds=_interval()):
+                return
+            self._pending[device_id] = at
+            if self._thread is None:
+                self._start()
+
+    def pending(self, device_ids=None) -> dict:
+        with self._lock:
+            if device_ids is None:
+                return dict(self._pending)
+            return {pk: self._pending[pk] for pk in device_ids if pk in self._pending}
+
+    def flush(self) -> int:
+        """Write the pending timestamps now; returns the number of devices."""
+        from .models import UserDevice
+
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        UserDevice.objects.bulk_update(
+            [UserDevice(id=pk, last_seen=at) for pk, at in batch.items()], ['last_seen'], batch_size=500,
+        )
+        with self._lock:
+            self._written.update(batch)
+            # Forget devices idle for a while so the map stays bounded
+            cutoff = timezone.now() - timedelta(seconds=_interval() * 10)
+            self._written = {pk: at for pk, at in self._written.items() if at >= cutoff}
+        return len(batch)
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='activity-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self._shutdown)
+
+    def _run(self) -> None:
+        while not self._wakeup.wait(_interval()):
+            self._flush_safely()
+
+    def _flush_safely(self) -> None:
+        try:
+            close_old_connections()
+            self.flush()
+        except Exception:
+            logger.exception('Device activity flush failed')
+        finally:
+            # The flusher thread must not keep a connection open between runs
+            connection.close()
+
+    def _shutdown(self) -> None:
+        self._wakeup.set()
+        self._flush_safely()
+
+
+tracker = ActivityTracker()
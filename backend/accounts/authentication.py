@@ -0,0 +1,190 @@
+"""
+Access-token authentication without a user query per request.
+
+Tokens issued by ``ClaimsRefreshToken`` (login, registration, refresh) carry
+the fields most views need next to ``user_id``: ``email``, ``is_verified``,
+``two_factor_enabled``, ``is_staff``, ``is_active`` and the subscription
+``tier``. ``ClaimsJWTAuthentication`` turns them into a ``ClaimsUser`` (a
+proxy of ``User``) whose other fields are deferred: the first access to one
+of them loads the whole row once, so views that only filter by
+``request.user`` never touch the ``accounts_user`` table.
+
+Claims can go stale when the user row changes after the token was issued.
+Saving a claim field (or a subscription) stores a marker in the default
+cache; tokens issued before the marker are served from the row instead,
+which also makes deactivation effective immediately. The marker only reaches
+every process through a shared cache (``CACHE_REDIS_URL``): with a
+process-local one (locmem, the default) claims are not trusted and every
+request takes the row path, unless ``AUTH_TRUST_CLAIMS`` says otherwise
+(single process). Rows are kept in a small process-local cache
+(``AUTH_USER_CACHE_TTL`` seconds) that is dropped on ``User.save``/``delete``.
+Tokens without claims (issued before this backend) take the same path.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken, Token
+
+from aieducation.caching import shared_cache
+
+from .models import ClaimsUser, User
+
+# Bumped when the claim set changes; older tokens fall back to the row
+CLAIMS_VERSION = 1
+CLAIM_FIELDS = ('email', 'is_verified', 'two_factor_enabled', 'is_staff', 'is_active')
+FREE_TIER = 'free'
+STALE_KEY = 'auth:claims-stale:{user_id}'
+
+
+def subscription_tier(user_id) -> str:
+    """Name of the user's active subscription plan, ``'free'`` without one."""
+    from payments.models import UserSubscription
+
+    plan = (
+        UserSubscription.objects
+        .filter(user_id=user_id, is_active=True, end_date__gt=timezone.now())
+        .order_by('-end_date')
+        .values_list('plan__name', flat=True)
+        .first()
+    )
+    return plan or FREE_TIER
+
+
+def add_user_claims(token, user) -> None:
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    token['tier'] = subscription_tier(user.pk)
+    token['cv'] = CLAIMS_VERSION
+
+
+class ClaimsRefreshToken(Token):
+    """
+    Refresh token whose access tokens carry the user claims (see module
+    docstring). Unlike ``RefreshToken`` it writes no ``OutstandingToken`` row:
+    sessions are tracked by ``UserDevice.refresh_jti`` (accounts.sessions).
+    """
+    token_type = 'refresh'
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+    no_copy_claims = RefreshToken.no_copy_claims
+    access_token_class = AccessToken
+    access_token = RefreshToken.access_token
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        add_user_claims(token, user)
+        return token
+
+
+# --- process-local user rows ---
+
+_lock = threading.Lock()
+_rows = OrderedDict()  # user id -> (expires at, {attname: value})
+
+
+def _ttl() -> float:
+    return getattr(settings, 'AUTH_USER_CACHE_TTL', 30)
+
+
+def _capacity() -> int:
+    return getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+
+
+def forget_user(user_id) -> None:
+    with _lock:
+        _rows.pop(user_id, None)
+
+
+def user_row(user_id) -> dict:
+    """All concrete fields of the user, from the local cache when fresh. Raises ``User.DoesNotExist``."""
+    now = time.monotonic()
+    with _lock:
+        entry = _rows.get(user_id)
+        if entry is not None and entry[0] > now:
+            _rows.move_to_end(user_id)
+            return entry[1]
+    attnames = [f.attname for f in User._meta.concrete_fields]
+    row = User.objects.filter(pk=user_id).values(*attnames).first()
+    if row is None:
+        raise User.DoesNotExist(user_id)
+    with _lock:
+        _rows[user_id] = (now + _ttl(), row)
+        _rows.move_to_end(user_id)
+        while len(_rows) > _capacity():
+            _rows.popitem(last=False)
+    return row
+
+
+def _build(row, tier=None) -> ClaimsUser:
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in row]
+    user = ClaimsUser.from_db('default', fields, [row[name] for name in fields])
+    user._tier = tier
+    return user
+
+
+def load_deferred(user, fields) -> None:
+    """Fill every deferred field of a ``ClaimsUser`` from one row lookup."""
+    row = user_row(user.pk)
+    for name in fields:
+        setattr(user, name, row[name])
+
+
+# --- stale claims ---
+
+def mark_claims_stale(user_id) -> None:
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    cache.set(STALE_KEY.format(user_id=user_id), time.time(), timeout=int(lifetime) + 60)
+
+
+def claims_trusted() -> bool:
+    """Whether stale markers are shared by all processes (``AUTH_TRUST_CLAIMS`` overrides)."""
+    trusted = getattr(settings, 'AUTH_TRUST_CLAIMS', None)
+    # A stale marker in a process-local cache is only seen by the process that wrote it
+    return shared_cache() if trusted is None else trusted
+
+
+def _claims_valid(token, user_id) -> bool:
+    if token.get('cv') != CLAIMS_VERSION or not claims_trusted():
+        return False
+    changed = cache.get(STALE_KEY.format(user_id=user_id))
+    return changed is None or token.get('iat', 0) > changed
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that serves ``ClaimsUser`` from token claims (see module docstring)."""
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            # Session device for accounts.activity (recorded by ActivityMiddleware)
+            getattr(request, '_request', request).device_id = result[1].get('did')
+        return result
+
+    def get_user(self, validated_token):
+        try:
+            # The claim is serialized as a string; the cache and comparisons need the pk type
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if _claims_valid(validated_token, user_id):
+            row = {'id': user_id, **{field: validated_token[field] for field in CLAIM_FIELDS}}
+            user = _build(row, validated_token.get('tier'))
+        else:
+            try:
+                user = _build(user_row(user_id))
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
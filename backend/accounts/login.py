@@ -0,0 +1,123 @@
+"""
+Login hot path.
+
+- The user is resolved with one query by email. The old serializer called
+  ``authenticate()`` with ``email=`` and then with ``username=``, which is the
+  same lookup and, for a wrong password, two full PBKDF2 runs.
+- The password hash is checked in a bounded thread pool
+  (``LOGIN_HASH_WORKERS`` threads). At most ``LOGIN_HASH_QUEUE`` checks may
+  wait; beyond that, or after ``LOGIN_HASH_TIMEOUT`` seconds, the login is
+  rejected with ``LoginOverloaded`` (503 + Retry-After) instead of tying up every worker
+  thread with hashing during a login storm. Unknown emails hash a dummy
+  password, so response time does not reveal which emails exist.
+- TOTP codes are accepted once: the matched time step is claimed with an
+  INSERT into ``TwoFactorStep`` (unique per user and step), so a code seen on
+  the wire cannot be replayed within its validity window, whichever worker
+  receives it. Steps older than the window are deleted on the next claim.
+"""
+import hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import pyotp
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import TwoFactorStep, User
+
+# pyotp valid_window=1: the previous, current and next 30 s step
+TOTP_WINDOW = 1
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+_dummy_hash = None
+
+
+class LoginOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервис входа перегружен, повторите попытку позже'
+    default_code = 'login_overloaded'
+    # DRF's exception handler turns it into Retry-After
+    wait = 1
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'LOGIN_HASH_WORKERS', 4)
+                _slots = threading.BoundedSemaphore(workers + getattr(settings, 'LOGIN_HASH_QUEUE', 16))
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='login-hash')
+    return _pool
+
+
+def _dummy():
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = make_password('dummy-password-for-timing')
+    return _dummy_hash
+
+
+def _release(future):
+    _slots.release()
+
+
+def verify_password(password, encoded) -> bool:
+    """``check_password`` run in the hashing pool. Raises ``LoginOverloaded``."""
+    pool = _get_pool()
+    if not _slots.acquire(blocking=False):
+        raise LoginOverloaded()
+    future = pool.submit(check_password, password, encoded)
+    future.add_done_callback(_release)
+    try:
+        return future.result(timeout=getattr(settings, 'LOGIN_HASH_TIMEOUT', 5))
+    except FutureTimeout:
+        raise LoginOverloaded()
+
+
+def authenticate_credentials(email, password):
+    """The ``User`` for the credentials or None. Raises ``LoginOverloaded``."""
+    try:
+        user = User._default_manager.get_by_natural_key(email)
+    except User.DoesNotExist:
+        user = None
+    if user is None or not user.has_usable_password():
+        # Same hashing cost as a real check
+        verify_password(password, _dummy())
+        return None
+    if not verify_password(password, user.password):
+        return None
+    if identify_hasher(user.password).must_update(user.password):
+        # Hasher/iteration upgrade, as AbstractBaseUser.check_password does
+        user.set_password(password)
+        user.save(update_fields=['password'])
+    return user
+
+
+def verify_totp(user, code) -> bool:
+    """Check a TOTP code and burn its time step in the database so it cannot be used twice."""
+    code = str(code or '').strip()
+    if not code or not user.two_factor_secret:
+        return False
+    totp = pyotp.TOTP(user.two_factor_secret)
+    now = timezone.now()
+    for offset in range(-TOTP_WINDOW, TOTP_WINDOW + 1):
+        at = now + timezone.timedelta(seconds=offset * totp.interval)
+        if hmac.compare_digest(totp.at(at), code):
+            step = totp.timecode(at)
+            try:
+                with transaction.atomic():
+                    TwoFactorStep.objects.create(user_id=user.pk, step=step)
+            except IntegrityError:
+                # Already used, possibly on another worker
+                return False
+            # Steps that left the acceptance window can no longer be replayed
+            TwoFactorStep.objects.filter(user_id=user.pk, step__lt=totp.timecode(now) - TOTP_WINDOW).delete()
+            return True
+    return False
@@ -0,0 +1,92 @@
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.login import authenticate_credentials
+from accounts.models import User, UserDevice
+
+
+class Command(BaseCommand):
+    help = "Benchmark login throughput: concurrent POSTs to the login view with a share of wrong passwords."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=16, help="Client threads (default: 16)")
+        parser.add_argument("--wrong-ratio", type=float, default=0.5, help="Share of logins with a wrong password")
+        parser.add_argument("--legacy", type=int, default=20, help="Wrong-password checks timed with the old double authenticate()")
+
+    def _login(self, url, email, password):
+        # SERVER_NAME: the test client's default "testserver" is not in a production ALLOWED_HOSTS
+        client = Client(SERVER_NAME="localhost", REMOTE_ADDR="127.0.0.1", HTTP_USER_AGENT="bench_login")
+        started = time.perf_counter()
+        try:
+            response = client.post(url, {"email": email, "password": password}, content_type="application/json")
+            return response.status_code, time.perf_counter() - started
+        finally:
+            connection.close()
+
+    def _percentile(self, values, q):
+        values = sorted(values)
+        return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+    def handle(self, *args, **options):
+        # Measures the hashing path: the limiter would answer 429 after a few requests from one IP and email
+        with override_settings(RATELIMIT_ENABLED=False):
+            self._run(options)
+
+    def _run(self, options):
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        user = User.objects.create_user(email=email, username=email, password=password)
+        url = reverse("login")
+        total = options["requests"]
+        wrong_every = round(1 / options["wrong_ratio"]) if options["wrong_ratio"] > 0 else 0
+        attempts = [
+            password + "x" if wrong_every and i % wrong_every == 0 else password
+            for i in range(total)
+        ]
+
+        try:
+            if options["legacy"]:
+                started = time.perf_counter()
+                for _ in range(options["legacy"]):
+                    authenticate(email=email, password="wrong") or authenticate(username=email, password="wrong")
+                legacy = (time.perf_counter() - started) / options["legacy"] * 1000
+                started = time.perf_counter()
+                for _ in range(options["legacy"]):
+                    authenticate_credentials(email, "wrong")
+                single = (time.perf_counter() - started) / options["legacy"] * 1000
+                self.stdout.write(f"wrong password, old authenticate() x2: {legacy:.1f} ms, accounts.login: {single:.1f} ms")
+
+            lock = threading.Lock()
+            statuses, latencies = Counter(), []
+
+            def run(attempt):
+                code, elapsed = self._login(url, email, attempt)
+                with lock:
+                    statuses[code] += 1
+                    latencies.append(elapsed)
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                list(pool.map(run, attempts))
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f"{total} logins, {options['concurrency']} threads: {total / elapsed:.1f} req/s, "
+                f"p50 {self._percentile(latencies, 0.5):.1f} ms, p95 {self._percentile(latencies, 0.95):.1f} ms, "
+                f"mean {statistics.mean(latencies) * 1000:.1f} ms"
+            )
+            self.stdout.write("statuses: " + ", ".join(f"{code}: {n}" for code, n in sorted(statuses.items())))
+            self.stdout.write(f"sessions written: {UserDevice.objects.filter(user=user).count()}")
+        finally:
+            user.delete()
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.sessions import prune_expired
+
+
+class Command(BaseCommand):
+    help = "Delete expired device sessions and expired token_blacklist rows (run daily)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows deleted per statement (default: 1000)")
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after N batches per table (incremental runs)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = prune_expired(batch_size=max(options["batch_size"], 1), max_batches=options["max_batches"])
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in result.items())
+        self.stdout.write(self.style.SUCCESS(f"Deleted {summary} in {elapsed:.2f}s"))
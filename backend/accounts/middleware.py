@@ -0,0 +1,33 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .activity import tracker
+
+
+class ActivityMiddleware:
+    """Records device activity for requests authenticated by ``ClaimsJWTAuthentication`` (see accounts.activity)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self._record(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self._record(request, response)
+        return response
+
+    @staticmethod
+    def _record(request, response):
+        device_id = getattr(request, 'device_id', None)
+        if device_id and response.status_code < 500:
+            tracker.touch(device_id)
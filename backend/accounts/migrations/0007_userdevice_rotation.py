@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_claimsuser'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdevice',
+            name='previous_jti',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userdevice',
+            name='refresh_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userdevice',
+            name='rotated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -27,6 +27,32 @@ class User(AbstractUser):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
 
+class ClaimsUser(User):
+    """Пользователь из claims access-токена (accounts.authentication).
+
+    Поля вне токена отложены: первое обращение к любому из них загружает
+    всю строку одним запросом (или из локального кэша).
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and from_queryset is None and deferred and set(fields) <= deferred:
+            from .authentication import load_deferred
+            load_deferred(self, deferred)
+            return
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    @property
+    def subscription_tier(self) -> str:
+        if getattr(self, '_tier', None) is None:
+            from .authentication import subscription_tier
+            self._tier = subscription_tier(self.pk)
+        return self._tier
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True)
@@ -69,6 +95,10 @@ class UserDevice(models.Model):
     user_agent = models.TextField(blank=True)
     ip_address = models.CharField(max_length=64, blank=True)
     refresh_jti = models.CharField(max_length=255, blank=True, db_index=True)
+    # JTI до последней ротации: повторное использование = утечка refresh (accounts.sessions)
+    previous_jti = models.CharField(max_length=255, blank=True, db_index=True)
+    rotated_at = models.DateTimeField(null=True, blank=True)
+    refresh_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     last_seen = models.DateTimeField(auto_now=True)
 
@@ -80,6 +110,21 @@ class UserDevice(models.Model):
         return f"{self.user.email} • {agent} • {self.ip_address}"
 
 
+class TwoFactorStep(models.Model):
+    """Использованный шаг TOTP: один код принимается один раз (accounts.login.verify_totp)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='two_factor_steps')
+    step = models.BigIntegerField()
+    used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'step'], name='accounts_twofactorstep_user_step_uniq'),
+        ]
+
+    def __str__(self):
+        return f"TOTP step {self.step} of user {self.user_id}"
+
+
 class EmailVerification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     token = models.CharField(max_length=100, unique=True)
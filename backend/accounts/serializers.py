@@ -1,7 +1,7 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
+from .login import authenticate_credentials
 from .models import User, UserProfile, EmailVerification, PasswordResetToken
 try:
     from payments.models import UserSubscription
@@ -38,8 +38,8 @@ class UserLoginSerializer(serializers.Serializer):
         password = (attrs.get('password') or '')
 
         if email and password:
-            # Try authenticate using USERNAME_FIELD-aware kwargs
-            user = authenticate(email=email, password=password) or authenticate(username=email, password=password)
+            # One lookup and one hash check; raises LoginOverloaded (503) when the hash pool is full
+            user = authenticate_credentials(email, password)
             if not user:
                 raise serializers.ValidationError('Неверные учетные данные')
             if not user.is_active:
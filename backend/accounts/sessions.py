@@ -0,0 +1,159 @@
+"""
+Refresh-token sessions.
+
+Every login creates a ``UserDevice`` whose ``refresh_jti`` is the JTI of the
+only refresh token that may be used for it. ``rotate`` (``token/refresh/``)
+swaps it for a new one with one conditional, indexed UPDATE:
+
+    UPDATE accounts_userdevice SET refresh_jti = <new>, previous_jti = <old>
+    WHERE refresh_jti = <old>
+
+so two concurrent refreshes with the same token can never both succeed, and
+no blacklist table is consulted or written. A token that matches only
+``previous_jti`` was already rotated: within ``SESSION_REUSE_GRACE`` seconds
+it is treated as a client race and just rejected. After that it means the
+token leaked, and the session is revoked. Revoking a session is deleting its
+row.
+
+``manage.py prune_tokens`` deletes expired sessions and the
+``token_blacklist`` rows left from tokens issued before sessions existed.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from .authentication import CLAIM_FIELDS, ClaimsRefreshToken
+from .models import User, UserDevice
+
+
+class SessionError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def client_info(request) -> tuple:
+    """``(user_agent, ip_address)`` of the request."""
+    agent = request.META.get('HTTP_USER_AGENT', '') or ''
+    ip = request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR') or ''
+    return agent, ip.split(',')[0].strip()
+
+
+def _expires(token):
+    return datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+
+
+def start_session(user, request) -> ClaimsRefreshToken:
+    """Issue a refresh token for a new device session."""
+    device_id = uuid.uuid4()
+    token = ClaimsRefreshToken.for_user(user)
+    # Copied into every access token of the session (accounts.activity)
+    token['did'] = str(device_id)
+    agent, ip = client_info(request)
+    # Written before the response: a refresh right after login must find its device
+    UserDevice.objects.create(
+        id=device_id, user=user, user_agent=agent, ip_address=ip,
+        refresh_jti=token[api_settings.JTI_CLAIM], refresh_expires_at=_expires(token),
+    )
+    return token
+
+
+def _reuse_grace() -> timedelta:
+    return timedelta(seconds=getattr(settings, 'SESSION_REUSE_GRACE', 30))
+
+
+def _adopt_legacy(jti, user_id) -> bool:
+    """Tokens issued before sessions existed have an OutstandingToken row but no device."""
+    return (
+        OutstandingToken.objects.filter(jti=jti, user_id=user_id).exists()
+        and not BlacklistedToken.objects.filter(token__jti=jti).exists()
+    )
+
+
+def rotate(raw) -> ClaimsRefreshToken:
+    """Exchange refresh token ``raw`` for a new one. Raises ``SessionError``."""
+    try:
+        old = ClaimsRefreshToken(raw)
+    except TokenError as e:
+        raise SessionError(str(e), 'token_not_valid')
+    jti = old[api_settings.JTI_CLAIM]
+    user_id = User._meta.pk.to_python(old[api_settings.USER_ID_CLAIM])
+    # Claims come from the database, not from the old token or a process-local copy
+    # of the row: a deactivation or role change elsewhere must not be re-issued
+    user = User.objects.filter(pk=user_id).only(*CLAIM_FIELDS).first()
+    if user is None:
+        raise SessionError('User not found', 'user_not_found')
+    if not user.is_active:
+        raise SessionError('User is inactive', 'user_inactive')
+
+    token = ClaimsRefreshToken.for_user(user)
+    now = timezone.now()
+    fields = {
+        'refresh_jti': token[api_settings.JTI_CLAIM], 'previous_jti': jti,
+        'rotated_at': now, 'refresh_expires_at': _expires(token), 'last_seen': now,
+    }
+    current = UserDevice.objects.filter(refresh_jti=jti, user_id=user_id)
+    if current.update(**fields):
+        # Sessions started before the did claim look the device up once
+        device_id = old.get('did') or UserDevice.objects.filter(refresh_jti=fields['refresh_jti']).values_list('id', flat=True).first()
+        if device_id:
+            token['did'] = str(device_id)
+        return token
+
+    device = UserDevice.objects.filter(previous_jti=jti, user_id=user_id).only('id', 'rotated_at').first()
+    if device is not None:
+        if device.rotated_at and device.rotated_at > now - _reuse_grace():
+            raise SessionError('Refresh token already rotated', 'token_rotated')
+        # An old token came back after the client moved on: it was copied, end the session
+        device.delete()
+        raise SessionError('Refresh token reused, session revoked', 'token_reused')
+
+    if _adopt_legacy(jti, user_id):
+        device_id = uuid.uuid4()
+        token['did'] = str(device_id)
+        with transaction.atomic():
+            UserDevice.objects.create(id=device_id, user_id=user_id, **fields)
+            BlacklistedToken.objects.get_or_create(token=OutstandingToken.objects.get(jti=jti))
+        return token
+    raise SessionError('Session revoked', 'session_revoked')
+
+
+def end_session(user, raw) -> bool:
+    """Revoke the session of refresh token ``raw`` (logout)."""
+    try:
+        token = ClaimsRefreshToken(raw)
+    except TokenError:
+        return False
+    deleted, _ = UserDevice.objects.filter(user=user, refresh_jti=token[api_settings.JTI_CLAIM]).delete()
+    return bool(deleted)
+
+
+def prune_expired(batch_size=1000, max_batches=None, now=None) -> dict:
+    """Delete expired sessions and legacy blacklist rows in batches; returns counts."""
+    now = now or timezone.now()
+    legacy_cutoff = now - api_settings.REFRESH_TOKEN_LIFETIME
+    targets = {
+        'sessions': UserDevice.objects.filter(refresh_expires_at__lt=now),
+        # Devices from before rotation, whose refresh token has expired by now
+        'legacy_sessions': UserDevice.objects.filter(refresh_expires_at__isnull=True, created_at__lt=legacy_cutoff),
+        'outstanding_tokens': OutstandingToken.objects.filter(expires_at__lt=now),
+    }
+    result = {}
+    for name, queryset in targets.items():
+        total = batches = 0
+        while max_batches is None or batches < max_batches:
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            # BlacklistedToken rows go with their OutstandingToken (CASCADE)
+            queryset.model.objects.filter(pk__in=ids).delete()
+            total += len(ids)
+            batches += 1
+        result[name] = total
+    return result
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .authentication import CLAIM_FIELDS, forget_user, mark_claims_stale
+from .models import ClaimsUser, User
+
+_UNKNOWN = object()
+
+
+def _claims(instance):
+    # Deferred fields count as unknown instead of costing a query
+    return tuple(instance.__dict__.get(field, _UNKNOWN) for field in CLAIM_FIELDS)
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=ClaimsUser)
+def remember_claims(sender, instance, **kwargs):
+    instance._loaded_claims = _claims(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def refresh_cached_user(sender, instance, created, **kwargs):
+    forget_user(instance.pk)
+    # Only a changed claim invalidates issued tokens (not last_login, phone, ...)
+    loaded = getattr(instance, '_loaded_claims', None)
+    current = _claims(instance)
+    if not created and (loaded is None or _UNKNOWN in loaded or loaded != current):
+        mark_claims_stale(instance.pk)
+    instance._loaded_claims = current
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=ClaimsUser)
+def drop_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    mark_claims_stale(instance.pk)
+
+
+@receiver(post_save, sender='payments.UserSubscription')
+@receiver(post_delete, sender='payments.UserSubscription')
+def subscription_changed(sender, instance, **kwargs):
+    # The tier claim follows the active subscription
+    mark_claims_stale(instance.user_id)
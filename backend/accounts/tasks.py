@@ -0,0 +1,9 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from jobs.queue import task
+
+
+@task(name='accounts.send_email', queue='email', max_attempts=6)
+def send_email(subject, message, recipients):
+    send_mail(subject, message, settings.EMAIL_HOST_USER, recipients, fail_silently=False)
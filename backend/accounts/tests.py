@@ -1,3 +1,392 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import pyotp
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts import login as login_module
+from accounts import activity, middleware, sessions
+from accounts.authentication import (
+    STALE_KEY, ClaimsJWTAuthentication, ClaimsRefreshToken, forget_user,
+)
+from accounts.login import verify_totp
+from accounts.models import ClaimsUser, TwoFactorStep, User, UserDevice
+from aieducation import ratelimit
+
+
+@override_settings(AUTH_TRUST_CLAIMS=True)
+class ClaimsAuthenticationTests(TestCase):
+    """ClaimsJWTAuthentication: users from token claims, row lookups when claims are stale."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='claims@example.com', username='claims', password='x',
+            first_name='Claims', phone='+390000000',
+        )
+        forget_user(self.user.pk)
+        self.auth = ClaimsJWTAuthentication()
+
+    def _token(self):
+        access = ClaimsRefreshToken.for_user(self.user).access_token
+        return self.auth.get_validated_token(str(access))
+
+    def test_claims_served_without_query(self):
+        token = self._token()
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(token)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.email, 'claims@example.com')
+        self.assertFalse(user.is_staff)
+
+    def test_claim_change_marks_token_stale(self):
+        token = self._token()
+        self.user.is_staff = True
+        self.user.save()
+        with self.assertNumQueries(1):
+            user = self.auth.get_user(token)
+        self.assertTrue(user.is_staff)
+
+    def test_token_issued_after_marker_is_trusted(self):
+        cache.set(STALE_KEY.format(user_id=self.user.pk), time.time() - 60)
+        token = self._token()
+        with self.assertNumQueries(0):
+            self.auth.get_user(token)
+
+    def test_non_claim_change_keeps_claims(self):
+        self.user.phone = '+391111111'
+        self.user.save()
+        self.assertIsNone(cache.get(STALE_KEY.format(user_id=self.user.pk)))
+
+    def test_deactivation_rejects_issued_tokens(self):
+        token = self._token()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(token)
+
+    def test_deferred_fields_load_once(self):
+        user = self.auth.get_user(self._token())
+        with self.assertNumQueries(1):
+            self.assertEqual(user.phone, '+390000000')
+            self.assertEqual(user.first_name, 'Claims')
+
+    def test_save_keeps_deferred_fields(self):
+        user = self.auth.get_user(self._token())
+        user.last_name = 'Updated'
+        user.save()
+        row = User.objects.get(pk=self.user.pk)
+        self.assertEqual(row.last_name, 'Updated')
+        self.assertEqual(row.phone, '+390000000')
+        self.assertEqual(row.first_name, 'Claims')
+        # Claims were not touched, issued tokens stay valid
+        self.assertIsNone(cache.get(STALE_KEY.format(user_id=self.user.pk)))
+
+    def test_saving_claim_through_claims_user_marks_stale(self):
+        token = self._token()
+        user = self.auth.get_user(token)
+        user.is_verified = not user.is_verified
+        user.save()
+        self.assertIsNotNone(cache.get(STALE_KEY.format(user_id=self.user.pk)))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.auth.get_user(token).is_verified, user.is_verified)
+
+    @override_settings(AUTH_TRUST_CLAIMS=None)
+    def test_local_cache_falls_back_to_row(self):
+        # locmem: a marker written by another process would never be seen here
+        token = self._token()
+        with self.assertNumQueries(1):
+            user = self.auth.get_user(token)
+        self.assertEqual(user.phone, '+390000000')
+
+
+class TotpReplayTests(TestCase):
+    def test_code_accepted_once(self):
+        user = User.objects.create_user(
+            email='totp@example.com', username='totp', password='x',
+            two_factor_enabled=True, two_factor_secret=pyotp.random_base32(),
+        )
+        code = pyotp.TOTP(user.two_factor_secret).now()
+        self.assertTrue(verify_totp(user, code))
+        # The used step lives in the database, not in a per-process cache
+        cache.clear()
+        self.assertFalse(verify_totp(user, code))
+        self.assertEqual(TwoFactorStep.objects.filter(user=user).count(), 1)
+
+
+class RateLimitStoreTests(TestCase):
+    def setUp(self):
+        self.store = ratelimit.MemoryStore()
+
+    def test_sliding_window(self):
+        for i in range(3):
+            self.assertEqual(self.store.sliding_hit('k', 3, 60, now=10 + i), (True, 0.0))
+        allowed, retry = self.store.sliding_hit('k', 3, 60, now=20)
+        self.assertFalse(allowed)
+        # The current window is full: wait for the next one
+        self.assertEqual(retry, 40)
+        # Half-way through the next window the 3 previous hits weigh 1.5
+        self.assertTrue(self.store.sliding_hit('k', 3, 60, now=90)[0])
+        self.assertFalse(self.store.sliding_hit('k', 3, 60, now=91)[0])
+
+    def test_rejected_hits_are_not_counted(self):
+        self.store.sliding_hit('k', 1, 60, now=0)
+        for _ in range(5):
+            self.assertFalse(self.store.sliding_hit('k', 1, 60, now=1)[0])
+        self.assertTrue(self.store.sliding_hit('k', 1, 60, now=121)[0])
+
+    def test_token_bucket(self):
+        self.assertTrue(self.store.bucket_take('b', 2, 10, now=0)[0])
+        self.assertTrue(self.store.bucket_take('b', 2, 10, now=0)[0])
+        allowed, retry = self.store.bucket_take('b', 2, 10, now=0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry, 5.0)
+        # One token refills every 5 s
+        self.assertTrue(self.store.bucket_take('b', 2, 10, now=5)[0])
+        self.assertFalse(self.store.bucket_take('b', 2, 10, now=5)[0])
+
+    def test_parse_rate(self):
+        self.assertEqual(ratelimit.parse_rate('10/15m'), (10, 900))
+        self.assertEqual(ratelimit.parse_rate('5/h'), (5, 3600))
+
+
+@override_settings(RATELIMIT_LOCKOUT={'failures': 3, 'window': '15m', 'duration': '15m'})
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        ratelimit.get_store().clear()
+
+    def test_lockout_after_failures(self):
+        for _ in range(2):
+            ratelimit.login_failed('Lock@Example.com')
+        self.assertEqual(ratelimit.locked_for('lock@example.com'), 0.0)
+        ratelimit.login_failed('lock@example.com')
+        self.assertGreater(ratelimit.locked_for('LOCK@example.com'), 800)
+
+    def test_success_resets_failures(self):
+        for _ in range(2):
+            ratelimit.login_failed('reset@example.com')
+        ratelimit.login_succeeded('reset@example.com')
+        for _ in range(2):
+            ratelimit.login_failed('reset@example.com')
+        self.assertEqual(ratelimit.locked_for('reset@example.com'), 0.0)
+
+
+class LoginThrottleTests(APITestCase):
+    """Rejected logins are answered with 429 before the password is hashed."""
+
+    def setUp(self):
+        ratelimit.get_store().clear()
+        User.objects.create_user(email='throttle@example.com', username='throttle', password='right-password')
+        self.url = reverse('login')
+
+    def _login(self, password):
+        return self.client.post(self.url, {'email': 'throttle@example.com', 'password': password}, format='json')
+
+    def test_ip_limit_before_hashing(self):
+        rules = {**settings.RATELIMIT_RULES, 'login': [('ip', '2/m')]}
+        with self.settings(RATELIMIT_RULES=rules), \
+                mock.patch.object(login_module, 'verify_password', return_value=False) as verify:
+            self.assertEqual(self._login('wrong').status_code, 400)
+            self.assertEqual(self._login('wrong').status_code, 400)
+            response = self._login('wrong')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(verify.call_count, 2)
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        rules = {**settings.RATELIMIT_RULES, 'login': [('ip', '1/m')]}
+        with self.settings(RATELIMIT_RULES=rules):
+            self.assertEqual(self._login('wrong').status_code, 400)
+            # A client cannot get a fresh budget by sending its own X-Forwarded-For
+            response = self.client.post(
+                self.url, {'email': 'throttle@example.com', 'password': 'wrong'}, format='json',
+                HTTP_X_FORWARDED_FOR='203.0.113.7',
+            )
+        self.assertEqual(response.status_code, 429)
+
+    def test_forwarded_for_behind_a_proxy(self):
+        rules = {**settings.RATELIMIT_RULES, 'login': [('ip', '1/m')]}
+        drf = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+        with self.settings(RATELIMIT_RULES=rules, REST_FRAMEWORK=drf):
+            for client_ip in ('203.0.113.7', '203.0.113.8'):
+                response = self.client.post(
+                    self.url, {'email': 'throttle@example.com', 'password': 'wrong'}, format='json',
+                    HTTP_X_FORWARDED_FOR=client_ip,
+                )
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(RATELIMIT_LOCKOUT={'failures': 2, 'window': '15m', 'duration': '15m'})
+    def test_locked_email_rejected_before_hashing(self):
+        self._login('wrong')
+        self._login('wrong')
+        with mock.patch.object(login_module, 'verify_password') as verify:
+            response = self._login('right-password')
+        self.assertEqual(response.status_code, 429)
+        verify.assert_not_called()
+
+    @override_settings(RATELIMIT_LOCKOUT={'failures': 2, 'window': '15m', 'duration': '15m'})
+    def test_successful_login_clears_failures(self):
+        self._login('wrong')
+        self.assertEqual(self._login('right-password').status_code, 200)
+        self._login('wrong')
+        self.assertEqual(self._login('right-password').status_code, 200)
+
+
+class RefreshRotationTests(APITestCase):
+    """accounts.sessions: each refresh token is exchanged once; replays revoke the session."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='rotate@example.com', username='rotate', password='x')
+        request = RequestFactory().post('/', HTTP_USER_AGENT='tests', REMOTE_ADDR='10.0.0.1')
+        self.refresh = str(sessions.start_session(self.user, request))
+        self.device = UserDevice.objects.get(user=self.user)
+
+    def _code(self, raw):
+        with self.assertRaises(sessions.SessionError) as ctx:
+            sessions.rotate(raw)
+        return ctx.exception.code
+
+    def test_rotate(self):
+        token = sessions.rotate(self.refresh)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.refresh_jti, token[api_settings.JTI_CLAIM])
+        self.assertEqual(token['did'], str(self.device.pk))
+        self.assertEqual(token.access_token['did'], str(self.device.pk))
+        # The new token rotates in turn
+        sessions.rotate(str(token))
+
+    def test_replay_within_grace_is_rejected(self):
+        current = sessions.rotate(self.refresh)
+        self.assertEqual(self._code(self.refresh), 'token_rotated')
+        # A client race, not a leak: the session survives
+        sessions.rotate(str(current))
+
+    def test_replay_after_grace_revokes_session(self):
+        current = sessions.rotate(self.refresh)
+        UserDevice.objects.filter(pk=self.device.pk).update(rotated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(self._code(self.refresh), 'token_reused')
+        self.assertFalse(UserDevice.objects.filter(pk=self.device.pk).exists())
+        # Whoever holds the current token is logged out too
+        self.assertEqual(self._code(str(current)), 'session_revoked')
+
+    def test_refresh_endpoint_rejects_replay(self):
+        url = reverse('refresh_token')
+        response = self.client.post(url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        with self.settings(SESSION_REUSE_GRACE=0):
+            response = self.client.post(url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['code'], 'token_reused')
+
+    def test_inactive_user_is_not_reissued(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self._code(self.refresh), 'user_inactive')
+
+    def test_logout_ends_session(self):
+        self.assertTrue(sessions.end_session(self.user, self.refresh))
+        self.assertEqual(self._code(self.refresh), 'session_revoked')
+
+
+class ConcurrentRotationTests(TransactionTestCase):
+    def test_only_one_concurrent_rotation_wins(self):
+        user = User.objects.create_user(email='race@example.com', username='race', password='x')
+        refresh = str(sessions.start_session(user, RequestFactory().post('/')))
+        barrier = threading.Barrier(2)
+        issue = sessions.ClaimsRefreshToken.for_user
+        results = []
+
+        def issue_in_step(user):
+            # Both requests hold a new token before either UPDATE runs
+            token = issue(user)
+            barrier.wait(timeout=5)
+            return token
+
+        def refresh_once():
+            try:
+                results.append(str(sessions.rotate(refresh)))
+            except sessions.SessionError as e:
+                results.append(e.code)
+            finally:
+                connection.close()
+
+        with mock.patch.object(sessions.ClaimsRefreshToken, 'for_user', side_effect=issue_in_step):
+            threads = [threading.Thread(target=refresh_once) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results.count('token_rotated'), 1)
+        issued = [r for r in results if r != 'token_rotated']
+        device = UserDevice.objects.get(user=user)
+        self.assertEqual(device.refresh_jti, sessions.ClaimsRefreshToken(issued[0])[api_settings.JTI_CLAIM])
+
+
+@override_settings(ACTIVITY_FLUSH_INTERVAL=60)
+class ActivityTrackerTests(APITestCase):
+    """Write-behind last_seen: requests only touch memory, flush writes all devices at once."""
+
+    def setUp(self):
+        self.tracker = activity.ActivityTracker()
+        # No flusher thread: flush() is called explicitly
+        self.tracker._start = mock.Mock()
+        self.user = User.objects.create_user(email='seen@example.com', username='seen', password='x')
+        request = RequestFactory().post('/')
+        self.refresh = sessions.start_session(self.user, request)
+        for _ in range(2):
+            sessions.start_session(self.user, request)
+        self.devices = list(UserDevice.objects.filter(user=self.user))
+
+    def test_touch_is_memory_only(self):
+        with self.assertNumQueries(0):
+            for device in self.devices:
+                self.tracker.touch(str(device.pk))
+        self.assertEqual(set(self.tracker.pending()), {str(d.pk) for d in self.devices})
+
+    def test_flush_writes_all_devices_in_one_update(self):
+        at = timezone.now() + timedelta(hours=1)
+        for device in self.devices:
+            self.tracker.touch(str(device.pk), at=at)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.tracker.flush(), 3)
+        self.assertEqual(set(UserDevice.objects.values_list('last_seen', flat=True)), {at})
+        self.assertEqual(self.tracker.pending(), {})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.tracker.flush(), 0)
+
+    def test_activity_right_after_a_write_is_skipped(self):
+        device_id = str(self.devices[0].pk)
+        at = timezone.now()
+        self.tracker.touch(device_id, at=at)
+        self.tracker.flush()
+        self.tracker.touch(device_id, at=at + timedelta(seconds=30))
+        self.assertEqual(self.tracker.pending(), {})
+        self.tracker.touch(device_id, at=at + timedelta(seconds=61))
+        self.assertEqual(self.tracker.pending(), {device_id: at + timedelta(seconds=61)})
+
+    def test_requests_touch_and_device_list_shows_pending(self):
+        device_id = self.refresh['did']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        with mock.patch.object(middleware, 'tracker', self.tracker), \
+                mock.patch.object(activity, 'tracker', self.tracker):
+            response = self.client.get(reverse('list_devices'))
+            self.assertIn(device_id, self.tracker.pending())
+            # The touch of the previous request shows up before it is flushed
+            pending = self.tracker.pending()[device_id]
+            response = self.client.get(reverse('list_devices'))
+        self.assertEqual(response.status_code, 200)
+        current = next(d for d in response.data['devices'] if d['current'])
+        self.assertEqual(current['id'], device_id)
+        self.assertEqual(current['last_seen'], pending.isoformat())
@@ -1,8 +1,7 @@
 from rest_framework import status, generics, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from datetime import datetime
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 import pyotp
 import base64
@@ -10,11 +9,16 @@ from google.oauth2 import id_token as google_id_token
 from google.auth.transport import requests as google_requests
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
 import secrets
 import uuid
 
+from aieducation import ratelimit
+from jobs.queue import enqueue
+
+from . import activity
+from .login import verify_totp
+from .sessions import SessionError, end_session, rotate, start_session
 from .models import UserProfile, EmailVerification, PasswordResetToken, UserDevice
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserSerializer,
@@ -44,18 +48,16 @@ def register(request):
             expires_at=expires_at
         )
         
-        # Отправляем email для верификации
+        # Отправляем email для верификации (в фоне, см. accounts.tasks)
         verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
-        send_mail(
-            'Подтверждение регистрации',
-            f'Перейдите по ссылке для подтверждения email: {verification_url}',
-            settings.EMAIL_HOST_USER,
-            [user.email],
-            fail_silently=False,
-        )
+        enqueue('accounts.send_email', {
+            'subject': 'Подтверждение регистрации',
+            'message': f'Перейдите по ссылке для подтверждения email: {verification_url}',
+            'recipients': [user.email],
+        }, idempotency_key=f'email:verify:{token}')
         
-        # Создаем JWT токены
-        refresh = RefreshToken.for_user(user)
+        # Создаем JWT токены (новая сессия устройства)
+        refresh = start_session(user, request)
         
         return Response({
             'message': 'Пользователь успешно зарегистрирован. Проверьте email для подтверждения.',
@@ -71,7 +73,9 @@ def register(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([ratelimit.LoginThrottle])
 def login(request):
+    # Пользователь ищется один раз, пароль проверяется в ограниченном пуле (accounts.login)
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
@@ -79,39 +83,17 @@ def login(request):
         # Если включена 2FA — требуем код
         if getattr(user, 'two_factor_enabled', False):
             provided_code = str(request.data.get('code', '')).strip()
-            secret = getattr(user, 'two_factor_secret', '')
-            if not provided_code or not secret:
+            if not provided_code or not user.two_factor_secret:
                 return Response({'require_2fa': True, 'message': 'Требуется код 2FA'}, status=status.HTTP_400_BAD_REQUEST)
-            try:
-                totp = pyotp.TOTP(secret)
-                if not totp.verify(provided_code, valid_window=1):
-                    return Response({'require_2fa': True, 'error': 'Неверный код 2FA'}, status=status.HTTP_400_BAD_REQUEST)
-            except Exception:
-                return Response({'require_2fa': True, 'error': 'Ошибка проверки 2FA'}, status=status.HTTP_400_BAD_REQUEST)
+            # Код принимается один раз: повтор того же кода отклоняется
+            if not verify_totp(user, provided_code):
+                ratelimit.login_failed(user.email)
+                return Response({'require_2fa': True, 'error': 'Неверный код 2FA'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Создаем JWT токены
-        refresh = RefreshToken.for_user(user)
+        ratelimit.login_succeeded(user.email)
+        # Создаем JWT токены и сессию устройства (refresh_jti)
+        refresh = start_session(user, request)
 
-        # Регистрируем/обновляем устройство (refresh_jti)
-        try:
-            ua = request.META.get('HTTP_USER_AGENT', '')
-            ip = request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR') or ''
-            jti = str(refresh.get('jti')) if hasattr(refresh, 'get') else refresh.get('jti', '')
-            # fallback for simplejwt token attr
-            if not jti:
-                try:
-                    jti = refresh.get('jti')
-                except Exception:
-                    jti = ''
-            UserDevice.objects.create(
-                user=user,
-                user_agent=ua or '',
-                ip_address=(ip.split(',')[0].strip() if isinstance(ip, str) else str(ip)),
-                refresh_jti=str(jti or '')
-            )
-        except Exception:
-            pass
-        
         return Response({
             'user': UserSerializer(user).data,
             'tokens': {
@@ -119,28 +101,20 @@ def login(request):
                 'refresh': str(refresh)
             }
         })
-    
+
+    # Серия неудач блокирует email (aieducation.ratelimit, RATELIMIT_LOCKOUT)
+    ratelimit.login_failed(ratelimit.request_email(request))
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def logout(request):
-    try:
-        refresh_token = request.data.get('refresh')
-        if refresh_token:
-            token = RefreshToken(refresh_token)
-            token.blacklist()
-            # помечаем устройство как просроченное по jti
-            try:
-                jti = token.get('jti')
-                if jti:
-                    UserDevice.objects.filter(user=request.user, refresh_jti=str(jti)).delete()
-            except Exception:
-                pass
-        return Response({'message': 'Успешный выход'})
-    except Exception as e:
+    refresh_token = request.data.get('refresh')
+    # Сессия (устройство) удаляется по jti; refresh с этим jti больше не ротируется
+    if refresh_token and not end_session(request.user, refresh_token):
         return Response({'error': 'Неверный токен'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'message': 'Успешный выход'})
 
 
 @api_view(['GET'])
@@ -204,6 +178,7 @@ def change_password(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([ratelimit.PasswordResetThrottle])
 def request_password_reset(request):
     serializer = PasswordResetRequestSerializer(data=request.data)
     if serializer.is_valid():
@@ -220,15 +195,13 @@ def request_password_reset(request):
                 expires_at=expires_at
             )
             
-            # Отправляем email для сброса пароля
+            # Отправляем email для сброса пароля (в фоне)
             reset_url = f"{settings.FRONTEND_URL}/reset-password?token={token}"
-            send_mail(
-                'Сброс пароля',
-                f'Перейдите по ссылке для сброса пароля: {reset_url}',
-                settings.EMAIL_HOST_USER,
-                [user.email],
-                fail_silently=False,
-            )
+            enqueue('accounts.send_email', {
+                'subject': 'Сброс пароля',
+                'message': f'Перейдите по ссылке для сброса пароля: {reset_url}',
+                'recipients': [user.email],
+            }, idempotency_key=f'email:reset:{token}')
             
             return Response({'message': 'Инструкции по сбросу пароля отправлены на email'})
         except User.DoesNotExist:
@@ -309,33 +282,29 @@ def request_email_verification(request):
     EmailVerification.objects.create(user=user, token=token, expires_at=expires_at)
 
     verification_url = f"{settings.FRONTEND_URL}/verify-email?token={token}"
-    send_mail(
-        'Подтверждение email',
-        f'Перейдите по ссылке для подтверждения email: {verification_url}',
-        settings.EMAIL_HOST_USER,
-        [user.email],
-        fail_silently=False,
-    )
+    enqueue('accounts.send_email', {
+        'subject': 'Подтверждение email',
+        'message': f'Перейдите по ссылке для подтверждения email: {verification_url}',
+        'recipients': [user.email],
+    }, idempotency_key=f'email:verify:{token}')
 
     return Response({'message': 'Письмо для подтверждения отправлено'}, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def refresh_token(request):
+    refresh_token = request.data.get('refresh')
+    if not refresh_token:
+        return Response({'error': 'Refresh token не предоставлен'}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        refresh_token = request.data.get('refresh')
-        if not refresh_token:
-            return Response({'error': 'Refresh token не предоставлен'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        token = RefreshToken(refresh_token)
-        access_token = str(token.access_token)
-        
-        return Response({
-            'access': access_token,
-            'refresh': str(token)
-        })
-    except Exception as e:
-        return Response({'error': 'Неверный refresh token'}, status=status.HTTP_400_BAD_REQUEST)
+        # Ротация: старый refresh больше не действует (accounts.sessions)
+        token = rotate(refresh_token)
+    except SessionError as e:
+        return Response({'error': 'Неверный refresh token', 'code': e.code}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({
+        'access': str(token.access_token),
+        'refresh': str(token)
+    })
 
 
 @api_view(['PATCH'])
@@ -520,6 +489,7 @@ def twofa_setup(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([ratelimit.TwoFactorThrottle])
 def twofa_enable(request):
     """Проверяет введённый код и включает 2FA."""
     user = request.user
@@ -527,8 +497,8 @@ def twofa_enable(request):
     secret = user.two_factor_secret
     if not secret:
         return Response({'error': 'Сначала выполните настройку 2FA'}, status=status.HTTP_400_BAD_REQUEST)
-    totp = pyotp.TOTP(secret)
-    if not totp.verify(code, valid_window=1):
+    # Код подтверждения тоже сгорает и не годится для входа
+    if not verify_totp(user, code):
         return Response({'error': 'Неверный код'}, status=status.HTTP_400_BAD_REQUEST)
     user.two_factor_enabled = True
     user.save(update_fields=['two_factor_enabled'])
@@ -547,6 +517,7 @@ def twofa_disable(request):
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+@throttle_classes([ratelimit.GoogleLoginThrottle])
 def login_google(request):
     """Логин через Google: принимает id_token, валидирует, создаёт/находит пользователя и выдаёт JWT."""
     token = request.data.get('id_token')
@@ -572,17 +543,8 @@ def login_google(request):
             'is_verified': True,
         })
 
-        # Выдаём JWT
-        refresh = RefreshToken.for_user(user)
-
-        # Регистрируем устройство
-        try:
-            ua = request.META.get('HTTP_USER_AGENT', '')
-            ip = request.META.get('HTTP_X_FORWARDED_FOR') or request.META.get('REMOTE_ADDR') or ''
-            jti = str(refresh.get('jti')) if hasattr(refresh, 'get') else refresh.get('jti', '')
-            UserDevice.objects.create(user=user, user_agent=ua or '', ip_address=(ip.split(',')[0].strip() if isinstance(ip, str) else str(ip)), refresh_jti=str(jti or ''))
-        except Exception:
-            pass
+        # Выдаём JWT и регистрируем устройство
+        refresh = start_session(user, request)
 
         return Response({
             'user': UserSerializer(user).data,
@@ -599,17 +561,22 @@ def login_google(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_devices(request):
-    devices = UserDevice.objects.filter(user=request.user).order_by('-last_seen')
+    devices = list(UserDevice.objects.filter(user=request.user).order_by('-last_seen'))
+    # Активность, ещё не записанная фоновым flush (accounts.activity)
+    pending = activity.tracker.pending([str(d.id) for d in devices])
+    current = getattr(request._request, 'device_id', None)
     data = [
         {
             'id': str(d.id),
             'user_agent': d.user_agent,
             'ip_address': d.ip_address,
             'created_at': d.created_at.isoformat(),
-            'last_seen': d.last_seen.isoformat(),
+            'last_seen': max(d.last_seen, pending.get(str(d.id), d.last_seen)).isoformat(),
+            'current': str(d.id) == current,
         }
         for d in devices
     ]
+    data.sort(key=lambda d: d['last_seen'], reverse=True)
     return Response({'devices': data})
 
 
@@ -621,15 +588,7 @@ def revoke_device(request, device_id: str):
     except UserDevice.DoesNotExist:
         return Response({'error': 'Устройство не найдено'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Удаляем устройство и, если есть jti, также пытаемся добавить в blacklist
-    try:
-        if device.refresh_jti:
-            # simplejwt не предоставляет прямой API для blacklist по jti без токена,
-            # поэтому просто удаляем запись устройства. Новый refresh по jti не выпустится.
-            pass
-    except Exception:
-        pass
-
+    # refresh этой сессии перестаёт ротироваться сразу после удаления строки
     device.delete()
     return Response({'message': 'Сессия завершена'})
 
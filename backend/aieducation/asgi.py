@@ -3,6 +3,14 @@ ASGI config for aieducation project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The streaming AI chat (``/api/education/ai/chat/stream/``) is an async view
+and should be served from here, e.g. the ``chat`` process in the Procfile:
+
+    python -m uvicorn aieducation.asgi:application --port 8001
+
+Long-lived chat streams then wait on the event loop instead of occupying the
+gunicorn (WSGI) workers that serve the rest of the API.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,22 @@
+"""
+Whether the default cache is shared by every process.
+
+Invalidation through the cache (version tokens, deleted entries, stale claim
+markers) reaches other workers only with a shared backend (``CACHE_REDIS_URL``).
+With a process-local one (locmem, the default) the other workers keep serving
+what they cached until the TTL runs out, so code that depends on invalidation
+does not cache there, unless ``CACHE_SHARED`` declares a single-process setup.
+"""
+from django.conf import settings
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache() -> bool:
+    shared = getattr(settings, 'CACHE_SHARED', None)
+    if shared is None:
+        shared = settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+    return shared
@@ -0,0 +1,89 @@
+"""
+Eager-loading plans derived from serializer trees.
+
+Nested serializers (``course -> university -> majors``) used to trigger one
+query per row and relation. ``eager_loading_plan`` walks a serializer class
+once and returns the ``select_related`` / ``prefetch_related`` paths it needs:
+
+- a nested single serializer on a forward FK/one-to-one is joined
+  (``select_related``) unless it sits below a prefetched relation;
+- ``many=True`` serializers, many-to-many fields and reverse relations are
+  prefetched, and everything below them is prefetched too;
+- relations read inside ``SerializerMethodField``s cannot be discovered, so a
+  serializer lists them in ``eager_prefetch`` (paths relative to its model).
+
+Views add ``EagerLoadingMixin`` before the DRF generic class.
+"""
+from rest_framework import serializers
+
+_plans = {}
+
+
+def _walk(serializer, prefix, prefetching, select, prefetch):
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+
+    for path in getattr(serializer, 'eager_prefetch', ()):
+        prefetch.add(prefix + path)
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*' or '.' in field.source:
+            continue
+        if model is None:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except Exception:
+            # Properties, annotations and method fields
+            continue
+        if not model_field.is_relation:
+            continue
+
+        path = prefix + field.source
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.add(path)
+            _walk(field.child, path + '__', True, select, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            to_many = model_field.many_to_many or model_field.one_to_many
+            if prefetching or to_many:
+                prefetch.add(path)
+            else:
+                select.add(path)
+            _walk(field, path + '__', prefetching or to_many, select, prefetch)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch.add(path)
+        elif isinstance(field, serializers.RelatedField) and not model_field.concrete:
+            # Reverse one-to-one rendered by a related field
+            (prefetch if prefetching else select).add(path)
+
+
+def eager_loading_plan(serializer_class):
+    """``(select_related, prefetch_related)`` tuples for a serializer class (cached)."""
+    plan = _plans.get(serializer_class)
+    if plan is None:
+        select, prefetch = set(), set()
+        _walk(serializer_class(), '', False, select, prefetch)
+        # A joined relation does not need a separate prefetch of itself
+        prefetch -= select
+        plan = (tuple(sorted(select)), tuple(sorted(prefetch)))
+        _plans[serializer_class] = plan
+    return plan
+
+
+def eager_load(queryset, serializer_class):
+    select, prefetch = eager_loading_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """Apply the serializer's eager-loading plan to list/detail querysets.
+
+    Hooks ``filter_queryset`` (used by both ``list()`` and ``get_object()``) so
+    views can keep overriding ``get_queryset`` as usual.
+    """
+
+    def filter_queryset(self, queryset):
+        return eager_load(super().filter_queryset(queryset), self.get_serializer_class())
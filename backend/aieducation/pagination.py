@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Opaque-cursor (keyset) pagination; cost per page does not grow with offset.
+
+    Views set ``ordering`` to a unique-ish key, e.g. ``('name', 'id')``;
+    ``id`` is appended to any ordering (including ``?ordering=``) that lacks it
+    so rows with equal keys keep a stable order between pages.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if not {field.lstrip('-') for field in ordering} & {'id', 'pk'}:
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+
+def pagination_disabled(request) -> bool:
+    """True when the client explicitly asked for the legacy unpaginated list."""
+    return request.query_params.get('paginate', '').strip().lower() in ('false', '0', 'no', 'off')
@@ -0,0 +1,430 @@
+"""
+Rate limiting and brute-force lockout.
+
+Limits are grouped by scope in ``RATELIMIT_RULES``; each rule is
+``(key, rate)`` or ``(key, rate, algorithm)``:
+
+- key: ``'ip'`` (client address, ``REST_FRAMEWORK['NUM_PROXIES']`` aware),
+  ``'email'`` (lowercased ``email`` of the request body), ``'user'``
+  (authenticated users only) or ``'anon'`` (the IP of anonymous requests only).
+  A rule whose key is missing from the request is skipped.
+- rate: ``'<count>/<period>'`` with period ``s``, ``m``, ``h`` or ``d``,
+  optionally with a multiplier: ``'10/15m'``.
+- algorithm: ``'window'`` (default) is a sliding window counter; ``'bucket'``
+  is a token bucket of ``count`` tokens refilled at ``count/period``, which
+  allows short bursts but bounds the sustained rate.
+
+Rejected hits are not counted, so a client that waits ``Retry-After`` gets in.
+
+Views opt in with a DRF throttle (``@throttle_classes([LoginThrottle])``).
+DRF runs throttles before the view body, so rejected logins never reach the
+password hasher. ``RateLimitMiddleware`` applies IP rules of
+``RATELIMIT_PATHS`` to whole URL prefixes before authentication, parsing
+and routing.
+
+Failed logins are counted per email; ``RATELIMIT_LOCKOUT['failures']``
+failures within ``window`` lock the email for ``duration``. A successful login
+clears the counter.
+
+Counters live in a store: ``MemoryStore`` (per process; tests and single
+worker deployments) or ``RedisStore`` (shared, any server speaking the Redis
+protocol) when ``RATELIMIT_REDIS_URL`` is set. Store errors let the request
+through: an outage of the limiter must not take login down with it.
+"""
+import logging
+import math
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+
+
+def parse_rate(rate) -> tuple:
+    """``'10/15m'`` -> ``(10, 900)``."""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ImproperlyConfigured(f'Invalid rate {rate!r}, expected e.g. "10/m" or "10/15m"')
+    count, multiplier, unit = match.groups()
+    return int(count), int(multiplier or 1) * PERIODS[unit]
+
+
+def _sliding_retry(limit, window, elapsed, current, previous, cost) -> float:
+    """Seconds until a hit of ``cost`` fits into the sliding window."""
+    if current + cost > limit or previous == 0:
+        # Only the next window helps
+        return window - elapsed
+    # previous * (1 - t / window) + current + cost <= limit
+    needed = window * (1 - (limit - current - cost) / previous)
+    return max(needed - elapsed, 0.0) or 1.0
+
+
+# --- stores ---
+
+class MemoryStore:
+    """Process-local counters. Fine for tests and one worker; use ``RedisStore`` otherwise."""
+
+    def __init__(self, max_keys=100_000):
+        self._lock = threading.Lock()
+        self._data = {}  # key -> (expires at, value)
+        self._max_keys = max_keys
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def _set(self, key, value, ttl, now):
+        self._data.pop(key, None)
+        self._data[key] = (now + ttl, value)
+        if len(self._data) > self._max_keys:
+            self._data = {k: v for k, v in self._data.items() if v[0] > now}
+            # Still full: drop the least recently written keys
+            while len(self._data) > self._max_keys:
+                self._data.pop(next(iter(self._data)))
+
+    def sliding_hit(self, key, limit, window, cost=1, now=None) -> tuple:
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, window)
+        current_key, previous_key = f'{key}:{int(index)}', f'{key}:{int(index) - 1}'
+        with self._lock:
+            current = self._get(current_key, now) or 0
+            previous = self._get(previous_key, now) or 0
+            if previous * (1 - elapsed / window) + current + cost > limit:
+                return False, _sliding_retry(limit, window, elapsed, current, previous, cost)
+            self._set(current_key, current + cost, 2 * window, now)
+        return True, 0.0
+
+    def bucket_take(self, key, capacity, period, cost=1, now=None) -> tuple:
+        now = time.time() if now is None else now
+        rate = capacity / period
+        with self._lock:
+            tokens, stamp = self._get(key, now) or (capacity, now)
+            tokens = min(capacity, tokens + max(now - stamp, 0) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._set(key, (tokens, now), period, now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def sliding_reset(self, key, window, now=None) -> None:
+        index = int((time.time() if now is None else now) // window)
+        self.delete(f'{key}:{index}', f'{key}:{index - 1}')
+
+    def lock(self, key, seconds) -> None:
+        now = time.time()
+        with self._lock:
+            self._set(key, True, seconds, now)
+
+    def locked(self, key) -> float:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            return max(entry[0] - now, 0.0) if entry is not None else 0.0
+
+    def delete(self, *keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+SLIDING_LUA = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local limit, weight, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+if previous * weight + current + cost > limit then
+  return {0, current, previous}
+end
+redis.call('INCRBY', KEYS[1], cost)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {1, current + cost, previous}
+"""
+
+BUCKET_LUA = """
+local state = redis.call('HMGET', KEYS[1], 't', 's')
+local capacity, rate, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or capacity
+local stamp = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - stamp, 0) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 's', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisStore:
+    """
+    Counters shared by all workers, updated atomically by Lua scripts. Keys
+    of one limit share a ``{hash tag}`` so the scripts also work on a cluster.
+    """
+
+    def __init__(self, url, prefix='rl'):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RATELIMIT_REDIS_URL requires the "redis" package')
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._prefix = prefix
+        self._sliding = self._client.register_script(SLIDING_LUA)
+        self._bucket = self._client.register_script(BUCKET_LUA)
+
+    def _key(self, key):
+        return f'{self._prefix}:{{{key}}}'
+
+    def sliding_hit(self, key, limit, window, cost=1, now=None) -> tuple:
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now, window)
+        base = self._key(key)
+        allowed, current, previous = self._sliding(
+            keys=[f'{base}:{int(index)}', f'{base}:{int(index) - 1}'],
+            args=[limit, 1 - elapsed / window, cost, 2 * window],
+        )
+        if allowed:
+            return True, 0.0
+        return False, _sliding_retry(limit, window, elapsed, int(current), int(previous), cost)
+
+    def bucket_take(self, key, capacity, period, cost=1, now=None) -> tuple:
+        now = time.time() if now is None else now
+        rate = capacity / period
+        allowed, tokens = self._bucket(keys=[self._key(key)], args=[capacity, rate, cost, now, math.ceil(period)])
+        return bool(allowed), 0.0 if allowed else (cost - float(tokens)) / rate
+
+    def sliding_reset(self, key, window, now=None) -> None:
+        index = int((time.time() if now is None else now) // window)
+        base = self._key(key)
+        self._client.delete(f'{base}:{index}', f'{base}:{index - 1}')
+
+    def lock(self, key, seconds) -> None:
+        self._client.set(self._key(key), 1, ex=max(int(seconds), 1))
+
+    def locked(self, key) -> float:
+        ttl = self._client.ttl(self._key(key))
+        return float(ttl) if ttl and ttl > 0 else 0.0
+
+    def delete(self, *keys) -> None:
+        self._client.delete(*(self._key(key) for key in keys))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = getattr(settings, 'RATELIMIT_REDIS_URL', '')
+                _store = RedisStore(url) if url else MemoryStore()
+    return _store
+
+
+# --- keys and limits ---
+
+def client_ip(request) -> str:
+    # DRF's address logic honours REST_FRAMEWORK['NUM_PROXIES']
+    return BaseThrottle().get_ident(request)
+
+
+def request_email(request):
+    try:
+        email = request.data.get('email')
+    except AttributeError:
+        # Django request (middleware) or a non-dict body
+        return None
+    email = str(email or '').strip().lower()
+    return email or None
+
+
+def _user(request):
+    user = getattr(request, 'user', None)
+    return str(user.pk) if user is not None and user.is_authenticated else None
+
+
+def _anon(request):
+    return None if _user(request) else client_ip(request)
+
+
+KEYS = {'ip': client_ip, 'email': request_email, 'user': _user, 'anon': _anon}
+
+
+def _enabled() -> bool:
+    return getattr(settings, 'RATELIMIT_ENABLED', True)
+
+
+def _rules(scope):
+    rules = getattr(settings, 'RATELIMIT_RULES', {}).get(scope)
+    if rules is None:
+        raise ImproperlyConfigured(f'No RATELIMIT_RULES for scope {scope!r}')
+    return rules
+
+
+def hit(scope, request, rules=None) -> float:
+    """Count the request against every rule of ``scope``; returns 0 or the seconds to wait."""
+    if not _enabled():
+        return 0.0
+    store = get_store()
+    for rule in rules or _rules(scope):
+        key_name, rate = rule[0], rule[1]
+        algorithm = rule[2] if len(rule) > 2 else 'window'
+        value = KEYS[key_name](request)
+        if value is None:
+            continue
+        count, period = parse_rate(rate)
+        key = f'{scope}:{key_name}:{value}'
+        try:
+            if algorithm == 'bucket':
+                allowed, retry = store.bucket_take(key, count, period)
+            else:
+                allowed, retry = store.sliding_hit(key, count, period)
+        except Exception:
+            logger.warning('Rate limit store unavailable, %s not limited', scope, exc_info=True)
+            return 0.0
+        if not allowed:
+            # The remaining rules are not charged for a rejected request
+            return max(retry, 1.0)
+    return 0.0
+
+
+# --- lockout ---
+
+def _lockout():
+    config = getattr(settings, 'RATELIMIT_LOCKOUT', {})
+    return (
+        config.get('failures', 10),
+        parse_rate(f"1/{config.get('window', '15m')}")[1],
+        parse_rate(f"1/{config.get('duration', '15m')}")[1],
+    )
+
+
+def locked_for(email) -> float:
+    """Seconds left on the lockout of ``email`` (0 when not locked)."""
+    if not email or not _enabled():
+        return 0.0
+    try:
+        return get_store().locked(f'lockout:{email.lower()}')
+    except Exception:
+        logger.warning('Rate limit store unavailable, lockout not checked', exc_info=True)
+        return 0.0
+
+
+def login_failed(email) -> None:
+    if not email or not _enabled():
+        return
+    failures, window, duration = _lockout()
+    email = email.lower()
+    store = get_store()
+    try:
+        # The hit that would exceed failures - 1 is the failures-th one
+        allowed, _ = store.sliding_hit(f'failures:{email}', failures - 1, window)
+        if not allowed:
+            store.lock(f'lockout:{email}', duration)
+            logger.warning('Login locked for %s after %s failures', email, failures)
+    except Exception:
+        logger.warning('Rate limit store unavailable, login failure not counted', exc_info=True)
+
+
+def login_succeeded(email) -> None:
+    if not email or not _enabled():
+        return
+    try:
+        get_store().sliding_reset(f'failures:{email.lower()}', _lockout()[1])
+    except Exception:
+        logger.warning('Rate limit store unavailable, failures not cleared', exc_info=True)
+
+
+# --- DRF throttles ---
+
+class ScopedRateThrottle(BaseThrottle):
+    """Applies ``RATELIMIT_RULES[scope]``; subclasses set ``scope``."""
+    scope = None
+
+    def allow_request(self, request, view):
+        self._wait = hit(self.scope, request)
+        return not self._wait
+
+    def wait(self):
+        return self._wait
+
+
+class LoginThrottle(ScopedRateThrottle):
+    """Rate limits plus the per-email lockout, checked before the password is hashed."""
+    scope = 'login'
+
+    def allow_request(self, request, view):
+        self._wait = locked_for(request_email(request))
+        return not self._wait and super().allow_request(request, view)
+
+
+class GoogleLoginThrottle(ScopedRateThrottle):
+    scope = 'login_google'
+
+
+class PasswordResetThrottle(ScopedRateThrottle):
+    scope = 'password_reset'
+
+
+class TwoFactorThrottle(ScopedRateThrottle):
+    scope = 'twofa'
+
+
+class ChatThrottle(ScopedRateThrottle):
+    scope = 'ai_chat'
+
+
+# --- middleware ---
+
+class RateLimitMiddleware:
+    """
+    IP limits for URL prefixes (``RATELIMIT_PATHS``: ``{prefix: [rules]}``),
+    checked before the request is authenticated or parsed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = sorted(getattr(settings, 'RATELIMIT_PATHS', {}).items(), key=lambda item: -len(item[0]))
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def _check(self, request):
+        for prefix, rules in self.paths:
+            if request.path.startswith(prefix):
+                wait = hit(f'path:{prefix}', request, rules)
+                if wait:
+                    response = JsonResponse({'detail': 'Слишком много запросов, повторите попытку позже'}, status=429)
+                    response['Retry-After'] = str(math.ceil(wait))
+                    return response
+                return None
+        return None
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._check(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # Redis round trip off the event loop
+        rejected = await sync_to_async(self._check, thread_sensitive=False)(request)
+        return rejected or await self.get_response(request)
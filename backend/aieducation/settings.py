@@ -112,6 +112,7 @@ INSTALLED_APPS = [
     'education',
     'payments',
     'notifications',
+    'jobs',
 ]
 
 MIDDLEWARE = [
@@ -125,7 +126,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # UserDevice.last_seen write-behind (accounts.activity)
+    'accounts.middleware.ActivityMiddleware',
 ]
+# IP-лимиты на префиксы URL до аутентификации и разбора тела (aieducation.ratelimit)
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'aieducation.ratelimit.RateLimitMiddleware')
 
 ROOT_URLCONF = 'aieducation.urls'
 
@@ -252,7 +257,8 @@ AUTH_USER_MODEL = 'accounts.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Пользователь из claims токена, без запроса к accounts_user на каждый вызов
+        'accounts.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -264,6 +270,9 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Число прокси перед приложением (Railway: 1). По умолчанию 0: X-Forwarded-For
+    # не учитывается, иначе клиент без прокси подменит свой IP для лимитов
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 # JWT Settings
@@ -295,8 +304,83 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# accounts.authentication: process-local cache of user rows behind ClaimsUser
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '30'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+# Serve users from token claims: needs a shared cache for the stale markers.
+# Unset = only with a shared cache (CACHE_REDIS_URL); 'true' for a single process
+AUTH_TRUST_CLAIMS = {'true': True, 'false': False}.get(os.getenv('AUTH_TRUST_CLAIMS', '').lower())
+
+# accounts.sessions: a rotated refresh token reused within this many seconds is
+# rejected as a client race; later reuse revokes the session
+SESSION_REUSE_GRACE = int(os.getenv('SESSION_REUSE_GRACE', '30'))
+
+# accounts.activity: seconds between batched UserDevice.last_seen writes
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv('ACTIVITY_FLUSH_INTERVAL', '60'))
+
+# accounts.login: пул проверки паролей (PBKDF2) на процесс
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', '4'))
+# Сколько проверок может ждать в очереди; сверх этого — 503
+LOGIN_HASH_QUEUE = int(os.getenv('LOGIN_HASH_QUEUE', '16'))
+LOGIN_HASH_TIMEOUT = float(os.getenv('LOGIN_HASH_TIMEOUT', '5'))
+
+# Rate limits (aieducation.ratelimit). Без RATELIMIT_REDIS_URL счётчики локальны для процесса
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', 'True').lower() == 'true'
+RATELIMIT_REDIS_URL = os.getenv('RATELIMIT_REDIS_URL', os.getenv('CACHE_REDIS_URL', '')).strip()
+# scope -> [(key, rate[, 'window' | 'bucket'])]
+RATELIMIT_RULES = {
+    'login': [('ip', '30/5m'), ('email', '10/15m')],
+    'login_google': [('ip', '30/5m')],
+    'password_reset': [('ip', '10/h'), ('email', '3/h')],
+    'twofa': [('user', '5/5m')],
+    'ai_chat': [('anon', '20/h', 'bucket')],
+}
+# URL prefix -> IP rules, checked by RateLimitMiddleware
+RATELIMIT_PATHS = {
+    '/api/auth/': [('ip', '120/m', 'bucket')],
+}
+# Блокировка email после серии неудачных входов
+RATELIMIT_LOCKOUT = {
+    'failures': int(os.getenv('LOGIN_LOCKOUT_FAILURES', '10')),
+    'window': '15m',
+    'duration': os.getenv('LOGIN_LOCKOUT_DURATION', '15m'),
+}
+
 # Celery/Redis удалены по требованиям проекта
 
+# Cache: process-local memory by default. Set CACHE_REDIS_URL to share the cache
+# (catalog snapshots, counters) between gunicorn workers.
+_cache_redis_url = os.getenv('CACHE_REDIS_URL', '').strip()
+if _cache_redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _cache_redis_url,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'aieducation-default',
+        }
+    }
+
+# Invalidation through the cache needs every process to share it (aieducation.caching).
+# Unset = only Redis counts as shared: with locmem the catalog snapshot and the
+# dashboard are not cached and claims are not trusted. 'true' for a single process
+CACHE_SHARED = {'true': True, 'false': False}.get(os.getenv('CACHE_SHARED', '').lower())
+
+# Public university catalog snapshot lifetime (seconds). The snapshot is also
+# invalidated on every University/Major/UniversityMajor change.
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', '300'))
+
+# ?search= results per query (education.search): counts and cursor pages stop here
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', '500'))
+
+# Per-user dashboard_stats cache lifetime (seconds); signals invalidate earlier
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', '300'))
+
 # Email settings
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
@@ -316,6 +400,64 @@ FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
 # OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+# Empty = api.openai.com; point at scripts/fake_openai_server.py for local load tests
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', '60'))
+# Keep-alive pool size shared by all chat requests in a process
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '20'))
+# Process-local AI chat response cache (education.ai_cache)
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'True').lower() == 'true'
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '86400'))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000'))  # per model
+# Partitions (models) kept at once; the least recently used one is dropped
+AI_CACHE_MAX_MODELS = int(os.getenv('AI_CACHE_MAX_MODELS', '4'))
+# Cosine similarity for rephrased questions (e.g. 0.9); 0 keeps the similarity tier off
+AI_CACHE_SIMILARITY = float(os.getenv('AI_CACHE_SIMILARITY', '0'))
+# Prompt size limits for the AI chat (education.ai_context)
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv('AI_CONTEXT_TOKEN_BUDGET', '3000'))
+AI_CONTEXT_SUMMARY_TOKENS = int(os.getenv('AI_CONTEXT_SUMMARY_TOKENS', '400'))
+# Active conversations kept in memory per process (education.conversations)
+AI_CONVERSATION_CACHE_SIZE = int(os.getenv('AI_CONVERSATION_CACHE_SIZE', '500'))
+
+# Background jobs (jobs.queue); run workers with `python manage.py run_jobs`
+# JOBS_EAGER runs jobs in-process after commit (no worker needed, e.g. tests)
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'False').lower() == 'true'
+JOBS_BACKOFF_BASE = int(os.getenv('JOBS_BACKOFF_BASE', '10'))  # seconds, doubled per attempt
+JOBS_BACKOFF_MAX = int(os.getenv('JOBS_BACKOFF_MAX', '3600'))
+JOBS_LOCK_TIMEOUT = int(os.getenv('JOBS_LOCK_TIMEOUT', '600'))  # release jobs of crashed workers
+# Running jobs refresh locked_at this often; must stay well below JOBS_LOCK_TIMEOUT
+JOBS_HEARTBEAT_INTERVAL = int(os.getenv('JOBS_HEARTBEAT_INTERVAL', str(JOBS_LOCK_TIMEOUT // 4)))
+JOBS_KEEP_DAYS = int(os.getenv('JOBS_KEEP_DAYS', '7'))
+
+# Notification push (notifications.realtime): Redis pub/sub across processes;
+# empty = in-process only (events reach streams held by the publishing process)
+NOTIFICATIONS_REDIS_URL = os.getenv('NOTIFICATIONS_REDIS_URL', _cache_redis_url)
+# Without Redis the stream is only served when everything runs in one process (dev);
+# gunicorn + run_jobs + the ASGI service cannot reach each other's in-process broker
+NOTIFICATIONS_LOCAL_BROKER = os.getenv('NOTIFICATIONS_LOCAL_BROKER', str(DEBUG)).lower() == 'true'
+# Seconds a single-use stream ticket (notifications.tickets) stays valid
+NOTIFICATIONS_STREAM_TICKET_TTL = int(os.getenv('NOTIFICATIONS_STREAM_TICKET_TTL', '30'))
+
+# Notification retention (manage.py prune_notifications): days a *read*
+# notification is kept, by notification_type ('default' for the rest; None = forever).
+# Expired rows move to NotificationArchive unless NOTIFICATIONS_ARCHIVE is off.
+def _days(name, default):
+    # Empty or "none" = None (keep forever)
+    value = os.getenv(name, default).strip().lower()
+    return None if value in ('', 'none') else int(value)
+
+NOTIFICATIONS_RETENTION_DAYS = {
+    'default': _days('NOTIFICATIONS_RETENTION_DAYS', '90'),
+    'info': 30,
+    'success': 30,
+    'course': 60,
+    'application': 180,
+    'achievement': 365,
+    'payment': 365,
+}
+NOTIFICATIONS_ARCHIVE = os.getenv('NOTIFICATIONS_ARCHIVE', 'True') == 'True'
+# Archived rows older than this are deleted (None = keep)
+NOTIFICATIONS_ARCHIVE_DAYS = _days('NOTIFICATIONS_ARCHIVE_DAYS', '730')
 
 # Supabase
 SUPABASE_URL = os.getenv('SUPABASE_URL', '')
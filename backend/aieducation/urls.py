@@ -9,6 +9,7 @@ urlpatterns = [
     path('api/education/', include('education.urls')),
     path('api/payments/', include('payments.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('api/jobs/', include('jobs.urls')),
 ]
 
 if settings.DEBUG or getattr(settings, 'SERVE_MEDIA', False):
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     University, Major, UniversityMajor, Course, Enrollment, Application,
-    Achievement, UserAchievement, AIRecommendation, StudyPlan, StudyPlanItem, Document
+    Achievement, UserAchievement, AIRecommendation, StudyPlan, StudyPlanItem, Document,
+    ImportCheckpoint, Conversation
 )
 
 
@@ -87,3 +88,17 @@ class DocumentAdmin(admin.ModelAdmin):
     list_display = ('user', 'name', 'document_type', 'is_verified', 'uploaded_at')
     list_filter = ('document_type', 'is_verified', 'uploaded_at')
     search_fields = ('user__email', 'name')
+
+
+@admin.register(ImportCheckpoint)
+class ImportCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('source', 'sheet', 'rows_done', 'completed', 'updated_at')
+    list_filter = ('completed',)
+    search_fields = ('source', 'file_hash')
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'title', 'message_count', 'updated_at')
+    search_fields = ('user__email', 'title')
+    raw_id_fields = ('user',)
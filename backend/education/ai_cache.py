@@ -0,0 +1,268 @@
+"""
+Response cache for the AI chat proxy.
+
+Students keep asking the same questions, so completions are cached per model:
+
+- exact tier: normalized conversation tail -> answer (LRU + TTL);
+- similarity tier (opt-in, ``AI_CACHE_SIMILARITY`` > 0): the last user
+  message is embedded locally as a hashed character n-gram vector (NumPy, no
+  external model) and compared by cosine similarity against cached questions
+  with the same context, so rephrasings of an FAQ hit too.
+
+N-gram vectors cannot tell "Padova" from "Bologna" in an otherwise identical
+question, or "with" from "without". A similar question is therefore only
+served when its words differ from the cached one in filler words and
+inflections (``same_content``), and both have the same negations.
+
+The context key covers the model parameters, the system prompts and the turns
+before the last user message, so personalized system prompts never share
+answers with other students. The model name comes from the client, so lookups
+never create a partition (only answers that came back from the API do) and at
+most ``AI_CACHE_MAX_MODELS`` partitions are kept, least recently used first
+out. The cache is process-local; hit-rate metrics are exposed by
+``ai_views.chat_cache_stats``.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from django.conf import settings
+
+VECTOR_DIM = 1024
+NGRAM = 3
+# Previous non-system turns (besides the last user message) that form the context
+TAIL_TURNS = 2
+
+_SPACE_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'[^\w\s]', re.UNICODE)
+_NUMBER_RE = re.compile(r'\d+')
+# Words that may differ between a question and a cached rephrasing of it
+FILLER_WORDS = frozenset('''
+    a an the is are am be do does did to of in on at for about i me my we you your it this that
+    what which how can could would should please tell hi hello there any some
+    и а в во на по о об ли как какой какие что мне я мы у для же бы ну это есть можно пожалуйста
+'''.split())
+# Negations (normalize() splits "don't" into "don" + "t")
+NEGATIONS = frozenset('no not without never nor none t don doesn isn aren cannot не нет без ни нельзя non senza'.split())
+# Words sharing this many leading characters count as inflections of each other
+STEM_LENGTH = 4
+
+
+def normalize(text) -> str:
+    text = unicodedata.normalize('NFKC', str(text or '')).lower().replace('ё', 'е')
+    text = _PUNCT_RE.sub(' ', text)
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+def embed(text: str) -> np.ndarray:
+    """L2-normalized hashed character n-gram counts (word-boundary padded)."""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for word in text.split():
+        padded = f' {word} '
+        grams = [padded[i:i + NGRAM] for i in range(max(len(padded) - NGRAM + 1, 1))]
+        for gram in grams:
+            digest = hashlib.blake2b(gram.encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, 'little') % VECTOR_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _inflection(word, words) -> bool:
+    """Whether ``words`` holds another form of ``word`` (deadline/deadlines, study/studying)."""
+    for other in words:
+        shortest = min(len(word), len(other))
+        stem = max(STEM_LENGTH, shortest - 2)
+        if shortest >= STEM_LENGTH and word[:stem] == other[:stem]:
+            return True
+    return False
+
+
+def same_content(a: frozenset, b: frozenset) -> bool:
+    """Whether two normalized word sets ask the same thing, differing only in filler and word forms."""
+    if a & NEGATIONS != b & NEGATIONS:
+        return False
+    return all(
+        word in FILLER_WORDS or _inflection(word, b if word in a else a)
+        for word in (a ^ b) - NEGATIONS
+    )
+
+
+def cache_keys(params: dict):
+    """``(context_key, question)`` for chat completion params, or None if not cacheable."""
+    messages = params.get('messages') or []
+    if not messages or messages[-1].get('role') != 'user':
+        return None
+    question = normalize(messages[-1].get('content'))
+    if not question:
+        return None
+    system = [m.get('content', '') for m in messages if m.get('role') == 'system']
+    turns = [m for m in messages[:-1] if m.get('role') != 'system'][-TAIL_TURNS:]
+    context = repr((
+        params.get('model'), params.get('temperature'), params.get('max_tokens'),
+        system, [(m.get('role'), normalize(m.get('content'))) for m in turns],
+        # "deadline 2025" vs "deadline 2026" look alike as n-grams but are different questions
+        _NUMBER_RE.findall(question),
+    ))
+    return hashlib.sha1(context.encode()).hexdigest(), question
+
+
+@dataclass
+class _Entry:
+    slot: int
+    answer: str
+    expires: float
+
+
+class _Partition:
+    """Entries for one model: LRU order + a slot-indexed NumPy matrix of question vectors."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # exact key -> _Entry
+        self.vectors = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+        self.contexts = np.empty(capacity, dtype=object)
+        self.keys = np.empty(capacity, dtype=object)
+        self.words = np.empty(capacity, dtype=object)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.valid[entry.slot] = False
+        self.free.append(entry.slot)
+
+    def get(self, key, context, vector, words, threshold, now):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry.expires > now:
+                self.entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return entry.answer, 'exact'
+            self._drop(key)
+            self.stats['expired'] += 1
+
+        if threshold and vector is not None and self.valid.any():
+            candidates = np.flatnonzero(self.valid & (self.contexts == context))
+            scores = self.vectors[candidates] @ vector
+            for i in np.argsort(-scores):
+                if scores[i] < threshold:
+                    break
+                slot = candidates[i]
+                if not same_content(words, self.words[slot]):
+                    continue
+                similar_key = self.keys[slot]
+                entry = self.entries[similar_key]
+                if entry.expires > now:
+                    self.entries.move_to_end(similar_key)
+                    self.stats['similar_hits'] += 1
+                    return entry.answer, 'similar'
+                self._drop(similar_key)
+                self.stats['expired'] += 1
+
+        self.stats['misses'] += 1
+        return None, None
+
+    def put(self, key, context, vector, words, answer, expires):
+        if key in self.entries:
+            self._drop(key)
+        while not self.free:
+            self._drop(next(iter(self.entries)))
+            self.stats['evictions'] += 1
+        slot = self.free.pop()
+        self.vectors[slot] = vector if vector is not None else 0.0
+        self.contexts[slot] = context
+        self.keys[slot] = key
+        self.words[slot] = words
+        self.valid[slot] = True
+        self.entries[key] = _Entry(slot, answer, expires)
+        self.stats['stores'] += 1
+
+
+class ChatResponseCache:
+    def __init__(self, capacity=None, ttl=None, threshold=None, max_models=None):
+        self.capacity = capacity if capacity is not None else getattr(settings, 'AI_CACHE_MAX_ENTRIES', 1000)
+        self.max_models = max_models if max_models is not None else getattr(settings, 'AI_CACHE_MAX_MODELS', 4)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'AI_CACHE_TTL', 86400)
+        self.threshold = threshold if threshold is not None else getattr(settings, 'AI_CACHE_SIMILARITY', 0)
+        self._lock = threading.Lock()
+        self._partitions = OrderedDict()
+        # Lookups for models without a partition
+        self._unpartitioned_misses = 0
+
+    def _partition(self, model, create=False):
+        partition = self._partitions.get(model)
+        if partition is not None:
+            self._partitions.move_to_end(model)
+        elif create:
+            while len(self._partitions) >= max(self.max_models, 1):
+                self._partitions.popitem(last=False)
+            partition = self._partitions[model] = _Partition(self.capacity)
+        return partition
+
+    def get(self, params):
+        """``(answer, tier)`` where tier is 'exact'/'similar', or ``(None, None)``."""
+        keys = cache_keys(params)
+        if keys is None:
+            return None, None
+        context, question = keys
+        key = hashlib.sha1(f'{context}:{question}'.encode()).hexdigest()
+        vector = embed(question) if self.threshold else None
+        with self._lock:
+            partition = self._partition(params.get('model'))
+            if partition is None:
+                self._unpartitioned_misses += 1
+                return None, None
+            return partition.get(key, context, vector, frozenset(question.split()), self.threshold, time.monotonic())
+
+    def set(self, params, answer) -> None:
+        keys = cache_keys(params)
+        if keys is None or not answer:
+            return
+        context, question = keys
+        key = hashlib.sha1(f'{context}:{question}'.encode()).hexdigest()
+        vector = embed(question) if self.threshold else None
+        with self._lock:
+            self._partition(params.get('model'), create=True).put(
+                key, context, vector, frozenset(question.split()), answer, time.monotonic() + self.ttl,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+            self._unpartitioned_misses = 0
+
+    def metrics(self) -> dict:
+        with self._lock:
+            unpartitioned_misses = self._unpartitioned_misses
+            models = {}
+            for model, partition in self._partitions.items():
+                stats = dict(partition.stats)
+                hits = stats['exact_hits'] + stats['similar_hits']
+                lookups = hits + stats['misses']
+                stats['entries'] = len(partition.entries)
+                stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+                models[model] = stats
+        hits = sum(m['exact_hits'] + m['similar_hits'] for m in models.values())
+        lookups = hits + sum(m['misses'] for m in models.values()) + unpartitioned_misses
+        return {
+            'enabled': is_enabled(),
+            'capacity_per_model': self.capacity,
+            'max_models': self.max_models,
+            'ttl': self.ttl,
+            'similarity_threshold': self.threshold,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'models': models,
+        }
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'AI_CACHE_ENABLED', True)
+
+
+response_cache = ChatResponseCache()
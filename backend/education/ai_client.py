@@ -0,0 +1,113 @@
+"""
+Process-wide OpenAI clients for the AI chat endpoints.
+
+Building ``OpenAI(api_key=...)`` per request opens a new HTTPS connection (TLS
+handshake included) every time. Clients here are created once per process
+(the async one once per event loop, since httpx async pools are loop-bound)
+and share a keep-alive connection pool sized by ``OPENAI_MAX_CONNECTIONS``.
+``OPENAI_BASE_URL`` points them at any OpenAI-compatible server, e.g.
+``scripts/fake_openai_server.py`` in tests.
+"""
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+from .ai_context import build_prompt
+
+DEFAULT_MODEL = 'gpt-4o-mini'
+
+_lock = threading.Lock()
+_sync_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_api_key() -> str:
+    return os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_API_KEY_SECRET') or settings.OPENAI_API_KEY
+
+
+def _client_kwargs(api_key):
+    return {
+        'api_key': api_key,
+        'base_url': getattr(settings, 'OPENAI_BASE_URL', '') or None,
+        'timeout': getattr(settings, 'OPENAI_TIMEOUT', 60.0),
+        'max_retries': 1,
+    }
+
+
+def _limits():
+    size = getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20)
+    return httpx.Limits(max_connections=size, max_keepalive_connections=size)
+
+
+def get_client() -> OpenAI:
+    """Shared synchronous client (thread-safe; httpx.Client pools connections)."""
+    kwargs = _client_kwargs(get_api_key())
+    key = (kwargs['api_key'], kwargs['base_url'])
+    client = _sync_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _sync_clients.get(key)
+            if client is None:
+                client = OpenAI(**kwargs, http_client=httpx.Client(limits=_limits()))
+                _sync_clients[key] = client
+    return client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """Shared async client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    kwargs = _client_kwargs(get_api_key())
+    key = (kwargs['api_key'], kwargs['base_url'])
+    clients = _async_clients.setdefault(loop, {})
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOpenAI(**kwargs, http_client=httpx.AsyncClient(limits=_limits()))
+        clients[key] = client
+    return client
+
+
+def last_user_message(messages) -> str:
+    for m in reversed(messages or []):
+        if isinstance(m, dict) and m.get('role') == 'user':
+            return m.get('content', '')
+    return ''
+
+
+def demo_reply(messages) -> str:
+    return (
+        f"DEMO: я получил ваше сообщение: '{last_user_message(messages)}'. "
+        "Настройте OPENAI_API_KEY в .env, чтобы включить реальные ответы."
+    )
+
+
+def build_chat_params(data, conversation=None) -> dict:
+    """Validated ``chat.completions.create`` kwargs from a chat request body.
+
+    History is fitted into the token budget by ``ai_context.build_prompt``;
+    ``conversation`` keys its stored summary. Raises ``ValueError`` with a
+    client-facing message on bad input.
+    """
+    messages = data.get('messages', [])
+    if not isinstance(messages, list) or not messages:
+        raise ValueError('messages is required and must be a non-empty list')
+
+    # Normalize roles/content
+    formatted = []
+    for m in messages:
+        role = m.get('role', 'user')
+        if role not in ('user', 'assistant', 'system'):
+            role = 'user'
+        formatted.append({'role': role, 'content': m.get('content', '')})
+
+    return {
+        'model': data.get('model', DEFAULT_MODEL),
+        # max_history still caps the number of recent turns sent verbatim
+        'messages': build_prompt(formatted, conversation, max_turns=int(data.get('max_history', 20))),
+        'temperature': float(data.get('temperature', 0.6)),
+        'max_tokens': int(data.get('max_tokens', 300)),
+    }
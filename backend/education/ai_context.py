@@ -0,0 +1,143 @@
+"""
+Token-budgeted prompt building for the AI chat.
+
+Trimming history by message count still lets a few long messages blow up the
+prompt. ``build_prompt`` instead:
+
+- estimates tokens locally (no tokenizer dependency; errs on the high side
+  for Cyrillic, which tokenizes worse than English);
+- always keeps the system prompts and the latest user message;
+- fills the rest of ``AI_CONTEXT_TOKEN_BUDGET`` with the most recent turns;
+- replaces older turns with a rolling extractive summary (first sentence of
+  each turn) kept server-side per conversation, so it is extended
+  incrementally instead of rebuilt every request.
+"""
+import hashlib
+import math
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+
+SUMMARY_KEY = 'education:ai:summary:{conversation}'
+SUMMARY_TIMEOUT = 7 * 24 * 3600
+SUMMARY_HEADER = 'Краткое содержание предыдущей части диалога:'
+# Role/formatting overhead per chat message
+MESSAGE_OVERHEAD = 4
+SUMMARY_LINE_CHARS = 200
+
+_WORD_RE = re.compile(r'\w+|[^\w\s]', re.UNICODE)
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+')
+_ROLE_LABELS = {'user': 'Студент', 'assistant': 'Ассистент'}
+
+
+def estimate_tokens(text) -> int:
+    tokens = 0
+    for piece in _WORD_RE.findall(str(text or '')):
+        if piece.isascii():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += math.ceil(len(piece) / 2.5)
+    return tokens
+
+
+def message_tokens(message) -> int:
+    return estimate_tokens(message.get('content')) + MESSAGE_OVERHEAD
+
+
+def prompt_tokens(messages) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def _summary_line(message) -> str:
+    text = ' '.join(str(message.get('content') or '').split())
+    first = _SENTENCE_RE.split(text, maxsplit=1)[0]
+    if len(first) > SUMMARY_LINE_CHARS:
+        first = first[:SUMMARY_LINE_CHARS - 1].rstrip() + '…'
+    return f"{_ROLE_LABELS.get(message.get('role'), 'Студент')}: {first}"
+
+
+def _fingerprint(turns) -> str:
+    digest = hashlib.sha1()
+    for m in turns:
+        digest.update(f"{m.get('role')}\x00{m.get('content')}\x01".encode())
+    return digest.hexdigest()
+
+
+def _fit_lines(lines, budget):
+    """Keep the first line (the student's initial goal) and as many recent lines as fit."""
+    if not lines:
+        return []
+    kept = [lines[0]]
+    used = estimate_tokens(SUMMARY_HEADER) + estimate_tokens(lines[0]) + MESSAGE_OVERHEAD
+    tail = []
+    for line in reversed(lines[1:]):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        tail.append(line)
+        used += cost
+    if len(tail) < len(lines) - 1:
+        kept.append('…')
+    return kept + tail[::-1]
+
+
+def rolling_summary(conversation, older_turns, budget) -> str:
+    """Summary text for ``older_turns``, extended from the stored state when possible."""
+    key = SUMMARY_KEY.format(conversation=conversation) if conversation else None
+    state = cache.get(key) if key else None
+    covered = state['covered'] if state else 0
+    if state and covered <= len(older_turns) and _fingerprint(older_turns[:covered]) == state['fingerprint']:
+        lines = state['lines'] + [_summary_line(m) for m in older_turns[covered:]]
+    else:
+        # History was edited or the state expired: rebuild
+        lines = [_summary_line(m) for m in older_turns]
+    if key and (not state or len(older_turns) != covered):
+        cache.set(key, {
+            'covered': len(older_turns),
+            'fingerprint': _fingerprint(older_turns),
+            'lines': lines,
+        }, timeout=SUMMARY_TIMEOUT)
+    return '\n'.join([SUMMARY_HEADER, *_fit_lines(lines, budget)])
+
+
+def conversation_key(user_id, data) -> str:
+    """Identifies a conversation for the stored summary: client id or its first user message."""
+    conversation = data.get('conversation_id')
+    if not conversation:
+        first = next((m for m in data.get('messages') or [] if isinstance(m, dict) and m.get('role') == 'user'), {})
+        conversation = hashlib.sha1(str(first.get('content', '')).encode()).hexdigest()
+    return f"{user_id or 'anon'}:{conversation}"
+
+
+def build_prompt(messages, conversation=None, budget=None, summary_budget=None, max_turns=None):
+    """Messages to send: system prompts, summary of older turns, recent turns within budget."""
+    budget = budget or getattr(settings, 'AI_CONTEXT_TOKEN_BUDGET', 3000)
+    summary_budget = summary_budget or getattr(settings, 'AI_CONTEXT_SUMMARY_TOKENS', 400)
+
+    system = [m for m in messages if m['role'] == 'system']
+    turns = [m for m in messages if m['role'] != 'system']
+    if not turns:
+        return system
+
+    available = budget - prompt_tokens(system)
+    if prompt_tokens(turns) <= available and (not max_turns or len(turns) <= max_turns):
+        return system + turns
+
+    # Newest turns first; the latest user message is always sent
+    available -= summary_budget
+    recent = [turns[-1]]
+    used = message_tokens(turns[-1])
+    for m in reversed(turns[:-1]):
+        if max_turns and len(recent) >= max_turns:
+            break
+        cost = message_tokens(m)
+        if used + cost > available:
+            break
+        recent.append(m)
+        used += cost
+    recent.reverse()
+
+    older = turns[:len(turns) - len(recent)]
+    summary = rolling_summary(conversation, older, summary_budget)
+    return system + [{'role': 'system', 'content': summary}] + recent
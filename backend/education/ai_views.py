@@ -1,68 +1,261 @@
-import os
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from rest_framework.decorators import api_view, permission_classes
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from rest_framework import status, permissions
-from openai import OpenAI
+from rest_framework import generics, status, permissions
+from rest_framework.settings import api_settings
+
+from aieducation.ratelimit import ChatThrottle, hit as ratelimit_hit
+
+from .ai_cache import is_enabled as cache_enabled, response_cache
+from .ai_client import build_chat_params, demo_reply, get_api_key, get_async_client, get_client
+from .ai_context import conversation_key
+from .conversations import forget, prepare_turn, record_turn
+from .models import Conversation
+from .serializers import ConversationDetailSerializer, ConversationSerializer
+
+logger = logging.getLogger(__name__)
+
+# Delay between words of the demo reply so the UI streaming path can be exercised
+DEMO_STREAM_DELAY = 0.02
 
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
+# Limits anonymous (DEBUG) callers by IP
+@throttle_classes([ChatThrottle])
 def chat(request):
     """
     Simple AI chat proxy. Expects JSON: { messages: [{role, content}], model?, temperature?, max_tokens? }
-    Returns: { role: 'assistant', content: string }
+    or, with server-side history: { conversation_id?, message, system?, model?, ... }
+    Returns: { role: 'assistant', content: string, conversation_id? }
     """
     # In production require auth; in DEBUG allow anonymous for easier testing
     if not request.user.is_authenticated and not settings.DEBUG:
         return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
 
-    api_key = os.getenv('OPENAI_API_KEY') or os.getenv('OPENAI_API_KEY_SECRET') or settings.OPENAI_API_KEY
-
     try:
-        # If no API key, return a demo response to validate the UI flow
-        if not api_key:
-            data = request.data or {}
-            messages = data.get('messages', [])
-            last_user = ''
-            for m in reversed(messages):
-                if m.get('role') == 'user':
-                    last_user = m.get('content', '')
-                    break
-            demo = f"DEMO: я получил ваше сообщение: '{last_user}'. Настройте OPENAI_API_KEY в .env, чтобы включить реальные ответы."
-            return Response({'role': 'assistant', 'content': demo})
-
-        client = OpenAI(api_key=api_key)
         data = request.data or {}
-        messages = data.get('messages', [])
-        if not isinstance(messages, list) or not messages:
-            return Response({'error': 'messages is required and must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
-
-        # Keep only the last N messages to cap cost
-        max_messages = int(data.get('max_history', 20))
-        msgs = messages[-max_messages:]
-
-        # Normalize roles/content
-        formatted = []
-        for m in msgs:
-            role = m.get('role', 'user')
-            if role not in ('user', 'assistant', 'system'):
-                role = 'user'
-            content = m.get('content', '')
-            formatted.append({'role': role, 'content': content})
-
-        model = data.get('model', 'gpt-4o-mini')
-        temperature = float(data.get('temperature', 0.6))
-        max_tokens = int(data.get('max_tokens', 300))
-
-        completion = client.chat.completions.create(
-            model=model,
-            messages=formatted,
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-        content = completion.choices[0].message.content
-        return Response({'role': 'assistant', 'content': content})
+        conversation = None
+        if 'message' in data:
+            # History is stored server-side; the client sends only the new message
+            if not request.user.is_authenticated:
+                return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+            try:
+                conversation, messages = prepare_turn(request.user, data)
+            except Conversation.DoesNotExist:
+                return Response({'error': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            data = {**data, 'messages': messages, 'conversation_id': conversation.pk}
+
+        extra = {}
+        # If no API key, return a demo response to validate the UI flow
+        if not get_api_key():
+            content = demo_reply(data.get('messages', []))
+        else:
+            try:
+                params = build_chat_params(data, conversation_key(request.user.pk, data))
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Repeated questions are answered from the response cache ("cache": false skips it)
+            use_cache = cache_enabled() and data.get('cache') is not False
+            cached, tier = response_cache.get(params) if use_cache else (None, None)
+            if cached is not None:
+                content, extra['cached'] = cached, tier
+            else:
+                completion = get_client().chat.completions.create(**params)
+                content = completion.choices[0].message.content
+                if use_cache:
+                    response_cache.set(params, content)
+
+        if conversation is not None:
+            record_turn(conversation, data['message'], content)
+            extra['conversation_id'] = conversation.pk
+        return Response({'role': 'assistant', 'content': content, **extra})
     except Exception as e:
         print(f"AI Chat error: {e}")
         return Response({'error': 'AI service error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _authenticate(request):
+    """Run the DRF authentication classes (JWT) against a plain Django request."""
+    for auth_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = auth_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+def _sse(data, event=None) -> str:
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _done(content, on_reply, **extra) -> str:
+    # on_reply stores the finished reply and returns extra fields for the done event
+    if on_reply is not None:
+        extra.update(await on_reply(content))
+    return _sse({'done': True, **extra}, 'done')
+
+
+async def _demo_events(messages, on_reply=None):
+    yield ': stream-open\n\n'
+    reply = demo_reply(messages)
+    for word in reply.split(' '):
+        yield _sse({'delta': word + ' '})
+        await asyncio.sleep(DEMO_STREAM_DELAY)
+    yield await _done(reply, on_reply)
+
+
+async def _cached_events(content, tier, on_reply=None):
+    yield _sse({'delta': content})
+    yield await _done(content, on_reply, cached=tier)
+
+
+async def _completion_events(params, store=False, on_reply=None):
+    # Comment line first so proxies/browsers get headers before the model answers
+    yield ': stream-open\n\n'
+    stream = None
+    parts = []
+    try:
+        stream = await get_async_client().chat.completions.create(**params, stream=True)
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield _sse({'delta': delta})
+        content = ''.join(parts)
+        if store:
+            response_cache.set(params, content)
+        yield await _done(content, on_reply)
+    except asyncio.CancelledError:
+        # Client went away; stop pulling tokens from the model
+        raise
+    except Exception:
+        logger.exception('AI chat stream error')
+        yield _sse({'error': 'AI service error'}, 'error')
+    finally:
+        if stream is not None:
+            await stream.close()
+
+
+@csrf_exempt
+async def chat_stream(request):
+    """
+    Streaming variant of ``chat`` (Server-Sent Events). Same request body.
+    Emits ``data: {"delta": "..."}`` per token chunk, then ``event: done``
+    (or ``event: error``); with server-side history the turn is stored and
+    ``done`` carries ``conversation_id``. Runs on the event loop under ASGI
+    (``aieducation.asgi``), so open streams do not hold worker threads.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except AuthenticationFailed as e:
+        # Same body DRF would render for an invalid/expired token
+        detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        return JsonResponse(detail, status=401)
+    # In production require auth; in DEBUG allow anonymous for easier testing
+    if user is None and not settings.DEBUG:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if user is None:
+        # Same limit as ChatThrottle on chat
+        wait = await sync_to_async(ratelimit_hit, thread_sensitive=False)(ChatThrottle.scope, request)
+        if wait:
+            response = JsonResponse({'error': 'Too many requests'}, status=429)
+            response['Retry-After'] = str(int(wait))
+            return response
+
+    try:
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('JSON object expected')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+
+    on_reply = None
+    if 'message' in data:
+        # History is stored server-side; the client sends only the new message
+        if user is None:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        try:
+            conversation, messages = await sync_to_async(prepare_turn)(user, data)
+        except Conversation.DoesNotExist:
+            return JsonResponse({'error': 'Conversation not found'}, status=404)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        message = data['message']
+        data = {**data, 'messages': messages, 'conversation_id': conversation.pk}
+
+        async def on_reply(content):
+            await sync_to_async(record_turn)(conversation, message, content)
+            return {'conversation_id': conversation.pk}
+
+    if not get_api_key():
+        events = _demo_events(data.get('messages', []), on_reply)
+    else:
+        try:
+            # Summary state lives in the Django cache (sync API)
+            params = await sync_to_async(build_chat_params)(
+                data, conversation_key(getattr(user, 'pk', None), data),
+            )
+        except (ValueError, TypeError, AttributeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        use_cache = cache_enabled() and data.get('cache') is not False
+        cached, tier = response_cache.get(params) if use_cache else (None, None)
+        if cached is not None:
+            events = _cached_events(cached, tier, on_reply)
+        else:
+            events = _completion_events(params, store=use_cache, on_reply=on_reply)
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # Disable response buffering in nginx-style proxies
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([permissions.IsAdminUser])
+def chat_cache_stats(request):
+    """Hit-rate metrics of the AI response cache (this process); DELETE clears it."""
+    if request.method == 'DELETE':
+        response_cache.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response(response_cache.metrics())
+
+
+class ConversationListView(generics.ListCreateAPIView):
+    """The user's AI conversations, most recently active first."""
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Conversation.objects.filter(user=self.request.user).order_by('-updated_at')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class ConversationDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = ConversationDetailSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    http_method_names = ['get', 'patch', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        return Conversation.objects.filter(user=self.request.user).prefetch_related('messages')
+
+    def perform_destroy(self, instance):
+        forget(instance.pk)
+        instance.delete()
@@ -0,0 +1,86 @@
+"""
+Versioned snapshot of the public university catalog.
+
+The landing page and onboarding map fetch the whole active catalog on every
+visit. Instead of re-running the prefetch query and the serializer each time,
+the rendered JSON is built once and stored in the cache under a version token.
+The token changes whenever a University, Major or UniversityMajor row changes
+(see ``education.signals``), so a stale snapshot is never served after an
+edit. The token must be seen by every worker: with a process-local cache
+(``aieducation.caching``) the snapshot is rebuilt per request instead.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.renderers import JSONRenderer
+
+from aieducation.caching import shared_cache
+
+from .models import University
+
+CATALOG_VERSION_KEY = 'education:catalog:version'
+CATALOG_SNAPSHOT_KEY = 'education:catalog:snapshot:{version}:{origin}'
+
+
+def get_catalog_version() -> str:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add() keeps the first token if several workers race here
+        if not cache.add(CATALOG_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOG_VERSION_KEY) or version
+    return version
+
+
+def bump_catalog_version() -> str:
+    """Invalidate every catalog snapshot by switching to a new version token."""
+    version = uuid.uuid4().hex
+    cache.set(CATALOG_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def _build_snapshot(request) -> dict:
+    from .serializers import UniversityCatalogSerializer
+
+    queryset = University.objects.filter(is_active=True).order_by('name', 'id')
+    data = UniversityCatalogSerializer(queryset, context={'request': request}).data
+    content = JSONRenderer().render(data)
+    etag = '"%s"' % hashlib.sha1(content).hexdigest()
+    return {'etag': etag, 'content': content}
+
+
+def get_catalog_snapshot(request) -> dict:
+    """Return ``{'etag', 'content'}`` for the current catalog version.
+
+    Snapshots are keyed by origin as well, because ``logo_url`` is absolutized
+    against the request host.
+    """
+    if not shared_cache():
+        # Other workers would not see a version bump from this one
+        return _build_snapshot(request)
+    origin = f"{request.scheme}://{request.get_host()}"
+    key = CATALOG_SNAPSHOT_KEY.format(version=get_catalog_version(), origin=origin)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = _build_snapshot(request)
+        cache.set(key, snapshot, timeout=getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+    return snapshot
+
+
+def catalog_snapshot_response(request) -> HttpResponse:
+    """Serve the catalog snapshot, answering ``304`` when If-None-Match matches."""
+    snapshot = get_catalog_snapshot(request)
+    etag = snapshot['etag']
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        return not_modified
+    response = HttpResponse(snapshot['content'], content_type='application/json')
+    response['ETag'] = etag
+    # Let browsers keep the body but always revalidate with the ETag
+    response['Cache-Control'] = 'public, no-cache'
+    return response
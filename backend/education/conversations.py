@@ -0,0 +1,156 @@
+"""
+Server-side AI chat history.
+
+Clients send ``{conversation_id, message}`` instead of re-uploading the whole
+``messages`` list every turn. History lives in the append-only
+``ConversationMessage`` table (unique ``(conversation, seq)`` index), and
+active conversations are kept in a process-local LRU so a turn usually reads
+nothing but the conversation row:
+
+- ``Conversation.message_count`` is the next ``seq``; appends lock the row,
+  so concurrent turns never reuse a ``seq``;
+- a hot entry is valid while its length equals ``message_count``; if another
+  worker appended meanwhile, only the missing tail (``seq >= cached``) is
+  loaded.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, ConversationMessage
+
+TITLE_LENGTH = 80
+
+_lock = threading.Lock()
+_hot = OrderedDict()  # conversation id -> tuple of {'role', 'content'}
+
+
+def _capacity() -> int:
+    return getattr(settings, 'AI_CONVERSATION_CACHE_SIZE', 500)
+
+
+def _remember(conversation_id, messages) -> None:
+    with _lock:
+        _hot[conversation_id] = messages
+        _hot.move_to_end(conversation_id)
+        while len(_hot) > _capacity():
+            _hot.popitem(last=False)
+
+
+def forget(conversation_id) -> None:
+    with _lock:
+        _hot.pop(conversation_id, None)
+
+
+def _rows(conversation_id, start=0):
+    rows = (
+        ConversationMessage.objects
+        .filter(conversation_id=conversation_id, seq__gte=start)
+        .order_by('seq')
+        .values_list('role', 'content')
+    )
+    return tuple({'role': role, 'content': content} for role, content in rows)
+
+
+def load_history(conversation) -> list:
+    """All messages of ``conversation`` in order, from the hot cache when current."""
+    count = conversation.message_count
+    with _lock:
+        cached = _hot.get(conversation.pk)
+    if cached is not None and len(cached) == count:
+        _remember(conversation.pk, cached)
+        return list(cached)
+    if cached is not None and len(cached) < count:
+        messages = cached + _rows(conversation.pk, start=len(cached))
+    else:
+        messages = _rows(conversation.pk)
+    _remember(conversation.pk, messages)
+    return list(messages)
+
+
+def append_messages(conversation, messages) -> None:
+    """Append ``[{'role', 'content'}, ...]`` atomically with consecutive ``seq`` numbers."""
+    if not messages:
+        return
+    with transaction.atomic():
+        start = (
+            Conversation.objects.select_for_update()
+            .values_list('message_count', flat=True)
+            .get(pk=conversation.pk)
+        )
+        ConversationMessage.objects.bulk_create([
+            ConversationMessage(conversation_id=conversation.pk, seq=start + i, role=m['role'], content=m['content'])
+            for i, m in enumerate(messages)
+        ])
+        Conversation.objects.filter(pk=conversation.pk).update(
+            message_count=F('message_count') + len(messages), updated_at=timezone.now(),
+        )
+    conversation.message_count = start + len(messages)
+
+    # Extend the hot entry only if it was complete; otherwise the next load fetches the tail
+    added = tuple({'role': m['role'], 'content': m['content']} for m in messages)
+    with _lock:
+        cached = _hot.get(conversation.pk)
+    if cached is not None and len(cached) == start:
+        _remember(conversation.pk, cached + added)
+
+
+def _system_prompt(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return '\n\n'.join(str(v) for v in value if v)
+    return str(value or '')
+
+
+def prepare_turn(user, data):
+    """``(conversation, messages)`` for a ``{conversation_id?, message, system?}`` request.
+
+    Without an id the conversation is new and unsaved (``pk`` is None); it is
+    created by ``record_turn``, so a failed or aborted AI call leaves no empty
+    conversation behind. Raises ``Conversation.DoesNotExist`` for an id the
+    user does not own and ``ValueError`` for a missing message. Nothing is
+    stored until ``record_turn`` is called with the reply.
+    """
+    message = data.get('message')
+    if not isinstance(message, str) or not message.strip():
+        raise ValueError('message is required and must be a non-empty string')
+
+    system = _system_prompt(data.get('system')) if 'system' in data else None
+    conversation_id = data.get('conversation_id')
+    if conversation_id:
+        conversation = Conversation.objects.get(pk=conversation_id, user=user)
+        # Student context changes over time; the latest one is used for the whole history
+        if system is not None and system != conversation.system_prompt:
+            conversation.system_prompt = system
+            conversation.save(update_fields=['system_prompt', 'updated_at'])
+    else:
+        conversation = Conversation(
+            user=user,
+            title=' '.join(message.split())[:TITLE_LENGTH],
+            system_prompt=system or '',
+        )
+
+    messages = []
+    if conversation.system_prompt:
+        messages.append({'role': 'system', 'content': conversation.system_prompt})
+    if conversation.pk is not None:
+        messages += load_history(conversation)
+    messages.append({'role': 'user', 'content': message})
+    return conversation, messages
+
+
+def record_turn(conversation, message, reply) -> None:
+    """Store the student's message and the assistant reply of one turn (creating a new conversation)."""
+    messages = [
+        {'role': 'user', 'content': message},
+        {'role': 'assistant', 'content': reply},
+    ]
+    if conversation.pk is not None:
+        append_messages(conversation, messages)
+        return
+    with transaction.atomic():
+        conversation.save(force_insert=True)
+        append_messages(conversation, messages)
@@ -0,0 +1,171 @@
+"""
+Dashboard aggregation service.
+
+``dashboard_stats`` used to issue a separate COUNT/SUM per widget on every
+dashboard load. Here all per-user counters come from one query (correlated
+scalar subqueries plus a LEFT JOIN on StudentProgress), recommended courses
+are cached globally, and the serialized result is cached per user.
+
+Invalidation (wired in ``education.signals``):
+- per-user writes (progress, enrollments, plan items, achievements,
+  applications) drop that user's entry;
+- catalog-wide writes (courses, achievements' points, the university catalog)
+  bump the global version, which every per-user entry is checked against.
+Entries also expire at the end of the day because ``upcoming_deadlines``
+depends on today's date.
+
+Both only reach other workers through a shared cache; with a process-local
+one (``aieducation.caching``) nothing is cached and every load is computed.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from aieducation.caching import shared_cache
+from aieducation.eager_loading import eager_load
+
+from .catalog import get_catalog_version
+from .models import (
+    Application, Course, Enrollment, StudentProgress, StudyPlanItem, UserAchievement,
+)
+
+User = get_user_model()
+
+USER_STATS_KEY = 'education:dashboard:{user_id}'
+GLOBAL_VERSION_KEY = 'education:dashboard:version'
+RECOMMENDED_KEY = 'education:dashboard:recommended:{version}'
+
+PROGRESS_FIELDS = (
+    'ielts_completed', 'dov_completed', 'universities_selected',
+    'universitaly_registration', 'visa_obtained',
+)
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def get_global_version() -> str:
+    version = cache.get(GLOBAL_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(GLOBAL_VERSION_KEY, version, timeout=None)
+        version = cache.get(GLOBAL_VERSION_KEY) or version
+    # Course/University payloads inside recommended courses follow the catalog
+    return f"{version}:{get_catalog_version()}"
+
+
+def bump_global_version() -> None:
+    cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_user(user_id) -> None:
+    if user_id is not None:
+        cache.delete(USER_STATS_KEY.format(user_id=user_id))
+
+
+def _count(queryset, group_by):
+    """Correlated scalar COUNT(*) subquery, 0 when there are no rows."""
+    subquery = queryset.order_by().values(group_by).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def _user_counters(user, today):
+    user_ref = OuterRef('pk')
+    points = (
+        UserAchievement.objects.filter(user=user_ref).order_by().values('user')
+        .annotate(total=Sum('achievement__points')).values('total')
+    )
+    return (
+        User.objects.filter(pk=user.pk)
+        .annotate(
+            total_courses=_count(Course.objects.filter(is_active=True), 'is_active'),
+            completed_courses=_count(Enrollment.objects.filter(user=user_ref, is_completed=True), 'user'),
+            upcoming_deadlines=_count(
+                StudyPlanItem.objects.filter(
+                    study_plan__user=user_ref, is_completed=False, due_date__gte=today,
+                ),
+                'study_plan__user',
+            ),
+            achievements_unlocked=_count(UserAchievement.objects.filter(user=user_ref), 'user'),
+            total_points=Coalesce(Subquery(points, output_field=IntegerField()), Value(0)),
+            applications_submitted=_count(Application.objects.filter(user=user_ref), 'user'),
+        )
+        .values(
+            'total_courses', 'completed_courses', 'upcoming_deadlines',
+            'achievements_unlocked', 'total_points', 'applications_submitted',
+            'progress__id', *(f'progress__{f}' for f in PROGRESS_FIELDS),
+        )
+        .get()
+    )
+
+
+def _recommended_courses(request, version):
+    from .serializers import CourseSerializer
+
+    shared = shared_cache()
+    key = RECOMMENDED_KEY.format(version=version)
+    data = cache.get(key) if shared else None
+    if data is None:
+        courses = eager_load(Course.objects.filter(is_active=True), CourseSerializer)[:3]
+        data = CourseSerializer(courses, many=True, context={'request': request}).data
+        if shared:
+            cache.set(key, data, timeout=_timeout())
+    return data
+
+
+def compute_dashboard_stats(user, request=None, version=None) -> dict:
+    from .serializers import DashboardStatsSerializer
+
+    version = version or get_global_version()
+    today = timezone.now().date()
+    row = _user_counters(user, today)
+
+    progress = {f: row[f'progress__{f}'] for f in PROGRESS_FIELDS}
+    if row['progress__id'] is None:
+        created = StudentProgress.objects.get_or_create(user=user)[0]
+        progress = {f: getattr(created, f) for f in PROGRESS_FIELDS}
+
+    stats = {
+        'overall_progress': sum(bool(v) for v in progress.values()) / len(PROGRESS_FIELDS) * 100,
+        **progress,
+        'total_courses': row['total_courses'],
+        'completed_courses': row['completed_courses'],
+        'upcoming_deadlines': row['upcoming_deadlines'],
+        'achievements_unlocked': row['achievements_unlocked'],
+        # Study time/streak are mock values for now
+        'current_streak': 7,
+        'total_study_time': 45,
+        'weekly_goal': 20,
+        'weekly_progress': 12,
+        'total_points': row['total_points'],
+        'applications_submitted': row['applications_submitted'],
+    }
+    data = dict(DashboardStatsSerializer(stats).data)
+    data['recommended_courses'] = _recommended_courses(request, version)
+    return data
+
+
+def get_dashboard_stats(user, request=None):
+    """Return ``(data, cache_hit, elapsed_ms)`` for the user's dashboard."""
+    started = time.perf_counter()
+    if not shared_cache():
+        return compute_dashboard_stats(user, request), False, (time.perf_counter() - started) * 1000
+    key = USER_STATS_KEY.format(user_id=user.pk)
+    version = get_global_version()
+    today = timezone.now().date().isoformat()
+
+    entry = cache.get(key)
+    hit = bool(entry) and entry['version'] == version and entry['date'] == today
+    if hit:
+        data = entry['data']
+    else:
+        data = compute_dashboard_stats(user, request, version)
+        cache.set(key, {'version': version, 'date': today, 'data': data}, timeout=_timeout())
+    return data, hit, (time.perf_counter() - started) * 1000
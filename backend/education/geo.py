@@ -0,0 +1,141 @@
+"""
+Spatial helpers for the university map.
+
+Universities carry an indexed ``geohash`` (kept in sync in ``University.save``)
+next to an index on ``(latitude, longitude)``. Bounding-box queries use the
+coordinate index; radius and k-nearest queries pre-filter with a bounding box
+and compute exact great-circle distances in NumPy; low-zoom map views are
+clustered in the database by geohash prefix.
+"""
+import math
+
+import numpy as np
+from django.db.models import Avg, Count, Min, Q
+from django.db.models.functions import Substr
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Map zoom level (web mercator, 0..20) -> geohash prefix length for clusters
+_ZOOM_PRECISION = [(3, 2), (5, 3), (8, 4), (10, 5)]
+CLUSTER_MAX_ZOOM = 10
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION) -> str:
+    if latitude is None or longitude is None:
+        return ''
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cluster_precision(zoom: int) -> int:
+    for max_zoom, precision in _ZOOM_PRECISION:
+        if zoom <= max_zoom:
+            return precision
+    return GEOHASH_PRECISION
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points."""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle; longitudes may wrap."""
+    distance = radius_km / EARTH_RADIUS_KM
+    min_lat = lat - math.degrees(distance)
+    max_lat = lat + math.degrees(distance)
+    if min_lat <= -90 or max_lat >= 90:
+        # The circle covers a pole: every longitude is inside
+        return max(-90.0, min_lat), -180.0, min(90.0, max_lat), 180.0
+    # Widest longitude span of the circle (tangent meridians), not radius / cos(lat)
+    dlon = math.degrees(math.asin(math.sin(distance) / math.cos(math.radians(lat))))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        min_lon += 360
+    if max_lon > 180:
+        max_lon -= 360
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def within_bbox(queryset, min_lat, min_lon, max_lat, max_lon):
+    """Filter by bounding box; min_lon > max_lon means the box crosses the antimeridian."""
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        return queryset.filter(longitude__gte=min_lon, longitude__lte=max_lon)
+    return queryset.filter(Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+
+def within_radius(queryset, lat, lon, radius_km, limit=None):
+    """Return ``[(instance, distance_km)]`` inside the radius, nearest first."""
+    candidates = list(within_bbox(queryset, *bounding_box(lat, lon, radius_km)))
+    if not candidates:
+        return []
+    distances = haversine_km(lat, lon, [u.latitude for u in candidates], [u.longitude for u in candidates])
+    order = np.argsort(distances, kind='stable')
+    result = [(candidates[i], float(distances[i])) for i in order if distances[i] <= radius_km]
+    return result[:limit] if limit else result
+
+
+def nearest(queryset, lat, lon, k, start_radius_km=25.0):
+    """k nearest points, widening the search box until enough candidates are found."""
+    # Half the circumference: a circle this wide covers the whole globe
+    global_radius = math.pi * EARTH_RADIUS_KM
+    radius = min(start_radius_km, global_radius)
+    while True:
+        found = within_radius(queryset, lat, lon, radius)
+        if len(found) >= k or radius >= global_radius:
+            return found[:k]
+        radius = min(radius * 4, global_radius)
+
+
+def clusters(queryset, zoom):
+    """Aggregate points into geohash cells sized for the zoom level."""
+    precision = cluster_precision(zoom)
+    rows = (
+        queryset.exclude(geohash='')
+        .annotate(cell=Substr('geohash', 1, precision))
+        .values('cell')
+        .annotate(count=Count('id'), latitude=Avg('latitude'), longitude=Avg('longitude'), first_id=Min('id'))
+        .order_by('-count', 'cell')
+    )
+    return [
+        {
+            'geohash': row['cell'],
+            'count': row['count'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            # a single-point cell can be rendered as a regular marker
+            'id': row['first_id'] if row['count'] == 1 else None,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,417 @@
+"""
+Set-based university import (``import_universities``).
+
+The old command called ``update_or_create``/``get_or_create`` per row and per
+major. Here a DataFrame is normalized column-wise in pandas (text, ints,
+dates, major splitting), diffed against the database with a handful of
+``name__in`` lookups per chunk, and written with ``bulk_create`` /
+``bulk_update`` / ``ignore_conflicts``.
+
+Semantics follow the row-by-row importer: universities are matched by exact
+name (the last row wins for repeated names), only mapped columns are written,
+``deadline`` is only set when it parses, majors are matched by exact name and
+links are created once (existing links are left untouched).
+
+Bulk writes skip ``save()`` and signals, so ``updated_at`` is set explicitly
+and the catalog version / search index are refreshed by ``finish()``.
+
+Large files can be streamed: ``iter_csv_chunks`` / ``iter_excel_chunks``
+yield bounded DataFrames (optionally skipping rows already imported), and
+``fetch_to_tempfile`` downloads a URL to disk while hashing it, so memory stays
+flat regardless of sheet size.
+"""
+import hashlib
+import tempfile
+import time
+import urllib.request
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from . import search
+from .catalog import bump_catalog_version
+from .models import Major, University, UniversityMajor
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d")
+MAJOR_SEPARATORS = r"[;,/\n\|]"
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_CHUNK_SIZE = 5000
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# University field -> header candidates (English + Russian variants)
+COLUMN_CANDIDATES = {
+    "name": ["name", "университет", "название", "university", "uni name"],
+    "country": ["country", "страна"],
+    "city": ["city", "город"],
+    "description": ["description", "описание", "about"],
+    "website": ["website", "сайт", "url", "link"],
+    "level": ["level", "уровень"],
+    "student_count": ["students", "student_count", "студентов"],
+    "deadline": ["deadline", "application deadline", "дедлайн", "срок подачи", "срок подачи документов"],
+    "majors": ["majors", "specialties", "направления", "специальности", "faculties", "факультеты"],
+    "language": ["language", "язык", "language of instruction"],
+    "requirements": ["requirements", "требования"],
+    "duration_years": ["duration", "duration_years", "продолжительность"],
+}
+UNIVERSITY_FIELDS = ("country", "city", "description", "website", "level", "student_count", "deadline")
+
+
+def pick_column(columns, candidates: List[str]) -> Optional[str]:
+    cols = {str(c).lower().strip(): c for c in columns}
+    for cand in candidates:
+        key = cand.lower().strip()
+        if key in cols:
+            return cols[key]
+    # try loose contains match
+    for key, orig in cols.items():
+        for cand in candidates:
+            if cand.lower() in key:
+                return orig
+    return None
+
+
+def map_columns(columns, majors_col: Optional[str] = None) -> Dict[str, Optional[str]]:
+    mapping = {name: pick_column(columns, candidates) for name, candidates in COLUMN_CANDIDATES.items()}
+    mapping["name"] = mapping["name"] or "name"
+    if majors_col:
+        mapping["majors"] = majors_col
+    return mapping
+
+
+# --- Vectorized parsing ------------------------------------------------------
+
+def _text(series: pd.Series) -> pd.Series:
+    """``str(value or "").strip()`` for a whole column."""
+    values = series.astype(object)
+    present = values.notna()
+    present[present] = values[present].map(bool)
+    out = pd.Series("", index=series.index, dtype=object)
+    if present.any():
+        out[present] = values[present].map(str).str.strip()
+    return out
+
+
+def _ints(series: pd.Series) -> pd.Series:
+    """``int(float(value))`` or None, like the old ``parse_int``."""
+    values = series.astype(object)
+    is_text = values.map(lambda v: isinstance(v, str))
+    values[is_text] = values[is_text].str.strip()
+    numbers = pd.to_numeric(values, errors="coerce").astype(float)
+    numbers[~np.isfinite(numbers)] = np.nan
+    return pd.Series(np.trunc(numbers), index=series.index).astype("Int64")
+
+
+def _dates(series: pd.Series) -> pd.Series:
+    """Dates in any of ``DATE_FORMATS``; cells Excel already typed as dates are kept."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.to_datetime(series, errors="coerce")
+    values = series.astype(object)
+    typed = values.map(lambda v: isinstance(v, (datetime, date)))
+    parsed = pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+    if typed.any():
+        parsed[typed] = pd.to_datetime(values[typed], errors="coerce")
+    text = _text(values.where(~typed))
+    for fmt in DATE_FORMATS:
+        pending = parsed.isna() & (text != "")
+        if not pending.any():
+            break
+        parsed[pending] = pd.to_datetime(text[pending], format=fmt, errors="coerce")
+    return parsed
+
+
+def normalize_frame(df: pd.DataFrame, mapping: Dict[str, Optional[str]]) -> pd.DataFrame:
+    """Typed, cleaned columns for the mapped fields; rows without a name are dropped."""
+    def column(key):
+        col = mapping.get(key)
+        if col is None or col not in df.columns:
+            return None
+        return df[col]
+
+    raw_name = column("name")
+    out = pd.DataFrame(index=df.index)
+    out["name"] = _text(raw_name) if raw_name is not None else ""
+    for key in ("country", "city", "description", "website", "level", "requirements", "language"):
+        if column(key) is not None:
+            out[key] = _text(column(key))
+    if "country" in out:
+        out.loc[out["country"] == "", "country"] = "Italy"
+    if column("student_count") is not None:
+        out["student_count"] = _ints(column("student_count"))
+    if column("deadline") is not None:
+        out["deadline"] = _dates(column("deadline"))
+    out["duration_years"] = (
+        _ints(column("duration_years")).fillna(0).replace(0, 3)
+        if column("duration_years") is not None else 3
+    )
+    if "language" in out:
+        out.loc[out["language"] == "", "language"] = "English"
+    else:
+        out["language"] = "English"
+    if "requirements" not in out:
+        out["requirements"] = ""
+    if column("majors") is not None:
+        majors = _text(column("majors")).str.split(MAJOR_SEPARATORS, regex=True)
+        out["majors"] = majors.map(lambda parts: [p.strip() for p in parts if p.strip()])
+    else:
+        out["majors"] = [[] for _ in range(len(out))]
+    return out[out["name"] != ""]
+
+
+def _python(value):
+    if value is pd.NaT or value is None:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    if value is pd.NA:
+        return None
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+# --- Applying ----------------------------------------------------------------
+
+@dataclass
+class ImportStats:
+    rows: int = 0
+    created_universities: int = 0
+    updated_universities: int = 0
+    unchanged_universities: int = 0
+    created_majors: int = 0
+    created_links: int = 0
+    elapsed: float = 0.0
+    actions: deque = field(default_factory=lambda: deque(maxlen=20))
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Universities: created {self.created_universities}, updated {self.updated_universities}, "
+            f"unchanged {self.unchanged_universities}; Majors created {self.created_majors}; "
+            f"Links created {self.created_links}"
+        )
+
+
+class UniversityImporter:
+    """Apply normalized frames chunk by chunk; call ``finish()`` once at the end."""
+
+    def __init__(self, mapping: Dict[str, Optional[str]], batch_size: int = DEFAULT_BATCH_SIZE):
+        self.mapping = mapping
+        self.batch_size = batch_size
+        # Only mapped columns are written; description always is, as before
+        self.fields = [f for f in UNIVERSITY_FIELDS if mapping.get(f)]
+        if "description" not in self.fields:
+            self.fields.append("description")
+        self.stats = ImportStats()
+        self.touched_universities = set()
+        self.touched_majors = set()
+
+    def import_frame(self, df: pd.DataFrame) -> ImportStats:
+        started = time.perf_counter()
+        frame = normalize_frame(df, self.mapping)
+        self.stats.rows += len(df)
+        if len(frame):
+            for start in range(0, len(frame), self.batch_size):
+                self._apply(frame.iloc[start:start + self.batch_size])
+        self.stats.elapsed += time.perf_counter() - started
+        return self.stats
+
+    def _university_values(self, row) -> dict:
+        values = {}
+        for name in self.fields:
+            value = _python(row[name]) if name in row else ""
+            if name == "deadline" and value is None:
+                continue
+            values[name] = value
+        return values
+
+    def _apply(self, frame: pd.DataFrame) -> None:
+        # Last row wins for university fields; majors are collected from every row
+        records = frame.to_dict("records")
+        latest = {}
+        for record in records:
+            previous = latest.get(record["name"])
+            if previous is not None and "deadline" in record and _python(record["deadline"]) is None:
+                # An unparsed deadline never cleared the value set by an earlier row
+                record = {**record, "deadline": previous["deadline"]}
+            latest[record["name"]] = record
+
+        existing = {}
+        for uni in University.objects.filter(name__in=list(latest)).order_by("-id"):
+            existing[uni.name] = uni  # lowest id wins for duplicate names
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for name, record in latest.items():
+            values = self._university_values(record)
+            uni = existing.get(name)
+            if uni is None:
+                to_create.append(University(name=name, **values))
+                self.stats.actions.append(f"Created University: {name}")
+                continue
+            changed = {k: v for k, v in values.items() if getattr(uni, k) != v}
+            if changed:
+                for k, v in changed.items():
+                    setattr(uni, k, v)
+                uni.updated_at = now
+                to_update.append(uni)
+                self.stats.actions.append(f"Updated University: {name}")
+            else:
+                self.stats.unchanged_universities += 1
+
+        if to_create:
+            University.objects.bulk_create(to_create, batch_size=self.batch_size)
+        if to_update:
+            University.objects.bulk_update(to_update, [*self.fields, "updated_at"], batch_size=self.batch_size)
+        self.stats.created_universities += len(to_create)
+        self.stats.updated_universities += len(to_update)
+
+        # Ids of created rows are re-read so this works on every backend
+        uni_ids = {u.name: u.id for u in existing.values()}
+        if to_create:
+            created = University.objects.filter(name__in=[u.name for u in to_create]).order_by("-id")
+            created = dict(created.values_list("name", "id"))
+            uni_ids.update(created)
+            self.touched_universities.update(created.values())
+        self.touched_universities.update(u.id for u in to_update)
+
+        major_ids = self._ensure_majors({m for r in records for m in r["majors"]})
+        self._link(records, uni_ids, major_ids)
+
+    def _ensure_majors(self, names) -> Dict[str, int]:
+        if not names:
+            return {}
+        major_ids = dict(Major.objects.filter(name__in=list(names)).order_by("-id").values_list("name", "id"))
+        missing = sorted(names - set(major_ids))
+        if missing:
+            Major.objects.bulk_create(
+                [Major(name=n, description="", category="") for n in missing], batch_size=self.batch_size,
+            )
+            created = Major.objects.filter(name__in=missing).order_by("-id").values_list("name", "id")
+            created = dict(created)
+            major_ids.update(created)
+            self.touched_majors.update(created.values())
+            self.stats.created_majors += len(missing)
+            self.stats.actions.extend(f"Created Major: {n}" for n in missing)
+        return major_ids
+
+    def _link(self, records, uni_ids, major_ids) -> None:
+        # First row mentioning a pair supplies the link attributes
+        wanted = {}
+        for record in records:
+            uni_id = uni_ids.get(record["name"])
+            for major_name in record["majors"]:
+                key = (uni_id, major_ids[major_name])
+                if uni_id is not None and key not in wanted:
+                    wanted[key] = (record, major_name)
+        if not wanted:
+            return
+        existing = set(
+            UniversityMajor.objects.filter(university_id__in={u for u, _ in wanted})
+            .values_list("university_id", "major_id")
+        )
+        links = []
+        for (uni_id, major_id), (record, major_name) in wanted.items():
+            if (uni_id, major_id) in existing:
+                continue
+            links.append(UniversityMajor(
+                university_id=uni_id,
+                major_id=major_id,
+                duration_years=int(_python(record["duration_years"]) or 3),
+                language=record["language"],
+                requirements=record["requirements"],
+            ))
+            self.touched_universities.add(uni_id)
+            self.stats.actions.append(f"Linked {record['name']} - {major_name}")
+        if links:
+            UniversityMajor.objects.bulk_create(links, batch_size=self.batch_size, ignore_conflicts=True)
+            self.stats.created_links += len(links)
+
+    def finish(self) -> ImportStats:
+        """Refresh what post_save signals would have: catalog version and search documents.
+
+        Safe to call after every committed chunk; only rows touched since the
+        previous call are reindexed.
+        """
+        started = time.perf_counter()
+        if self.touched_majors:
+            search.index_objects("major", sorted(self.touched_majors))
+        if self.touched_universities:
+            search.index_objects("university", sorted(self.touched_universities))
+        if self.touched_universities or self.touched_majors:
+            bump_catalog_version()
+        self.touched_universities.clear()
+        self.touched_majors.clear()
+        self.stats.elapsed += time.perf_counter() - started
+        return self.stats
+
+
+# --- Streaming sources ---------------------------------------------------------
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fetch_to_tempfile(url: str, suffix: str = ".csv", timeout: int = 60):
+    """Download ``url`` to a temporary file in blocks; returns ``(path, sha256)``.
+
+    The caller removes the file.
+    """
+    digest = hashlib.sha256()
+    with urllib.request.urlopen(url, timeout=timeout) as response, \
+            tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as out:
+        for block in iter(lambda: response.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+            out.write(block)
+    return out.name, digest.hexdigest()
+
+
+def iter_csv_chunks(path, chunk_size: int = DEFAULT_CHUNK_SIZE, skip_rows: int = 0, encoding: str = "utf-8"):
+    """DataFrames of at most ``chunk_size`` rows, starting after ``skip_rows`` data rows."""
+    reader = pd.read_csv(
+        path, encoding=encoding, chunksize=chunk_size,
+        # keep the header line, skip already imported data lines
+        skiprows=range(1, skip_rows + 1) if skip_rows else None,
+    )
+    with reader:
+        yield from reader
+
+
+def iter_excel_chunks(path, sheet_name=None, chunk_size: int = DEFAULT_CHUNK_SIZE, skip_rows: int = 0):
+    """Same as ``iter_csv_chunks`` for .xlsx, via openpyxl's read-only row iterator."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        for _ in range(skip_rows):
+            if next(rows, None) is None:
+                return
+        chunk = []
+        for row in rows:
+            chunk.append(row[:len(columns)])
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=columns)
+    finally:
+        workbook.close()
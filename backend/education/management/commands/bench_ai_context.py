@@ -0,0 +1,59 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from education.ai_context import build_prompt, prompt_tokens
+
+WORDS = (
+    "университет виза документы дедлайн стипендия регистрация Universitaly IELTS TOLC "
+    "апостиль перевод консульство факультет бакалавриат магистратура экзамен заявка "
+    "мотивационное письмо рекомендация общежитие страховка бюджет ISEE DSU codice fiscale"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Benchmark AI chat prompt size vs conversation length: last-N trimming vs token-budgeted compaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lengths", default="4,10,20,40,80,160", help="Conversation lengths (messages) to test")
+        parser.add_argument("--budget", type=int, default=None, help="Token budget (default: AI_CONTEXT_TOKEN_BUDGET)")
+        parser.add_argument("--max-history", type=int, default=20, help="Legacy message-count window (default: 20)")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def _sentence(self, rng, words):
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    def _message(self, rng, role):
+        # Students write short questions; answers are several paragraphs
+        sentences = rng.randint(1, 4) if role == "user" else rng.randint(6, 20)
+        return {"role": role, "content": " ".join(self._sentence(rng, rng.randint(6, 16)) for _ in range(sentences))}
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        lengths = [int(n) for n in options["lengths"].split(",") if n.strip()]
+        system = [
+            {"role": "system", "content": "Ты — дружелюбный помощник по учебе. Отвечай кратко и по делу."},
+            {"role": "system", "content": "Контекст студента: " + self._sentence(rng, 60)},
+        ]
+        turns = [self._message(rng, "user" if i % 2 == 0 else "assistant") for i in range(max(lengths))]
+
+        self.stdout.write(f"{'messages':>8} {'full':>8} {'last-N':>8} {'budgeted':>9} {'sent turns':>10} {'build ms':>9}")
+        conversation = f"bench:{uuid.uuid4().hex}"
+        for n in lengths:
+            history = turns[:n]
+            # The last message of a request is always from the student
+            if history[-1]["role"] != "user":
+                history = history[:-1]
+            full = system + history
+            legacy = full[-options["max_history"]:]
+            started = time.perf_counter()
+            compacted = build_prompt(full, conversation, budget=options["budget"], max_turns=options["max_history"])
+            elapsed = (time.perf_counter() - started) * 1000
+            sent = sum(1 for m in compacted if m["role"] != "system")
+            self.stdout.write(
+                f"{len(full):>8} {prompt_tokens(full):>8} {prompt_tokens(legacy):>8} "
+                f"{prompt_tokens(compacted):>9} {sent:>10} {elapsed:>9.2f}"
+            )
+        self.stdout.write("Token counts are local estimates (education.ai_context.estimate_tokens).")
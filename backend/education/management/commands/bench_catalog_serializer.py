@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from education.models import Major, University, UniversityMajor
+from education.serializers import UniversityCatalogSerializer, UniversitySerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark catalog serialization: UniversitySerializer vs UniversityCatalogSerializer (rows/sec)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000, help="Synthetic universities to create (default: 2000)")
+        parser.add_argument("--majors", type=int, default=5, help="Majors linked to each university (default: 5)")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per serializer; best is reported")
+        parser.add_argument("--existing", action="store_true", help="Benchmark the existing catalog instead of synthetic rows")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if not options["existing"]:
+                    self._create_rows(options["rows"], options["majors"])
+                self._run(options["repeat"])
+                # Synthetic rows are never kept
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _create_rows(self, rows, majors_per_row):
+        majors = Major.objects.bulk_create(
+            [Major(name=f"Bench major {i}", description="Synthetic", category="bench") for i in range(max(majors_per_row * 4, 1))]
+        )
+        universities = University.objects.bulk_create([
+            University(
+                name=f"Bench university {i:06d}", country="Italy", city="Roma",
+                description="Synthetic row for serializer benchmark " * 4,
+                logo=f"universities/bench_{i}.png" if i % 2 else "https://example.com/logo.png",
+                latitude=41.9, longitude=12.5,
+            )
+            for i in range(rows)
+        ])
+        UniversityMajor.objects.bulk_create([
+            UniversityMajor(university=u, major=majors[(i + j) % len(majors)])
+            for i, u in enumerate(universities)
+            for j in range(majors_per_row)
+        ])
+
+    def _run(self, repeat):
+        # Default host "testserver" is not in ALLOWED_HOSTS
+        request = APIRequestFactory().get("/api/education/universities/", SERVER_NAME="localhost")
+        context = {"request": request}
+        count = University.objects.filter(is_active=True).count()
+        if not count:
+            raise CommandError("No universities to serialize")
+
+        def baseline():
+            qs = University.objects.filter(is_active=True).prefetch_related("majors__major").order_by("name", "id")
+            return UniversitySerializer(qs, many=True, context=context).data
+
+        def fast():
+            qs = University.objects.filter(is_active=True).order_by("name", "id")
+            return UniversityCatalogSerializer(qs, context=context).data
+
+        results = {}
+        outputs = {}
+        for label, fn in (("UniversitySerializer", baseline), ("UniversityCatalogSerializer", fast)):
+            best = None
+            for _ in range(max(repeat, 1)):
+                started = time.perf_counter()
+                outputs[label] = fn()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = best
+            self.stdout.write(f"{label:<28} {count / best:>12,.0f} rows/sec  ({best * 1000:.1f} ms for {count} rows)")
+
+        same = [dict(r) for r in outputs["UniversitySerializer"]] == outputs["UniversityCatalogSerializer"]
+        speedup = results["UniversitySerializer"] / results["UniversityCatalogSerializer"]
+        style = self.style.SUCCESS if same else self.style.ERROR
+        self.stdout.write(style(f"Speedup: {speedup:.1f}x; identical output: {same}"))
@@ -1,5 +1,4 @@
-import re
-from typing import Dict, List, Optional
+import os
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
@@ -9,30 +8,11 @@ try:
 except Exception as e:  # pragma: no cover
     raise CommandError("pandas is required. Install with: pip install pandas") from e
 
-from education.models import University, Major, UniversityMajor
-
-
-def pick_column(df: "pd.DataFrame", candidates: List[str]) -> Optional[str]:
-    cols = {c.lower().strip(): c for c in df.columns}
-    for cand in candidates:
-        key = cand.lower().strip()
-        if key in cols:
-            return cols[key]
-    # try loose contains match
-    for key, orig in cols.items():
-        for cand in candidates:
-            if cand.lower() in key:
-                return orig
-    return None
-
-
-def get_value(row, col):
-    if not col:
-        return None
-    val = row.get(col)
-    if pd.isna(val):
-        return None
-    return val
+from education.importer import (
+    DEFAULT_BATCH_SIZE, DEFAULT_CHUNK_SIZE, UniversityImporter, fetch_to_tempfile, file_sha256,
+    iter_csv_chunks, iter_excel_chunks, map_columns,
+)
+from education.models import ImportCheckpoint
 
 
 class Command(BaseCommand):
@@ -49,6 +29,11 @@ class Command(BaseCommand):
         parser.add_argument("--limit", type=int, default=None, help="Limit rows to import")
         parser.add_argument("--dry-run", action="store_true", help="Validate without saving")
         parser.add_argument("--majors-col", dest="majors_col", help="Explicit majors column name (comma/semicolon separated)")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per bulk write (default: {DEFAULT_BATCH_SIZE})")
+        # Streaming mode: read in chunks, commit and checkpoint after each one
+        parser.add_argument("--stream", action="store_true", help="Read the file in chunks and commit after each chunk")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"Rows per streamed chunk (default: {DEFAULT_CHUNK_SIZE})")
+        parser.add_argument("--resume", action="store_true", help="Continue a streamed import of the same file from its checkpoint (implies --stream)")
 
     def handle(self, *args, **options):
         excel_path = options.get("excel_path")
@@ -58,7 +43,9 @@ class Command(BaseCommand):
         encoding = options.get("encoding")
         limit = options.get("limit")
         dry_run = options.get("dry_run")
-        majors_col_override = options.get("majors_col")
+
+        if options.get("stream") or options.get("resume"):
+            return self.handle_stream(options)
 
         # Read dataframe
         try:
@@ -78,138 +65,131 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.NOTICE(f"Loaded {len(df)} rows with columns: {list(df.columns)}"))
 
-        # Column mapping (English + Russian variants)
-        col_name = pick_column(df, ["name", "университет", "название", "university", "uni name"]) or "name"
-        col_country = pick_column(df, ["country", "страна"]) or None
-        col_city = pick_column(df, ["city", "город"]) or None
-        col_desc = pick_column(df, ["description", "описание", "about"]) or None
-        col_site = pick_column(df, ["website", "сайт", "url", "link"]) or None
-        col_level = pick_column(df, ["level", "уровень"]) or None
-        col_students = pick_column(df, ["students", "student_count", "студентов"]) or None
-        # Optional deadline column (submission deadline)
-        col_deadline = pick_column(df, [
-            "deadline",
-            "application deadline",
-            "дедлайн",
-            "срок подачи",
-            "срок подачи документов",
-        ]) or None
-        col_majors = majors_col_override or pick_column(df, ["majors", "specialties", "направления", "специальности", "faculties", "факультеты"]) or None
-        col_lang = pick_column(df, ["language", "язык", "language of instruction"]) or None
-        col_requirements = pick_column(df, ["requirements", "требования"]) or None
-        col_duration = pick_column(df, ["duration", "duration_years", "продолжительность"]) or None
-
-        created_unis = 0
-        updated_unis = 0
-        created_majors = 0
-        created_links = 0
-
-        actions = []
-
+        importer = UniversityImporter(
+            map_columns(df.columns, options.get("majors_col")),
+            batch_size=max(options["batch_size"], 1),
+        )
         with transaction.atomic():
-            for _, row in df.iterrows():
-                name = str(get_value(row, col_name) or "").strip()
-                if not name:
-                    continue
-
-                fields = {}
-                if col_country: fields["country"] = str(get_value(row, col_country) or "").strip() or "Italy"
-                if col_city: fields["city"] = str(get_value(row, col_city) or "").strip() or ""
-                if col_desc: fields["description"] = str(get_value(row, col_desc) or "").strip()
-                if col_site: fields["website"] = str(get_value(row, col_site) or "").strip()
-
-                def parse_int(v):
-                    if v is None: return None
-                    try:
-                        return int(float(v))
-                    except Exception:
-                        return None
-
-                def parse_decimal(v):
-                    if v is None: return None
-                    try:
-                        s = str(v).replace(" ", "").replace(",", ".")
-                        return float(s)
-                    except Exception:
-                        return None
-
-                if col_level: fields["level"] = str(get_value(row, col_level) or "").strip()
-                if col_students: fields["student_count"] = parse_int(get_value(row, col_students))
-                # Parse deadline in flexible formats (YYYY-MM-DD, DD.MM.YYYY, MM/DD/YYYY, etc.)
-                if col_deadline:
-                    raw_deadline = get_value(row, col_deadline)
-                    parsed = None
-                    if raw_deadline is not None:
-                        try:
-                            from datetime import datetime
-                            s = str(raw_deadline).strip()
-                            # Try ISO first
-                            for fmt in ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%m/%d/%Y", "%Y/%m/%d"):
-                                try:
-                                    parsed = datetime.strptime(s, fmt).date()
-                                    break
-                                except Exception:
-                                    continue
-                        except Exception:
-                            parsed = None
-                    if parsed:
-                        fields["deadline"] = parsed
-
-                # Ensure description not empty (required=True in model). Provide default.
-                if not fields.get("description"):
-                    fields["description"] = ""
-
-                uni, created = University.objects.update_or_create(
-                    name=name,
-                    defaults=fields,
-                )
-
-                if created:
-                    created_unis += 1
-                    actions.append(f"Created University: {uni.name}")
-                else:
-                    updated_unis += 1
-                    actions.append(f"Updated University: {uni.name}")
-
-                # Parse majors and link
-                majors_raw = get_value(row, col_majors) if col_majors else None
-                if majors_raw:
-                    # split by ; , or / or | newlines
-                    parts = re.split(r"[;,/\n\|]", str(majors_raw))
-                    for part in parts:
-                        mname = part.strip()
-                        if not mname:
-                            continue
-                        major, m_created = Major.objects.get_or_create(name=mname, defaults={"description": "", "category": ""})
-                        if m_created:
-                            created_majors += 1
-                            actions.append(f"Created Major: {major.name}")
-
-                        link_defaults = {
-                            "duration_years": parse_int(get_value(row, col_duration)) or 3,
-                            "language": str(get_value(row, col_lang) or "English").strip() or "English",
-                            "requirements": str(get_value(row, col_requirements) or "").strip(),
-                        }
-                        _, link_created = UniversityMajor.objects.get_or_create(
-                            university=uni,
-                            major=major,
-                            defaults=link_defaults,
-                        )
-                        if link_created:
-                            created_links += 1
-                            actions.append(f"Linked {uni.name} - {major.name}")
-
+            stats = importer.import_frame(df)
             if dry_run:
                 transaction.set_rollback(True)
+        if not dry_run:
+            importer.finish()
 
-        self.stdout.write(self.style.SUCCESS(
-            f"Universities: created {created_unis}, updated {updated_unis}; Majors created {created_majors}; Links created {created_links}"
-        ))
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
+        self.stdout.write(f"Processed {stats.rows} rows in {stats.elapsed:.2f}s ({stats.rows_per_sec:,.0f} rows/sec)")
 
         # Print a short summary log (last 20 actions)
-        if actions:
-            for line in actions[-20:]:
+        for line in stats.actions:
+            self.stdout.write(" - " + line)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry-run complete. No changes were saved."))
+
+    def handle_stream(self, options):
+        csv_url = options.get("csv_url")
+        downloaded = None
+        try:
+            if csv_url:
+                self.stdout.write(self.style.NOTICE(f"Downloading {csv_url}"))
+                try:
+                    downloaded, file_hash = fetch_to_tempfile(csv_url)
+                except Exception as e:
+                    raise CommandError(f"Failed to download input: {e}")
+                path, source = downloaded, csv_url
+            else:
+                path = source = options.get("excel_path") or options.get("csv_path")
+                try:
+                    file_hash = file_sha256(path)
+                except OSError as e:
+                    raise CommandError(f"Failed to read input: {e}")
+            self._stream(path, source, file_hash, options)
+        finally:
+            if downloaded:
+                os.unlink(downloaded)
+
+    def _stream(self, path, source, file_hash, options):
+        dry_run = options.get("dry_run")
+        limit = options.get("limit")
+        sheet = options.get("sheet_name") or ""
+        chunk_size = max(options["chunk_size"], 1)
+
+        checkpoint = (
+            ImportCheckpoint.objects.filter(file_hash=file_hash, sheet=sheet).first()
+            or ImportCheckpoint(file_hash=file_hash, sheet=sheet)
+        )
+        if options.get("resume"):
+            if checkpoint.completed:
+                self.stdout.write(self.style.SUCCESS(f"Already imported ({checkpoint.rows_done} rows); nothing to resume."))
+                return
+            offset = checkpoint.rows_done
+        else:
+            offset = 0
+        checkpoint.source = source[:500]
+        checkpoint.rows_done = offset
+        checkpoint.completed = False
+        if not dry_run:
+            checkpoint.save()
+        self.stdout.write(self.style.NOTICE(f"Streaming {source} (sha256 {file_hash[:12]}) from row {offset}"))
+
+        if options.get("excel_path"):
+            chunks = iter_excel_chunks(path, options.get("sheet_name"), chunk_size, skip_rows=offset)
+        else:
+            chunks = iter_csv_chunks(path, chunk_size, skip_rows=offset, encoding=options.get("encoding"))
+
+        importer = None
+        imported = 0
+        exhausted = True
+        try:
+            for df in chunks:
+                if limit is not None:
+                    room = limit - imported
+                    if len(df) > room:
+                        df = df.head(room)
+                        exhausted = False
+                    if df.empty:
+                        break
+                if importer is None:
+                    importer = UniversityImporter(
+                        map_columns(df.columns, options.get("majors_col")),
+                        batch_size=max(options["batch_size"], 1),
+                    )
+                start = offset + imported
+                try:
+                    with transaction.atomic():
+                        importer.import_frame(df)
+                        if dry_run:
+                            transaction.set_rollback(True)
+                        else:
+                            checkpoint.rows_done = start + len(df)
+                            checkpoint.save(update_fields=["rows_done", "updated_at"])
+                except Exception as e:
+                    raise CommandError(
+                        f"Chunk at rows {start}-{start + len(df)} failed: {e}. "
+                        f"Rows before {start} are committed; rerun with --resume to continue."
+                    )
+                imported += len(df)
+                if not dry_run:
+                    importer.finish()
+                self.stdout.write(f"  rows {offset + imported}: {importer.stats.rows_per_sec:,.0f} rows/sec")
+                if not exhausted:
+                    break
+        finally:
+            chunks.close()
+
+        if importer is None:
+            self.stdout.write(self.style.WARNING("No rows to import."))
+        else:
+            stats = importer.stats
+            self.stdout.write(self.style.SUCCESS(stats.summary()))
+            self.stdout.write(f"Processed {stats.rows} rows in {stats.elapsed:.2f}s ({stats.rows_per_sec:,.0f} rows/sec)")
+            for line in stats.actions:
                 self.stdout.write(" - " + line)
 
         if dry_run:
             self.stdout.write(self.style.WARNING("Dry-run complete. No changes were saved."))
+        elif exhausted:
+            checkpoint.completed = True
+            checkpoint.save(update_fields=["completed", "updated_at"])
+        else:
+            self.stdout.write(self.style.WARNING(f"Stopped at row {offset + imported}; use --resume to continue."))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from education.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild search documents for universities, majors and courses (after bulk imports)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Objects per upsert batch (default: 500)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = rebuild_index(batch_size=options["batch_size"])
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{entity}: {count}" for entity, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary} in {elapsed:.2f}s"))
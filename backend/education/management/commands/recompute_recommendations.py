@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from education import recommendations
+
+_worker_index = None
+
+
+def _init_worker(index):
+    # The catalog index is pickled once per worker, not once per user
+    global _worker_index
+    _worker_index = index
+
+
+def _compute(args):
+    user_id, profile, applied, has_documents = args
+    return user_id, recommendations.recommend(profile, applied, has_documents, index=_worker_index)
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute AI recommendations for users whose profile or applications changed "
+        "since their recommendations were last computed (nightly job)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Recompute every active user (e.g. after a catalog import)")
+        parser.add_argument("--batch-size", type=int, default=500, help="Users per load/write batch (default: 500)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes; 1 computes in-process (default: CPU count)")
+        parser.add_argument("--limit", type=int, default=None, help="Process at most N users")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many users would be recomputed")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = max(options["batch_size"], 1)
+        workers = max(options["workers"], 1)
+
+        total = get_user_model().objects.filter(is_active=True).count()
+        user_ids = list(recommendations.stale_user_ids(force=options["all"]))
+        skipped = total - len(user_ids)
+        if options["limit"]:
+            user_ids = user_ids[:options["limit"]]
+        self.stdout.write(self.style.NOTICE(f"{len(user_ids)} of {total} active users to recompute, {skipped} up to date"))
+        if options["dry_run"] or not user_ids:
+            return
+
+        index = recommendations.get_index()
+        pool = None
+        if workers > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            # fork: workers inherit the configured Django app registry
+            context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+            pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(index,),
+            )
+        else:
+            _init_worker(index)
+
+        users = rows = 0
+        compute_time = write_time = 0.0
+        try:
+            for start in range(0, len(user_ids), batch_size):
+                loaded_at = timezone.now()
+                inputs = recommendations.load_inputs(user_ids[start:start + batch_size])
+
+                t = time.perf_counter()
+                if pool is not None:
+                    chunksize = max(len(inputs) // (workers * 4), 1)
+                    results = dict(pool.map(_compute, inputs, chunksize=chunksize))
+                else:
+                    results = dict(map(_compute, inputs))
+                compute_time += time.perf_counter() - t
+
+                t = time.perf_counter()
+                rows += recommendations.save_batch(results, computed_at=loaded_at)
+                write_time += time.perf_counter() - t
+
+                users += len(inputs)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {users}/{len(user_ids)} users ({users / elapsed:,.0f} users/sec)")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed {users} users ({rows} recommendations), skipped {skipped} up to date, "
+            f"in {elapsed:.2f}s ({users / elapsed:,.0f} users/sec; compute {compute_time:.2f}s, write {write_time:.2f}s, "
+            f"{workers} worker{'s' if workers > 1 else ''})"
+        ))
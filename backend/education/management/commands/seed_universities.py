@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
+from education.catalog import bump_catalog_version
+from education.geo import encode_geohash
 from education.models import University, Major, UniversityMajor
 
 SAMPLE_UNIVERSITIES = [
@@ -257,6 +259,10 @@ class Command(BaseCommand):
                 if 'longitude' in uni_data:
                     update_fields['longitude'] = uni_data['longitude']
                 if update_fields:
+                    update_fields['geohash'] = encode_geohash(
+                        update_fields.get('latitude', uni.latitude),
+                        update_fields.get('longitude', uni.longitude),
+                    )
                     University.objects.filter(pk=uni.pk).update(**update_fields)
                     uni.refresh_from_db()
             # If logo empty and we have a string URL, store it as text in the FileField name
@@ -274,4 +280,7 @@ class Command(BaseCommand):
             if created:
                 created_universities += 1
 
+        # Queryset updates above bypass model signals
+        bump_catalog_version()
+
         self.stdout.write(self.style.SUCCESS(f"Seed complete. Universities created: {created_universities}"))
@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+POSTGRES_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE education_searchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX education_searchdoc_vector_idx ON education_searchdocument USING gin (search_vector)",
+    "CREATE INDEX education_searchdoc_title_trgm_idx ON education_searchdocument USING gin (title gin_trgm_ops)",
+]
+
+SQLITE_INDEX_SQL = [
+    """
+    CREATE VIRTUAL TABLE education_searchdocument_fts USING fts5(
+        title, body,
+        content='education_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER education_searchdocument_ai AFTER INSERT ON education_searchdocument BEGIN
+        INSERT INTO education_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER education_searchdocument_ad AFTER DELETE ON education_searchdocument BEGIN
+        INSERT INTO education_searchdocument_fts(education_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER education_searchdocument_au AFTER UPDATE ON education_searchdocument BEGIN
+        INSERT INTO education_searchdocument_fts(education_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO education_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS education_searchdocument_ai",
+    "DROP TRIGGER IF EXISTS education_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS education_searchdocument_au",
+    "DROP TABLE IF EXISTS education_searchdocument_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        statements = POSTGRES_INDEX_SQL
+    elif vendor == 'sqlite':
+        statements = SQLITE_INDEX_SQL
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    # On PostgreSQL the column and indexes go away with the table
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+# Frozen copies of the education.search body builders as of this migration:
+# later changes to the live builders or to the models must not alter it.
+# Documents built differently since then are refreshed by rebuild_search_index.
+def university_body(university, major_names):
+    return ' '.join([university.city, university.country, university.level, university.description, *major_names])
+
+
+def major_body(major):
+    return f"{major.category} {major.description}"
+
+
+def course_body(course):
+    return ' '.join([course.description, course.instructor, course.university.name, course.major.name])
+
+
+def backfill_documents(apps, schema_editor):
+    University = apps.get_model('education', 'University')
+    Major = apps.get_model('education', 'Major')
+    UniversityMajor = apps.get_model('education', 'UniversityMajor')
+    Course = apps.get_model('education', 'Course')
+    SearchDocument = apps.get_model('education', 'SearchDocument')
+
+    major_names = dict(Major.objects.values_list('id', 'name'))
+    uni_majors = {}
+    for uni_id, major_id in UniversityMajor.objects.values_list('university_id', 'major_id'):
+        uni_majors.setdefault(uni_id, []).append(major_names.get(major_id, ''))
+
+    docs = []
+    for u in University.objects.all().iterator():
+        body = university_body(u, uni_majors.get(u.id, []))
+        docs.append(SearchDocument(entity='university', object_id=u.id, title=u.name[:255], body=body))
+    for m in Major.objects.all().iterator():
+        docs.append(SearchDocument(entity='major', object_id=m.id, title=m.name[:255], body=major_body(m)))
+    for c in Course.objects.select_related('university', 'major').iterator():
+        docs.append(SearchDocument(entity='course', object_id=c.id, title=c.title[:255], body=course_body(c)))
+    SearchDocument.objects.bulk_create(docs, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0011_university_latitude_university_longitude'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('university', 'University'), ('major', 'Major'), ('course', 'Course')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('entity', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
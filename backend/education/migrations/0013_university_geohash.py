@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:54
+
+from django.db import migrations, models
+
+from education.geo import encode_geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    University = apps.get_model('education', 'University')
+    rows = list(University.objects.exclude(latitude=None).exclude(longitude=None).only('id', 'latitude', 'longitude'))
+    for u in rows:
+        u.geohash = encode_geohash(u.latitude, u.longitude)
+    University.objects.bulk_update(rows, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0012_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='university',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='university',
+            index=models.Index(fields=['latitude', 'longitude'], name='education_uni_lat_lon_idx'),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+import hashlib
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_keys(apps, schema_editor):
+    """Key legacy rows by their text; identical copies (one set per old POST) collapse to the newest."""
+    AIRecommendation = apps.get_model('education', 'AIRecommendation')
+    seen = set()
+    duplicates = []
+    rows = AIRecommendation.objects.order_by('user_id', '-created_at', '-id').values_list('id', 'user_id', 'title', 'content', 'is_read')
+    updates = []
+    for pk, user_id, title, content, is_read in rows.iterator():
+        key = 'legacy:' + hashlib.sha1(f'{title}\x00{content}'.encode()).hexdigest()[:16]
+        if (user_id, key) in seen:
+            duplicates.append(pk)
+            continue
+        seen.add((user_id, key))
+        updates.append(AIRecommendation(id=pk, key=key))
+    AIRecommendation.objects.bulk_update(updates, ['key'], batch_size=1000)
+    for start in range(0, len(duplicates), 1000):
+        AIRecommendation.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0015_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airecommendation',
+            name='key',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='airecommendation',
+            name='score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='airecommendation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0016_airecommendation_key'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='airecommendation',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='education_airec_user_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_computed_at(apps, schema_editor):
+    # Users with computed items keep their last run as the watermark instead of all being stale
+    AIRecommendation = apps.get_model('education', 'AIRecommendation')
+    RecommendationState = apps.get_model('education', 'RecommendationState')
+    rows = (
+        AIRecommendation.objects.exclude(key__startswith='legacy:')
+        .values('user_id').annotate(computed_at=models.Max('updated_at'))
+    )
+    RecommendationState.objects.bulk_create(
+        [RecommendationState(user_id=row['user_id'], computed_at=row['computed_at']) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('education', '0017_airecommendation_user_key_uniq'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('computed_at', models.DateTimeField(blank=True, null=True)),
+                ('inputs_changed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_computed_at, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+from .geo import encode_geohash
+
 User = get_user_model()
 
 
@@ -18,6 +20,8 @@ class University(models.Model):
     deadline = models.DateField(null=True, blank=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # Derived from latitude/longitude in save(); used for map clustering
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -25,8 +29,18 @@ class University(models.Model):
     def __str__(self):
         return f"{self.name} ({self.country})"
 
+    def save(self, *args, **kwargs):
+        self.geohash = encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name_plural = "Universities"
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='education_uni_lat_lon_idx'),
+        ]
 
 
 class StudentProgress(models.Model):
@@ -179,16 +193,38 @@ class UserAchievement(models.Model):
 
 class AIRecommendation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_recommendations')
+    # Stable identity of the recommended item (e.g. 'university:12', 'prep:ielts');
+    # regeneration upserts on (user, key) instead of adding duplicates
+    key = models.CharField(max_length=100)
     title = models.CharField(max_length=200)
     content = models.TextField()
     category = models.CharField(max_length=100)
     priority = models.IntegerField(default=1)
+    score = models.FloatField(null=True, blank=True)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.email} - {self.title}"
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='education_airec_user_key_uniq'),
+        ]
+
+
+class RecommendationState(models.Model):
+    """Per-user watermarks for ``recompute_recommendations`` (education.recommendations.stale_user_ids)."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation_state')
+    # When the inputs of the last computation were read; set even when it produced no items
+    computed_at = models.DateTimeField(null=True, blank=True)
+    # Input changes that updated_at columns cannot show: deleted applications, documents
+    inputs_changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.computed_at}"
+
 
 class StudyPlan(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_plans')
@@ -256,4 +292,90 @@ class UserEvent(models.Model):
         ordering = ['date', 'id']
 
     def __str__(self):
-        return f"{self.user.email} - {self.title} ({self.date})"
\ No newline at end of file
+        return f"{self.user.email} - {self.title} ({self.date})"
+
+class SearchDocument(models.Model):
+    """Denormalized searchable text for a catalog entity (see education.search).
+
+    The full-text index itself lives outside the ORM: a generated ``tsvector``
+    column with GIN/trigram indexes on PostgreSQL, an FTS5 table on SQLite.
+    """
+    ENTITY_CHOICES = [
+        ('university', 'University'),
+        ('major', 'Major'),
+        ('course', 'Course'),
+    ]
+
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.entity}:{self.object_id} {self.title}"
+
+    class Meta:
+        unique_together = ['entity', 'object_id']
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a streamed ``import_universities`` run, keyed by file content.
+
+    ``rows_done`` counts source rows committed so far; ``--resume`` continues
+    after it when the same file (same SHA-256) is imported again.
+    """
+    file_hash = models.CharField(max_length=64)
+    sheet = models.CharField(max_length=100, blank=True)
+    source = models.CharField(max_length=500)
+    rows_done = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.rows_done}{' (done)' if self.completed else ''}"
+
+    class Meta:
+        unique_together = ['file_hash', 'sheet']
+
+
+class Conversation(models.Model):
+    """Server-side AI chat history; clients send only the new message (see education.conversations)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_conversations')
+    title = models.CharField(max_length=200, blank=True)
+    # Latest system prompt(s) sent by the client (student context), one per line block
+    system_prompt = models.TextField(blank=True)
+    # Messages appended so far; the next message gets seq = message_count
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.email} - {self.title or self.pk}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], name='education_conv_user_upd_idx'),
+        ]
+
+
+class ConversationMessage(models.Model):
+    """Append-only; (conversation, seq) is unique and doubles as the history index."""
+    ROLE_CHOICES = [
+        ('user', 'User'),
+        ('assistant', 'Assistant'),
+    ]
+
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
+    seq = models.PositiveIntegerField()
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    content = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.conversation_id}#{self.seq} {self.role}"
+
+    class Meta:
+        ordering = ['seq']
+        unique_together = ['conversation', 'seq']
@@ -0,0 +1,13 @@
+from aieducation.pagination import KeysetCursorPagination
+
+from .search import SEARCH_RANK
+
+
+class UniversityCursorPagination(KeysetCursorPagination):
+    ordering = ('name', 'id')
+
+    def get_ordering(self, request, queryset, view):
+        # ?search= without ?ordering= pages through the index ranking
+        if SEARCH_RANK in queryset.query.annotations:
+            return (SEARCH_RANK, 'id')
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,406 @@
+"""
+Personalised recommendations for ``generate-ai-recommendations/``.
+
+Universities and majors are turned into feature vectors once per catalog
+version (``education.catalog``) and kept in process memory as NumPy arrays:
+
+- text: hashed character n-grams (``ai_cache.embed``) of names, descriptions
+  and the majors a university offers;
+- country, English-taught programmes and the application deadline as arrays
+  aligned with the text matrix.
+
+A student's profile (interests, preferred countries, IELTS/TOLC scores,
+budget) becomes a query vector plus boolean masks, so ranking the catalog is
+one matrix-vector product. ``recommend`` is pure (no queries) so batch jobs can
+run it in worker processes; ``save_recommendations`` writes the result with a
+single ``bulk_create(update_conflicts=True)`` on ``(user, key)`` and deletes
+computed items that dropped out of the ranking. Legacy rows are left alone.
+
+``RecommendationState`` holds per-user watermarks: ``computed_at`` (when the
+inputs of the last computation were read, also for users with no items) and
+``inputs_changed_at`` (bumped by signals for changes that leave no
+``updated_at`` behind, like a deleted application). ``stale_user_ids``
+compares them with the profile and application timestamps.
+"""
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from accounts.models import UserProfile
+
+from .ai_cache import VECTOR_DIM, embed, normalize
+from .catalog import get_catalog_version
+from .models import (
+    AIRecommendation, Application, Document, Major, RecommendationState, University, UniversityMajor,
+)
+
+WEIGHTS = {'text': 0.6, 'country': 0.25, 'english': 0.1, 'deadline': 0.05}
+TOP_UNIVERSITIES = 3
+TOP_MAJORS = 2
+# Below this similarity an interest match is not mentioned / a major not suggested
+MIN_TEXT_SCORE = 0.15
+IELTS_ENGLISH_MIN = 6.0
+# Yearly budget (EUR) under which the DSU scholarship is suggested
+LOW_BUDGET = 10000
+LEGACY_PREFIX = 'legacy:'
+UPSERT_FIELDS = ['title', 'content', 'category', 'priority', 'score', 'updated_at']
+PROFILE_FIELDS = (
+    'user_id', 'interests', 'preferred_countries', 'budget_range',
+    'ielts_current_score', 'ielts_target_score', 'ielts_exam_date',
+    'tolc_current_score', 'tolc_target_score', 'tolc_exam_date',
+)
+
+# Onboarding stores interests in Russian, the catalog is in English/Italian
+INTEREST_KEYWORDS = {
+    'программирование': 'computer science programming software informatica',
+    'дизайн': 'design',
+    'бизнес': 'business management',
+    'медицина': 'medicine medical health',
+    'инженерия': 'engineering ingegneria',
+    'архитектура': 'architecture architettura',
+    'психология': 'psychology',
+    'лингвистика': 'linguistics languages',
+    'история': 'history',
+    'философия': 'philosophy',
+    'математика': 'mathematics',
+    'физика': 'physics',
+    'химия': 'chemistry',
+    'биология': 'biology',
+    'экономика': 'economics',
+    'право': 'law',
+    'журналистика': 'journalism media communication',
+    'искусство': 'art fine arts',
+    'музыка': 'music',
+    'спорт': 'sport',
+    'кулинария': 'food science gastronomy',
+    'мода': 'fashion design',
+    'путешествия': 'tourism',
+    'фотография': 'photography',
+}
+COUNTRY_ALIASES = {
+    'италия': 'italy',
+    'германия': 'germany',
+    'франция': 'france',
+    'испания': 'spain',
+    'австрия': 'austria',
+    'нидерланды': 'netherlands',
+    'чехия': 'czech republic',
+    'польша': 'poland',
+    'венгрия': 'hungary',
+}
+
+_NUMBER_RE = re.compile(r'\d[\d\s]*')
+_LOW_BUDGET_WORDS = ('low', 'низк', 'минимал', 'бесплат')
+
+
+@dataclass
+class CatalogIndex:
+    version: str
+    university_ids: np.ndarray
+    university_names: list
+    university_countries: list
+    countries: np.ndarray  # normalized, for matching
+    english: np.ndarray
+    deadlines: np.ndarray
+    university_vectors: np.ndarray
+    major_ids: np.ndarray
+    major_names: list
+    major_vectors: np.ndarray
+
+
+def _vector(*weighted_texts) -> np.ndarray:
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for weight, text in weighted_texts:
+        if text:
+            vector += weight * embed(normalize(text))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _matrix(vectors) -> np.ndarray:
+    return np.vstack(vectors) if vectors else np.zeros((0, VECTOR_DIM), dtype=np.float32)
+
+
+def _country(value) -> str:
+    value = normalize(value)
+    return COUNTRY_ALIASES.get(value, value)
+
+
+def build_index(version=None) -> CatalogIndex:
+    """Feature arrays for all active universities and majors (a handful of queries)."""
+    offered = defaultdict(list)
+    english = set()
+    programmes = (
+        UniversityMajor.objects
+        .filter(is_active=True, major__is_active=True)
+        .values_list('university_id', 'major__name', 'major__category', 'language')
+    )
+    for university_id, name, category, language in programmes:
+        offered[university_id].append(f'{name} {category}')
+        language = (language or '').lower()
+        if 'english' in language or 'англ' in language:
+            english.add(university_id)
+
+    universities = list(
+        University.objects.filter(is_active=True).order_by('id')
+        .values_list('id', 'name', 'country', 'city', 'description', 'level', 'deadline')
+    )
+    majors = list(Major.objects.filter(is_active=True).order_by('id').values_list('id', 'name', 'description', 'category'))
+
+    return CatalogIndex(
+        version=version,
+        university_ids=np.array([u[0] for u in universities], dtype=np.int64),
+        university_names=[u[1] for u in universities],
+        university_countries=[u[2] for u in universities],
+        countries=np.array([_country(u[2]) for u in universities], dtype=object),
+        english=np.array([u[0] in english for u in universities], dtype=bool),
+        deadlines=np.array([u[6] or 'NaT' for u in universities], dtype='datetime64[D]'),
+        university_vectors=_matrix([
+            _vector((1.0, f"{u[1]} {' '.join(offered[u[0]])}"), (0.5, f'{u[4]} {u[5]} {u[3]}'))
+            for u in universities
+        ]),
+        major_ids=np.array([m[0] for m in majors], dtype=np.int64),
+        major_names=[m[1] for m in majors],
+        major_vectors=_matrix([_vector((1.0, f'{m[1]} {m[3]}'), (0.5, m[2])) for m in majors]),
+    )
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def get_index() -> CatalogIndex:
+    """Process-local index, rebuilt only when the catalog version changes."""
+    global _index
+    version = get_catalog_version()
+    index = _index
+    if index is None or index.version != version:
+        with _lock:
+            index = _index
+            if index is None or index.version != version:
+                index = _index = build_index(version)
+    return index
+
+
+def _as_list(value) -> list:
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    return [str(v) for v in value or [] if str(v).strip()]
+
+
+def _interest_text(profile) -> str:
+    parts = []
+    for interest in _as_list(profile.interests):
+        parts.append(interest)
+        parts.append(INTEREST_KEYWORDS.get(normalize(interest), ''))
+    return ' '.join(p for p in parts if p)
+
+
+def _budget_is_low(budget) -> bool:
+    budget = (budget or '').lower()
+    if any(word in budget for word in _LOW_BUDGET_WORDS):
+        return True
+    numbers = [int(n.replace(' ', '')) for n in _NUMBER_RE.findall(budget)]
+    return bool(numbers) and max(numbers) <= LOW_BUDGET
+
+
+def _top(scores, k) -> np.ndarray:
+    """Indices of the k best finite scores, best first."""
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+def _university_items(profile, index, query, applied_universities, today):
+    if not len(index.university_ids):
+        return []
+    text = index.university_vectors @ query if query is not None else np.zeros(len(index.university_ids), dtype=np.float32)
+    countries = {_country(c) for c in _as_list(profile.preferred_countries)}
+    country = np.isin(index.countries, list(countries)) if countries else np.zeros(len(text), dtype=bool)
+    ielts = profile.ielts_current_score
+    english = index.english if ielts is not None and ielts >= IELTS_ENGLISH_MIN else np.zeros(len(text), dtype=bool)
+    # NaT compares as False, so universities without a deadline just get no bonus
+    open_deadline = index.deadlines >= np.datetime64(today, 'D')
+
+    scores = (
+        WEIGHTS['text'] * text + WEIGHTS['country'] * country
+        + WEIGHTS['english'] * english + WEIGHTS['deadline'] * open_deadline
+    ).astype(np.float64)
+    scores[np.isin(index.university_ids, list(applied_universities))] = -np.inf
+
+    items = []
+    for i in _top(scores, TOP_UNIVERSITIES):
+        reasons = []
+        if text[i] >= MIN_TEXT_SCORE:
+            reasons.append(f"подходит под ваши интересы ({', '.join(_as_list(profile.interests))})")
+        if country[i]:
+            reasons.append(f'{index.university_countries[i]} — в списке ваших стран')
+        if english[i]:
+            reasons.append(f'есть программы на английском, вашего IELTS {ielts:g} достаточно')
+        if open_deadline[i]:
+            reasons.append(f"приём открыт до {index.deadlines[i].item().strftime('%d.%m.%Y')}")
+        content = f'Рассмотрите {index.university_names[i]}'
+        content += f": {'; '.join(reasons)}." if reasons else '.'
+        items.append({
+            'key': f'university:{index.university_ids[i]}',
+            'title': index.university_names[i],
+            'content': content,
+            'category': 'university',
+            'score': round(float(scores[i]), 4),
+        })
+    return items
+
+
+def _major_items(index, query, applied_majors):
+    if query is None or not len(index.major_ids):
+        return []
+    scores = (index.major_vectors @ query).astype(np.float64)
+    scores[scores < MIN_TEXT_SCORE] = -np.inf
+    scores[np.isin(index.major_ids, list(applied_majors))] = -np.inf
+    return [
+        {
+            'key': f'major:{index.major_ids[i]}',
+            'title': f'Направление: {index.major_names[i]}',
+            'content': f'Направление «{index.major_names[i]}» близко к вашим интересам — посмотрите университеты, где оно есть.',
+            'category': 'major',
+            'score': round(float(scores[i]), 4),
+        }
+        for i in _top(scores, TOP_MAJORS)
+    ]
+
+
+def _exam_item(name, current, target, exam_date, today):
+    if target is None or (current is not None and current >= target):
+        return None
+    if current is None:
+        content = f'Цель по {name} — {target:g}. Запишитесь на экзамен заранее: результаты нужны до подачи заявки.'
+    else:
+        content = f'Текущий балл {name} {current:g}, цель {target:g}: не хватает {target - current:g}.'
+    if exam_date and exam_date >= today:
+        content += f' До экзамена {(exam_date - today).days} дн.'
+    return {'key': f'prep:{name.lower()}', 'title': f'Подготовка к {name}', 'content': content, 'category': 'preparation'}
+
+
+def recommend(profile, applied=(), has_documents=True, index=None, today=None) -> list:
+    """Ranked recommendation dicts for ``profile``; ``applied`` are (university_id, major_id) pairs."""
+    index = index or get_index()
+    today = today or timezone.localdate()
+    interests = _interest_text(profile)
+    query = _vector((1.0, interests)) if interests else None
+    applied = list(applied)
+
+    items = _university_items(profile, index, query, {u for u, _ in applied}, today)
+    items += _major_items(index, query, {m for _, m in applied})
+    items += [item for item in (
+        _exam_item('IELTS', profile.ielts_current_score, profile.ielts_target_score, profile.ielts_exam_date, today),
+        _exam_item('TOLC', profile.tolc_current_score, profile.tolc_target_score, profile.tolc_exam_date, today),
+    ) if item]
+    if _budget_is_low(profile.budget_range):
+        items.append({
+            'key': 'budget:dsu',
+            'title': 'Стипендия DSU',
+            'content': (
+                f'При бюджете {profile.budget_range} подайте на региональную стипендию DSU: '
+                'она покрывает проживание и освобождает от платы за обучение. Понадобится ISEE parificato.'
+            ),
+            'category': 'budget',
+        })
+    if not has_documents:
+        items.append({
+            'key': 'documents',
+            'title': 'Сбор документов',
+            'content': 'Загрузите паспорт, аттестат/диплом и сертификаты: перевод и легализация занимают несколько недель.',
+            'category': 'documents',
+        })
+
+    for priority, item in enumerate(items, start=1):
+        item['priority'] = priority
+        item.setdefault('score', None)
+    return items
+
+
+def save_batch(items_by_user, batch_size=1000, computed_at=None) -> int:
+    """Upsert items for many users and drop their computed items no longer recommended.
+
+    ``computed_at`` is when the inputs were loaded (default: now); changes
+    after it keep the user stale for the next run.
+    """
+    objs = [AIRecommendation(user_id=user_id, **item) for user_id, items in items_by_user.items() for item in items]
+    keep = {(obj.user_id, obj.key) for obj in objs}
+    computed_at = computed_at or timezone.now()
+    with transaction.atomic():
+        RecommendationState.objects.bulk_create(
+            [RecommendationState(user_id=user_id, computed_at=computed_at) for user_id in items_by_user],
+            batch_size=batch_size, update_conflicts=True,
+            unique_fields=['user'], update_fields=['computed_at'],
+        )
+        AIRecommendation.objects.bulk_create(
+            objs, batch_size=batch_size, update_conflicts=True,
+            unique_fields=['user', 'key'], update_fields=UPSERT_FIELDS,
+        )
+        existing = (
+            AIRecommendation.objects.filter(user_id__in=list(items_by_user))
+            .exclude(key__startswith=LEGACY_PREFIX)
+            .values_list('id', 'user_id', 'key')
+        )
+        stale = [pk for pk, user_id, key in existing if (user_id, key) not in keep]
+        if stale:
+            AIRecommendation.objects.filter(id__in=stale).delete()
+    return len(objs)
+
+
+def save_recommendations(user_id, items, computed_at=None) -> None:
+    save_batch({user_id: items}, computed_at=computed_at)
+
+
+def mark_inputs_changed(user_id) -> None:
+    """Make ``user_id`` stale for the next run. Users without state are stale already."""
+    # UPDATE only: an INSERT here could race a cascade delete of the user
+    RecommendationState.objects.filter(user_id=user_id).update(inputs_changed_at=timezone.now())
+
+
+def load_inputs(user_ids) -> list:
+    """``(user_id, profile, applied, has_documents)`` per user, three queries in total."""
+    profiles = {p.user_id: p for p in UserProfile.objects.filter(user_id__in=user_ids).only(*PROFILE_FIELDS)}
+    applied = defaultdict(list)
+    rows = Application.objects.filter(user_id__in=user_ids).values_list('user_id', 'university_id', 'major_id')
+    for user_id, university_id, major_id in rows:
+        applied[user_id].append((university_id, major_id))
+    documents = set(Document.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True).distinct())
+    return [
+        (user_id, profiles.get(user_id) or UserProfile(user_id=user_id), applied[user_id], user_id in documents)
+        for user_id in user_ids
+    ]
+
+
+def stale_user_ids(force=False):
+    """Active users whose inputs changed after their recommendations were last computed."""
+    users = get_user_model().objects.filter(is_active=True)
+    if not force:
+        applied = Application.objects.filter(user=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+        computed_at = F('recommendation_state__computed_at')
+        users = users.annotate(applied_at=Subquery(applied)).filter(
+            Q(recommendation_state__computed_at__isnull=True)
+            | Q(profile__updated_at__gt=computed_at)
+            | Q(applied_at__gt=computed_at)
+            | Q(recommendation_state__inputs_changed_at__gt=computed_at)
+        )
+    return users.order_by('pk').values_list('pk', flat=True)
+
+
+def generate_for_user(user) -> list:
+    """Compute and store recommendations for one user; returns the items."""
+    loaded_at = timezone.now()
+    _, profile, applied, has_documents = load_inputs([user.pk])[0]
+    items = recommend(profile, applied, has_documents=has_documents)
+    save_recommendations(user.pk, items, computed_at=loaded_at)
+    return items
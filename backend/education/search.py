@@ -0,0 +1,248 @@
+"""
+Full-text search over universities, majors and courses.
+
+Every entity has one ``SearchDocument`` row (title + body) kept in sync by
+``education.signals``. The index behind it depends on the database:
+
+- PostgreSQL: generated ``tsvector`` column with a GIN index for prefix
+  full-text matches ranked by ``ts_rank_cd``, plus a ``pg_trgm`` GIN index on
+  the title for typo tolerance (word similarity).
+- SQLite (dev): FTS5 external-content table ranked by ``bm25``; when nothing
+  matches, a fuzzy pass over titles tolerates typos.
+- Anything else: plain ``icontains`` over the documents.
+
+Views use ``IndexedSearchFilter`` with a ``search_entity`` attribute; results
+come back ordered by rank unless the client passes ``?ordering=``. The rank is
+annotated as ``search_rank`` so cursor pagination can page through it.
+At most ``SEARCH_MAX_RESULTS`` best matches are taken from the index, so a
+broad query returns (and pages through) only those.
+"""
+import difflib
+import re
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from rest_framework.filters import SearchFilter
+
+from .models import Course, Major, SearchDocument, University, UniversityMajor
+
+# Default upper bound on ids pulled from the index for one query (SEARCH_MAX_RESULTS)
+MAX_RESULTS = 500
+# Annotation holding the position of a row in the index ranking
+SEARCH_RANK = 'search_rank'
+FUZZY_CUTOFF = 0.75
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query: str) -> List[str]:
+    return [t.lower() for t in _TOKEN_RE.findall(query or '')][:10]
+
+
+# --- Document building -------------------------------------------------------
+
+# Migration 0012 keeps frozen copies of these for its backfill
+def university_body(university, major_names) -> str:
+    return ' '.join([university.city, university.country, university.level, university.description, *major_names])
+
+
+def major_body(major) -> str:
+    return f"{major.category} {major.description}"
+
+
+def course_body(course) -> str:
+    return ' '.join([course.description, course.instructor, course.university.name, course.major.name])
+
+
+def _university_documents(ids):
+    majors = {}
+    links = (
+        UniversityMajor.objects.filter(university_id__in=ids)
+        .values_list('university_id', 'major__name')
+    )
+    for uni_id, major_name in links:
+        majors.setdefault(uni_id, []).append(major_name)
+    for u in University.objects.filter(id__in=ids).only('id', 'name', 'city', 'country', 'level', 'description'):
+        yield SearchDocument(entity='university', object_id=u.id, title=u.name[:255], body=university_body(u, majors.get(u.id, [])))
+
+
+def _major_documents(ids):
+    for m in Major.objects.filter(id__in=ids).only('id', 'name', 'category', 'description'):
+        yield SearchDocument(entity='major', object_id=m.id, title=m.name[:255], body=major_body(m))
+
+
+def _course_documents(ids):
+    courses = Course.objects.filter(id__in=ids).select_related('university', 'major').only(
+        'id', 'title', 'description', 'instructor', 'university__name', 'major__name',
+    )
+    for c in courses:
+        yield SearchDocument(entity='course', object_id=c.id, title=c.title[:255], body=course_body(c))
+
+
+DOCUMENT_BUILDERS = {
+    'university': _university_documents,
+    'major': _major_documents,
+    'course': _course_documents,
+}
+
+
+def index_objects(entity: str, ids: Iterable[int], batch_size: int = 500) -> int:
+    """(Re)build search documents for the given ids; ids that no longer exist are dropped."""
+    ids = list(ids)
+    total = 0
+    for start in range(0, len(ids), batch_size):
+        chunk = ids[start:start + batch_size]
+        docs = list(DOCUMENT_BUILDERS[entity](chunk))
+        found = {d.object_id for d in docs}
+        missing = [i for i in chunk if i not in found]
+        if missing:
+            SearchDocument.objects.filter(entity=entity, object_id__in=missing).delete()
+        if docs:
+            SearchDocument.objects.bulk_create(
+                docs,
+                update_conflicts=True,
+                unique_fields=['entity', 'object_id'],
+                update_fields=['title', 'body', 'updated_at'],
+            )
+        total += len(docs)
+    return total
+
+
+def remove_objects(entity: str, ids: Iterable[int]) -> None:
+    SearchDocument.objects.filter(entity=entity, object_id__in=list(ids)).delete()
+
+
+def rebuild_index(batch_size: int = 500) -> dict:
+    models_by_entity = {'university': University, 'major': Major, 'course': Course}
+    counts = {}
+    for entity, model in models_by_entity.items():
+        ids = list(model.objects.values_list('id', flat=True))
+        SearchDocument.objects.filter(entity=entity).exclude(object_id__in=ids).delete()
+        counts[entity] = index_objects(entity, ids, batch_size=batch_size)
+    return counts
+
+
+# --- Query backends -------------------------------------------------------------
+
+def _postgres_search(entity, tokens, raw_query, limit):
+    tsquery = ' & '.join(f"{t}:*" for t in tokens)
+    sql = """
+        SELECT object_id
+        FROM education_searchdocument
+        WHERE entity = %s
+          AND (search_vector @@ to_tsquery('simple', %s) OR %s <%% title)
+        ORDER BY GREATEST(
+            ts_rank_cd(search_vector, to_tsquery('simple', %s)),
+            word_similarity(%s, title)
+        ) DESC, object_id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [entity, tsquery, raw_query, tsquery, raw_query, limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _sqlite_fts_available() -> bool:
+    if not hasattr(_sqlite_fts_available, 'result'):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'education_searchdocument_fts'"
+            )
+            _sqlite_fts_available.result = cursor.fetchone() is not None
+    return _sqlite_fts_available.result
+
+
+def _sqlite_search(entity, tokens, raw_query, limit):
+    match = ' '.join(f'"{t}"*' for t in tokens)
+    sql = """
+        SELECT d.object_id
+        FROM education_searchdocument_fts f
+        JOIN education_searchdocument d ON d.id = f.rowid
+        WHERE education_searchdocument_fts MATCH %s AND d.entity = %s
+        ORDER BY bm25(education_searchdocument_fts, 10.0, 1.0), d.object_id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, entity, limit])
+        ids = [row[0] for row in cursor.fetchall()]
+    return ids or _fuzzy_title_search(entity, tokens, limit)
+
+
+def _fuzzy_title_search(entity, tokens, limit):
+    """Typo-tolerant fallback for dev databases: compare query words to title words."""
+    scored = []
+    for object_id, title in SearchDocument.objects.filter(entity=entity).values_list('object_id', 'title'):
+        words = tokenize(title)
+        if not words:
+            continue
+        score = sum(
+            max(difflib.SequenceMatcher(None, t, w).ratio() for w in words) for t in tokens
+        ) / len(tokens)
+        if score >= FUZZY_CUTOFF:
+            scored.append((-score, object_id))
+    scored.sort()
+    return [object_id for _, object_id in scored[:limit]]
+
+
+def _fallback_search(entity, tokens, raw_query, limit):
+    cond = Q()
+    for t in tokens:
+        cond &= Q(title__icontains=t) | Q(body__icontains=t)
+    return list(
+        SearchDocument.objects.filter(cond, entity=entity)
+        .order_by('title')
+        .values_list('object_id', flat=True)[:limit]
+    )
+
+
+def max_results() -> int:
+    return getattr(settings, 'SEARCH_MAX_RESULTS', MAX_RESULTS)
+
+
+def search_ids(entity: str, query: str, limit: int = None) -> List[int]:
+    """Return up to ``limit`` (``SEARCH_MAX_RESULTS``) object ids of ``entity`` matching ``query``, best match first."""
+    limit = limit or max_results()
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if connection.vendor == 'postgresql':
+        backend = _postgres_search
+    elif connection.vendor == 'sqlite' and _sqlite_fts_available():
+        backend = _sqlite_search
+    else:
+        backend = _fallback_search
+    return backend(entity, tokens, ' '.join(tokens), limit)
+
+
+def order_by_ids(queryset, ids):
+    """Keep the index ranking: annotate the position of pk in ``ids`` as ``search_rank`` and order by it."""
+    if not ids:
+        return queryset
+    ranking = Case(
+        *[When(pk=pk, then=pos) for pos, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.annotate(**{SEARCH_RANK: ranking}).order_by(SEARCH_RANK, 'pk')
+
+
+class IndexedSearchFilter(SearchFilter):
+    """``?search=`` backed by the search index for views declaring ``search_entity``.
+
+    Place it after OrderingFilter so ranking wins unless ``?ordering=`` is set.
+    Views without ``search_entity`` keep the stock DRF behaviour. Results are
+    capped at ``SEARCH_MAX_RESULTS`` matches: counts and cursor pages of a
+    search end there, refine the query to reach the rest.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        entity = getattr(view, 'search_entity', None)
+        query = request.query_params.get(self.search_param, '').strip()
+        if entity is None or not query:
+            return super().filter_queryset(request, queryset, view)
+        ids = search_ids(entity, query)
+        queryset = queryset.filter(pk__in=ids)
+        if 'ordering' not in request.query_params:
+            queryset = order_by_ids(queryset, ids)
+        return queryset
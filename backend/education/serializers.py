@@ -1,8 +1,13 @@
+from urllib.parse import urljoin
+
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from .models import (
     University, Major, UniversityMajor, Course, Enrollment, Application,
     Achievement, UserAchievement, AIRecommendation, StudyPlan, StudyPlanItem,
-    Document, UserEvent
+    Document, UserEvent, Conversation, ConversationMessage
 )
 
 
@@ -16,10 +21,13 @@ class UniversitySerializer(serializers.ModelSerializer):
     # University has related_name 'majors' to UniversityMajor; expose list of Major
     majors = serializers.SerializerMethodField()
     logo_url = serializers.SerializerMethodField()
+    # get_majors walks obj.majors -> major; see aieducation.eager_loading
+    eager_prefetch = ('majors__major',)
 
     class Meta:
         model = University
-        fields = '__all__'
+        # geohash is an internal index column
+        exclude = ('geohash',)
 
     def get_majors(self, obj):
         try:
@@ -51,6 +59,111 @@ class UniversitySerializer(serializers.ModelSerializer):
                 return ''
 
 
+class UniversityCatalogSerializer:
+    """Read-only fast path producing the same output as ``UniversitySerializer(many=True)``.
+
+    Built for catalog lists: field converters are resolved once per call, the
+    logo storage prefix is absolutized once per storage backend, and majors
+    come from one shared lookup table (two queries in total) instead of a
+    nested serializer per university.
+    """
+
+    def __init__(self, instances, context=None, fields=None):
+        self.instances = instances
+        self.context = context or {}
+        self.fields = fields
+
+    @staticmethod
+    def _field_names():
+        names = getattr(UniversityCatalogSerializer, '_names', None)
+        if names is None:
+            names = list(UniversitySerializer().fields)
+            UniversityCatalogSerializer._names = names
+        return names
+
+    def _absolutize(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request and url else url
+
+    def _logo_resolver(self):
+        storage = University._meta.get_field('logo').storage
+        if isinstance(storage, FileSystemStorage):
+            prefix = self._absolutize(storage.base_url)
+
+            def storage_url(name):
+                return urljoin(prefix, filepath_to_uri(name).lstrip('/'))
+        else:
+            def storage_url(name):
+                return self._absolutize(storage.url(name))
+
+        def resolve(name):
+            if not name:
+                return None, ''
+            url = storage_url(name)
+            if name.startswith('http://') or name.startswith('https://'):
+                return url, name
+            return url, url
+
+        return resolve
+
+    def _majors_by_university(self, university_ids):
+        links = (
+            UniversityMajor.objects.filter(university_id__in=university_ids)
+            .order_by('id')
+            .values_list('university_id', 'major_id')
+        )
+        links = list(links)
+        majors = Major.objects.filter(id__in={major_id for _, major_id in links})
+        major_data = {m['id']: m for m in MajorSerializer(majors, many=True).data}
+        grouped = {}
+        for university_id, major_id in links:
+            grouped.setdefault(university_id, []).append(major_data[major_id])
+        return grouped
+
+    @property
+    def data(self):
+        instances = list(self.instances)
+        names = self._field_names()
+        if self.fields is not None:
+            names = [n for n in names if n in self.fields]
+
+        datetime_field = serializers.DateTimeField()
+        date_field = serializers.DateField()
+        converters = {}
+        for name in names:
+            if name in ('majors', 'logo', 'logo_url'):
+                continue
+            model_field = University._meta.get_field(name)
+            if isinstance(model_field, models.DateTimeField):
+                converters[name] = datetime_field.to_representation
+            elif isinstance(model_field, models.DateField):
+                converters[name] = date_field.to_representation
+            else:
+                converters[name] = None
+
+        majors = self._majors_by_university([u.pk for u in instances]) if 'majors' in names else {}
+        resolve_logo = self._logo_resolver() if ('logo' in names or 'logo_url' in names) else None
+
+        rows = []
+        for obj in instances:
+            if resolve_logo is not None:
+                logo, logo_url = resolve_logo(obj.logo.name)
+            row = {}
+            for name in names:
+                if name == 'majors':
+                    row[name] = majors.get(obj.pk, [])
+                elif name == 'logo':
+                    row[name] = logo
+                elif name == 'logo_url':
+                    row[name] = logo_url
+                else:
+                    value = getattr(obj, name)
+                    convert = converters[name]
+                    row[name] = convert(value) if convert is not None and value is not None else value
+            rows.append(row)
+        return rows
+
+
 class UniversityMajorSerializer(serializers.ModelSerializer):
     university = UniversitySerializer(read_only=True)
     major = MajorSerializer(read_only=True)
@@ -97,6 +210,9 @@ class DashboardStatsSerializer(serializers.Serializer):
     recommended_courses = CourseSerializer(many=True, required=False, default=list)
     total_points = serializers.IntegerField(required=False, default=0)
     applications_submitted = serializers.IntegerField(required=False, default=0)
+    # Filled in by the view: whether the per-user cache answered, and how long it took
+    cache_status = serializers.CharField(required=False, default='miss')
+    compute_time_ms = serializers.FloatField(required=False, default=0.0)
 
 
 class ApplicationSerializer(serializers.ModelSerializer):
@@ -134,7 +250,7 @@ class AIRecommendationSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIRecommendation
         fields = '__all__'
-        read_only_fields = ('user', 'created_at')
+        read_only_fields = ('user', 'key', 'score', 'created_at', 'updated_at')
 
 
 class StudyPlanItemSerializer(serializers.ModelSerializer):
@@ -177,3 +293,23 @@ class UserEventSerializer(serializers.ModelSerializer):
         model = UserEvent
         fields = ('id', 'title', 'date', 'created_at')
         read_only_fields = ('id', 'created_at')
+
+
+class ConversationMessageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConversationMessage
+        fields = ('seq', 'role', 'content', 'created_at')
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ('id', 'title', 'message_count', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'message_count', 'created_at', 'updated_at')
+
+
+class ConversationDetailSerializer(ConversationSerializer):
+    messages = ConversationMessageSerializer(many=True, read_only=True)
+
+    class Meta(ConversationSerializer.Meta):
+        fields = ConversationSerializer.Meta.fields + ('system_prompt', 'messages')
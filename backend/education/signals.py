@@ -0,0 +1,92 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import dashboard, recommendations, search
+from .catalog import bump_catalog_version
+from .models import (
+    Achievement, Application, Course, Document, Enrollment, Major, StudentProgress, StudyPlan,
+    StudyPlanItem, University, UniversityMajor, UserAchievement,
+)
+
+
+@receiver(post_save, sender=University)
+@receiver(post_delete, sender=University)
+@receiver(post_save, sender=Major)
+@receiver(post_delete, sender=Major)
+@receiver(post_save, sender=UniversityMajor)
+@receiver(post_delete, sender=UniversityMajor)
+def invalidate_catalog_snapshot(sender, **kwargs):
+    bump_catalog_version()
+
+
+# --- Search documents ---
+
+@receiver(post_save, sender=University)
+def index_university(sender, instance, **kwargs):
+    search.index_objects('university', [instance.pk])
+    # Course documents include the university name
+    search.index_objects('course', instance.courses.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Major)
+def index_major(sender, instance, **kwargs):
+    search.index_objects('major', [instance.pk])
+    university_ids = UniversityMajor.objects.filter(major=instance).values_list('university_id', flat=True)
+    search.index_objects('university', university_ids)
+    search.index_objects('course', instance.courses.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=UniversityMajor)
+@receiver(post_delete, sender=UniversityMajor)
+def index_university_majors(sender, instance, **kwargs):
+    search.index_objects('university', [instance.university_id])
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, **kwargs):
+    search.index_objects('course', [instance.pk])
+
+
+@receiver(post_delete, sender=University)
+@receiver(post_delete, sender=Major)
+@receiver(post_delete, sender=Course)
+def remove_search_document(sender, instance, **kwargs):
+    search.remove_objects(sender._meta.model_name, [instance.pk])
+
+
+# --- Dashboard stats cache ---
+
+@receiver(post_save, sender=StudentProgress)
+@receiver(post_delete, sender=StudentProgress)
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_save, sender=UserAchievement)
+@receiver(post_delete, sender=UserAchievement)
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+@receiver(post_delete, sender=StudyPlan)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    dashboard.invalidate_user(instance.user_id)
+
+
+@receiver(post_save, sender=StudyPlanItem)
+@receiver(post_delete, sender=StudyPlanItem)
+def invalidate_plan_item_dashboard(sender, instance, **kwargs):
+    user_id = StudyPlan.objects.filter(pk=instance.study_plan_id).values_list('user_id', flat=True).first()
+    dashboard.invalidate_user(user_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Achievement)
+@receiver(post_delete, sender=Achievement)
+def invalidate_all_dashboards(sender, **kwargs):
+    dashboard.bump_global_version()
+
+
+@receiver(post_delete, sender=Application)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def mark_recommendation_inputs_changed(sender, instance, **kwargs):
+    # Saved applications are seen through Application.updated_at
+    recommendations.mark_inputs_changed(instance.user_id)
@@ -0,0 +1,19 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from jobs.queue import task
+
+from .recommendations import generate_for_user
+
+
+@task(name='education.generate_recommendations')
+def generate_recommendations(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is not None:
+        generate_for_user(user)
+
+
+@task(name='education.import_universities', queue='import', max_attempts=3)
+def import_universities(args):
+    # Same arguments as the management command, e.g. ["--csv-url", url, "--stream", "--resume"]
+    call_command('import_universities', *args)
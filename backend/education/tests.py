@@ -1,3 +1,487 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import UserProfile
+from education import conversations, recommendations
+from education.ai_cache import ChatResponseCache, embed, normalize
+from education.importer import UniversityImporter, map_columns
+from education.models import (
+    AIRecommendation, Application, Conversation, Course, Document, Enrollment, ImportCheckpoint, Major, StudyPlan, StudyPlanItem, University,
+    UniversityMajor,
+)
+
+User = get_user_model()
+
+
+class QueryBudgetTests(APITestCase):
+    """List/detail endpoints must run a fixed number of queries regardless of row count.
+
+    Budgets: pagination COUNT + page query (with joins) + one query per
+    prefetched relation. A failure here usually means a nested serializer
+    gained a relation that is not in its eager-loading plan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='budget@example.com', username='budget', password='x',
+            first_name='Budget', last_name='Test',
+        )
+        cls.majors = [
+            Major.objects.create(name=f'Major {i}', description='d', category='c') for i in range(3)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def _create_rows(self, count):
+        for i in range(count):
+            university = University.objects.create(
+                name=f'University {i}', country='Italy', city='Roma', description='d',
+            )
+            for major in self.majors:
+                UniversityMajor.objects.create(university=university, major=major)
+            major = self.majors[i % len(self.majors)]
+            course = Course.objects.create(title=f'Course {i}', description='d', university=university, major=major)
+            Enrollment.objects.create(user=self.user, course=course)
+            Application.objects.create(user=self.user, university=university, major=major, motivation_letter='m')
+            plan = StudyPlan.objects.create(
+                user=self.user, title=f'Plan {i}', target_university=university, target_major=major,
+                start_date=date(2026, 1, 1), end_date=date(2026, 12, 31),
+            )
+            for j in range(2):
+                StudyPlanItem.objects.create(study_plan=plan, title=f'Item {j}', due_date=date(2026, 6, j + 1))
+
+    def assertQueryBudget(self, url, budget):
+        counts = []
+        for rows in (1, 5):
+            self._create_rows(rows)
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            counts.append(len(ctx))
+        self.assertLessEqual(counts[-1], budget, f'{url}: {counts[-1]} queries, budget {budget}')
+        self.assertEqual(counts[0], counts[1], f'{url}: query count grows with rows {counts}')
+
+    def test_course_list(self):
+        self.assertQueryBudget('/api/education/courses/', 4)
+
+    def test_enrollment_list(self):
+        self.assertQueryBudget('/api/education/enrollments/', 4)
+
+    def test_application_list(self):
+        self.assertQueryBudget('/api/education/applications/', 4)
+
+    def test_study_plan_list(self):
+        self.assertQueryBudget('/api/education/study-plans/', 5)
+
+    def test_detail_views(self):
+        self._create_rows(1)
+        budgets = [
+            (f'/api/education/courses/{Course.objects.get().pk}/', 3),
+            (f'/api/education/enrollments/{Enrollment.objects.get().pk}/', 3),
+            (f'/api/education/applications/{Application.objects.get().pk}/', 3),
+            (f'/api/education/study-plans/{StudyPlan.objects.get().pk}/', 4),
+        ]
+        for url, budget in budgets:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertLessEqual(len(ctx), budget)
+
+
+class UniversityImporterTests(TestCase):
+    """Set-based import: create, update, unchanged rows and links, like the row-by-row importer."""
+
+    def _import(self, rows):
+        df = pd.DataFrame(rows)
+        importer = UniversityImporter(map_columns(df.columns), batch_size=2)
+        importer.import_frame(df)
+        return importer.finish()
+
+    def test_create_update_and_link(self):
+        stats = self._import([
+            {'name': 'Padova', 'country': 'Italy', 'city': 'Padova', 'deadline': '01.03.2027', 'majors': 'Physics; Law'},
+            {'name': 'Bologna', 'country': '', 'city': 'Bologna', 'deadline': 'soon', 'majors': 'Law'},
+            {'name': 'Milano', 'country': 'Italy', 'city': 'Milano', 'deadline': '', 'majors': ''},
+        ])
+        self.assertEqual((stats.created_universities, stats.created_majors, stats.created_links), (3, 2, 3))
+        padova = University.objects.get(name='Padova')
+        self.assertEqual(padova.deadline, date(2027, 3, 1))
+        self.assertEqual(set(padova.majors.values_list('major__name', flat=True)), {'Physics', 'Law'})
+        bologna = University.objects.get(name='Bologna')
+        self.assertEqual(bologna.country, 'Italy')
+        self.assertIsNone(bologna.deadline)
+
+        stats = self._import([
+            {'name': 'Padova', 'country': 'Italy', 'city': 'Padua', 'deadline': 'n/a', 'majors': 'Physics'},
+            {'name': 'Bologna', 'country': 'Italy', 'city': 'Bologna', 'deadline': '', 'majors': 'Law'},
+        ])
+        self.assertEqual((stats.created_universities, stats.updated_universities, stats.unchanged_universities), (0, 1, 1))
+        self.assertEqual((stats.created_majors, stats.created_links), (0, 0))
+        padova.refresh_from_db()
+        self.assertEqual(padova.city, 'Padua')
+        # An unparsed deadline leaves the stored one alone
+        self.assertEqual(padova.deadline, date(2027, 3, 1))
+        self.assertEqual(UniversityMajor.objects.count(), 3)
+
+    def test_last_row_wins_for_repeated_names(self):
+        self._import([
+            {'name': 'Torino', 'city': 'Turin', 'majors': 'Design'},
+            {'name': 'Torino', 'city': 'Torino', 'majors': 'Architecture'},
+        ])
+        torino = University.objects.get()
+        self.assertEqual(torino.city, 'Torino')
+        self.assertEqual(set(torino.majors.values_list('major__name', flat=True)), {'Design', 'Architecture'})
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = []
+        for size in (4, 40):
+            rows = [{'name': f'U{size}-{i}', 'city': 'Roma', 'majors': f'M{size}-{i % 3}'} for i in range(size)]
+            df = pd.DataFrame(rows)
+            importer = UniversityImporter(map_columns(df.columns), batch_size=size)
+            with CaptureQueriesContext(connection) as ctx:
+                importer.import_frame(df)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+
+class StreamedImportTests(TestCase):
+    """``import_universities --stream``: chunked commits with a resumable checkpoint."""
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write('name,city,majors\n')
+            for i in range(10):
+                f.write(f'University {i},City {i},Major {i % 2}\n')
+        self.path = f.name
+        self.addCleanup(os.unlink, self.path)
+
+    def _run(self, *args):
+        out = StringIO()
+        call_command('import_universities', '--csv', self.path, '--chunk-size', '3', *args, stdout=out)
+        return out.getvalue()
+
+    def test_limit_then_resume(self):
+        output = self._run('--stream', '--limit', '4')
+        self.assertIn('use --resume', output)
+        self.assertEqual(University.objects.count(), 4)
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertEqual((checkpoint.rows_done, checkpoint.completed), (4, False))
+
+        # Only the rows after the checkpoint are read again
+        self.assertIn('Processed 6 rows', self._run('--resume'))
+        self.assertEqual(University.objects.count(), 10)
+        self.assertEqual(UniversityMajor.objects.count(), 10)
+        checkpoint.refresh_from_db()
+        self.assertEqual((checkpoint.rows_done, checkpoint.completed), (10, True))
+
+        self.assertIn('Already imported', self._run('--resume'))
+
+    def test_dry_run_saves_nothing(self):
+        self._run('--stream', '--dry-run')
+        self.assertFalse(University.objects.exists())
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_changed_file_starts_over(self):
+        self._run('--stream', '--limit', '4')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('University 10,City 10,Major 0\n')
+        # Another hash, another checkpoint: resume starts from the first row
+        self._run('--resume')
+        self.assertEqual(University.objects.count(), 11)
+        self.assertEqual(ImportCheckpoint.objects.filter(completed=True).count(), 1)
+
+
+class ConversationHistoryTests(TestCase):
+    """Append-only chat history with the process-local hot cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='chat@example.com', username='chat', password='x')
+
+    def setUp(self):
+        conversations._hot.clear()
+        self.addCleanup(conversations._hot.clear)
+
+    def _start(self, message='Hello', reply='Hi!', **data):
+        conversation, messages = conversations.prepare_turn(self.user, {'message': message, **data})
+        conversations.record_turn(conversation, message, reply)
+        return conversation, messages
+
+    def test_new_conversation_is_created_with_the_first_turn(self):
+        conversation, messages = conversations.prepare_turn(self.user, {'message': 'Hello', 'system': 'Context'})
+        self.assertIsNone(conversation.pk)
+        self.assertEqual(messages, [{'role': 'system', 'content': 'Context'}, {'role': 'user', 'content': 'Hello'}])
+        self.assertFalse(Conversation.objects.exists())
+
+        conversations.record_turn(conversation, 'Hello', 'Hi!')
+        conversation.refresh_from_db()
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(
+            list(conversation.messages.values_list('seq', 'role')), [(0, 'user'), (1, 'assistant')],
+        )
+
+    def test_next_turn_is_served_from_the_hot_cache(self):
+        conversation, _ = self._start()
+        conversations.load_history(conversation)
+        with self.assertNumQueries(1):  # the conversation row only
+            _, messages = conversations.prepare_turn(
+                self.user, {'conversation_id': conversation.pk, 'message': 'And then?'},
+            )
+        self.assertEqual([m['content'] for m in messages], ['Hello', 'Hi!', 'And then?'])
+
+    def test_append_by_another_worker_loads_only_the_tail(self):
+        conversation, _ = self._start()
+        conversations.load_history(conversation)
+        # Another process appends: this process' hot entry is now one turn behind
+        other = Conversation.objects.get(pk=conversation.pk)
+        conversations.forget(other.pk)
+        conversations.append_messages(other, [{'role': 'user', 'content': 'Q2'}, {'role': 'assistant', 'content': 'A2'}])
+        conversations._hot[conversation.pk] = (
+            {'role': 'user', 'content': 'Hello'}, {'role': 'assistant', 'content': 'Hi!'},
+        )
+
+        conversation.refresh_from_db()
+        with CaptureQueriesContext(connection) as ctx:
+            history = conversations.load_history(conversation)
+        self.assertEqual([m['content'] for m in history], ['Hello', 'Hi!', 'Q2', 'A2'])
+        self.assertEqual(len(ctx), 1)
+        self.assertIn('"seq" >= 2', ctx.captured_queries[0]['sql'])
+
+    def test_stale_copy_appends_with_next_seq(self):
+        conversation, _ = self._start()
+        stale = Conversation.objects.get(pk=conversation.pk)
+        conversations.record_turn(conversation, 'Q2', 'A2')
+        # The row lock, not the in-memory count, picks the seq
+        conversations.record_turn(stale, 'Q3', 'A3')
+        self.assertEqual(list(conversation.messages.values_list('seq', flat=True)), list(range(6)))
+        self.assertEqual(Conversation.objects.get(pk=conversation.pk).message_count, 6)
+
+    @override_settings(AI_CONVERSATION_CACHE_SIZE=2)
+    def test_hot_cache_is_bounded(self):
+        first, _ = self._start()
+        second, _ = self._start()
+        third, _ = self._start()
+        for conversation in (first, second, third):
+            conversations.load_history(conversation)
+        self.assertEqual(list(conversations._hot), [second.pk, third.pk])
+
+    def test_other_users_conversation_is_rejected(self):
+        conversation, _ = self._start()
+        other = User.objects.create_user(email='other@example.com', username='other', password='x')
+        with self.assertRaises(Conversation.DoesNotExist):
+            conversations.prepare_turn(other, {'conversation_id': conversation.pk, 'message': 'Hi'})
+
+
+class RecommendationTests(TestCase):
+    """Vectorized ranking and the set-based upsert of computed recommendations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='rec@example.com', username='rec', password='x')
+        cls.law = Major.objects.create(name='Law', description='Legal studies', category='law')
+        cls.physics = Major.objects.create(name='Physics', description='Physics', category='science')
+        cls.padova = University.objects.create(
+            name='Padova', country='Italy', city='Padova', description='d', deadline=date(2027, 3, 1),
+        )
+        cls.vienna = University.objects.create(name='Wien', country='Austria', city='Wien', description='d')
+        UniversityMajor.objects.create(university=cls.padova, major=cls.physics, language='English')
+        UniversityMajor.objects.create(university=cls.vienna, major=cls.law, language='German')
+
+    def _profile(self, **fields):
+        return UserProfile(user=self.user, **fields)
+
+    def test_ranking(self):
+        profile = self._profile(
+            interests=['физика'], preferred_countries=['Италия'], ielts_current_score=6.5,
+            ielts_target_score=7.0, budget_range='5000',
+        )
+        items = recommendations.recommend(profile, index=recommendations.build_index(), today=date(2027, 1, 1))
+        keys = [item['key'] for item in items]
+        self.assertEqual(keys[0], f'university:{self.padova.pk}')
+        self.assertIn(f'major:{self.physics.pk}', keys)
+        self.assertNotIn(f'major:{self.law.pk}', keys)
+        self.assertIn('prep:ielts', keys)
+        self.assertIn('budget:dsu', keys)
+        self.assertEqual([item['priority'] for item in items], list(range(1, len(items) + 1)))
+
+    def test_applied_universities_are_skipped(self):
+        profile = self._profile(interests=['физика'])
+        items = recommendations.recommend(
+            profile, applied=[(self.padova.pk, self.physics.pk)], index=recommendations.build_index(),
+            today=date(2027, 1, 1),
+        )
+        keys = {item['key'] for item in items}
+        self.assertNotIn(f'university:{self.padova.pk}', keys)
+        self.assertNotIn(f'major:{self.physics.pk}', keys)
+
+    def test_ranking_runs_no_queries_with_an_index(self):
+        index = recommendations.build_index()
+        profile = self._profile(interests=['право'])
+        with self.assertNumQueries(0):
+            recommendations.recommend(profile, index=index, today=date(2027, 1, 1))
+
+    def test_save_batch_upserts(self):
+        AIRecommendation.objects.create(user=self.user, key='legacy:1', title='Old', content='c', category='general')
+        item = {'key': 'prep:ielts', 'title': 'IELTS', 'content': 'v1', 'category': 'preparation', 'priority': 1, 'score': None}
+        dropped = {**item, 'key': 'documents', 'title': 'Documents'}
+        recommendations.save_batch({self.user.pk: [item, dropped]})
+        first = AIRecommendation.objects.get(user=self.user, key='prep:ielts')
+        first.is_read = True
+        first.save()
+
+        recommendations.save_batch({self.user.pk: [{**item, 'content': 'v2'}]})
+        row = AIRecommendation.objects.get(user=self.user, key='prep:ielts')
+        # Updated in place: same row, read flag kept
+        self.assertEqual((row.pk, row.content, row.is_read), (first.pk, 'v2', True))
+        # Items no longer recommended are dropped, legacy rows are not
+        self.assertEqual(
+            set(AIRecommendation.objects.filter(user=self.user).values_list('key', flat=True)),
+            {'prep:ielts', 'legacy:1'},
+        )
+        self.assertIsNotNone(self.user.recommendation_state.computed_at)
+
+    def test_save_batch_query_count_is_flat(self):
+        users = [User.objects.create_user(email=f'r{i}@example.com', username=f'r{i}', password='x') for i in range(6)]
+        item = {'key': 'documents', 'title': 'D', 'content': 'c', 'category': 'documents', 'priority': 1, 'score': None}
+        counts = []
+        for batch in (users[:1], users[1:]):
+            with CaptureQueriesContext(connection) as ctx:
+                recommendations.save_batch({user.pk: [item] for user in batch})
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+
+class StaleRecommendationTests(TestCase):
+    """``stale_user_ids``: only users whose inputs changed after ``computed_at`` are recomputed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='stale@example.com', username='stale', password='x')
+        cls.profile = UserProfile.objects.create(user=cls.user, interests=['право'])
+        cls.university = University.objects.create(name='Padova', country='Italy', city='Padova', description='d')
+        cls.major = Major.objects.create(name='Law', description='d', category='law')
+
+    def _stale(self, force=False):
+        return self.user.pk in set(recommendations.stale_user_ids(force))
+
+    def _computed(self):
+        recommendations.generate_for_user(self.user)
+
+    def test_never_computed_is_stale(self):
+        self.assertTrue(self._stale())
+        self._computed()
+        self.assertFalse(self._stale())
+        self.assertTrue(self._stale(force=True))
+
+    def test_users_without_items_are_skipped_too(self):
+        recommendations.save_batch({self.user.pk: []})
+        self.assertFalse(self._stale())
+
+    def test_profile_change(self):
+        self._computed()
+        self.profile.budget_range = '5000'
+        self.profile.save()
+        self.assertTrue(self._stale())
+
+    def test_saved_application(self):
+        self._computed()
+        Application.objects.create(user=self.user, university=self.university, major=self.major, motivation_letter='m')
+        self.assertTrue(self._stale())
+
+    def test_deleted_application(self):
+        application = Application.objects.create(
+            user=self.user, university=self.university, major=self.major, motivation_letter='m',
+        )
+        self._computed()
+        application.delete()
+        self.assertTrue(self._stale())
+
+    def test_uploaded_document(self):
+        self._computed()
+        Document.objects.create(user=self.user, name='Passport', document_type='passport', file='documents/p.pdf')
+        self.assertTrue(self._stale())
+        self._computed()
+        self.assertFalse(self._stale())
+
+    def test_change_while_computing_stays_stale(self):
+        loaded_at = timezone.now()
+        self.profile.save()
+        recommendations.save_batch({self.user.pk: []}, computed_at=loaded_at)
+        self.assertTrue(self._stale())
+
+    def test_inactive_users_are_skipped(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self._stale(force=True))
+
+
+class ChatResponseCacheTests(SimpleTestCase):
+    """Exact and (opt-in) similarity tiers of the AI chat response cache."""
+
+    PADOVA = 'What documents do I need to apply for a master in engineering at the University of Padova?'
+
+    def _params(self, question, system='Student context'):
+        return {
+            'model': 'gpt-test', 'temperature': 0.7,
+            'messages': [{'role': 'system', 'content': system}, {'role': 'user', 'content': question}],
+        }
+
+    def _cache(self, question, threshold=0.9):
+        cache = ChatResponseCache(capacity=10, ttl=60, threshold=threshold, max_models=2)
+        cache.set(self._params(question), 'answer')
+        return cache
+
+    def assertLookAlike(self, a, b):
+        # Close enough for the n-gram vectors: only the word check tells them apart
+        self.assertGreaterEqual(float(embed(normalize(a)) @ embed(normalize(b))), 0.9)
+
+    def test_exact_hit_ignores_case_and_punctuation(self):
+        cache = self._cache(self.PADOVA)
+        self.assertEqual(cache.get(self._params(self.PADOVA.upper().rstrip('?'))), ('answer', 'exact'))
+
+    def test_other_system_prompt_misses(self):
+        cache = self._cache(self.PADOVA)
+        self.assertEqual(cache.get(self._params(self.PADOVA, system='Another student')), (None, None))
+
+    @override_settings(AI_CACHE_SIMILARITY=0)
+    def test_similarity_tier_is_off_by_default(self):
+        cache = ChatResponseCache(capacity=10, ttl=60)
+        cache.set(self._params(self.PADOVA), 'answer')
+        rephrased = 'Which documents do I need to apply for a masters in engineering at the University of Padova'
+        self.assertEqual(cache.get(self._params(rephrased)), (None, None))
+
+    def test_rephrasing_hits(self):
+        cache = self._cache(self.PADOVA)
+        rephrased = 'Which documents do I need to apply for a masters in engineering at the University of Padova'
+        self.assertEqual(cache.get(self._params(rephrased)), ('answer', 'similar'))
+
+    def test_other_university_misses(self):
+        cache = self._cache(self.PADOVA)
+        bologna = self.PADOVA.replace('Padova', 'Bologna')
+        self.assertLookAlike(self.PADOVA, bologna)
+        self.assertEqual(cache.get(self._params(bologna)), (None, None))
+
+    def test_negation_misses(self):
+        question = 'Can I apply for the master in management at Bocconi with the GMAT score I have?'
+        cache = self._cache(question)
+        negated = question.replace('with the GMAT', 'without the GMAT')
+        self.assertLookAlike(question, negated)
+        self.assertEqual(cache.get(self._params(negated)), (None, None))
+        self.assertEqual(cache.get(self._params(question.replace('Can I', "Can't I"))), (None, None))
+
+    def test_other_numbers_miss(self):
+        question = 'When is the application deadline for 2026?'
+        cache = self._cache(question)
+        self.assertEqual(cache.get(self._params(question.replace('2026', '2027'))), (None, None))
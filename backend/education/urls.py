@@ -5,6 +5,7 @@ from . import ai_views
 urlpatterns = [
     # Universities
     path('universities/', views.UniversityListView.as_view(), name='university-list'),
+    path('universities/geo/', views.university_geo, name='university-geo'),
     path('universities/<int:pk>/', views.UniversityDetailView.as_view(), name='university-detail'),
     
     # Majors
@@ -46,4 +47,8 @@ urlpatterns = [
     path('events/', views.UserEventListCreateView.as_view(), name='user-event-list-create'),
     path('events/<int:pk>/', views.UserEventDetailView.as_view(), name='user-event-detail'),
     path('ai/chat/', ai_views.chat, name='ai-chat'),
+    path('ai/chat/stream/', ai_views.chat_stream, name='ai-chat-stream'),
+    path('ai/chat/cache/', ai_views.chat_cache_stats, name='ai-chat-cache'),
+    path('ai/conversations/', ai_views.ConversationListView.as_view(), name='ai-conversation-list'),
+    path('ai/conversations/<int:pk>/', ai_views.ConversationDetailView.as_view(), name='ai-conversation-detail'),
 ]
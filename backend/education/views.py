@@ -1,50 +1,174 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q, Count, Sum, F
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
-from django.db.models.functions import Coalesce
 
 from .models import (
-    University, Major, Course, Enrollment, Application, Achievement,
-    UserAchievement, AIRecommendation, StudyPlan, StudyPlanItem, Document,
-    StudentProgress, UserEvent
+    University, Major, UniversityMajor, Course, Enrollment, Application, Achievement,
+    UserAchievement, AIRecommendation, StudyPlan, StudyPlanItem, Document, UserEvent
 )
 from .serializers import (
     UniversitySerializer, MajorSerializer, CourseSerializer, EnrollmentSerializer,
     ApplicationSerializer, ApplicationCreateSerializer, AchievementSerializer,
     UserAchievementSerializer, AIRecommendationSerializer, StudyPlanSerializer,
-    StudyPlanItemSerializer, DocumentSerializer, DashboardStatsSerializer,
-    UserEventSerializer
+    DocumentSerializer, UserEventSerializer, UniversityCatalogSerializer
 )
+from . import geo
+from .catalog import catalog_snapshot_response
+from .dashboard import get_dashboard_stats
+from .pagination import UniversityCursorPagination
+from .search import IndexedSearchFilter, search_ids
+from aieducation.eager_loading import EagerLoadingMixin
+from aieducation.pagination import pagination_disabled
+from jobs.queue import enqueue
+from jobs.serializers import JobSerializer
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
+
+# Search runs after ordering so index ranking wins unless ?ordering= is given
+# ?search= returns at most SEARCH_MAX_RESULTS best matches (count and pages included)
+SEARCH_FILTER_BACKENDS = [DjangoFilterBackend, OrderingFilter, IndexedSearchFilter]
 
 
 class UniversityListView(generics.ListAPIView):
-    queryset = University.objects.filter(is_active=True).prefetch_related('majors__major')
+    # Majors are attached by UniversityCatalogSerializer from one lookup query
+    queryset = University.objects.filter(is_active=True)
     serializer_class = UniversitySerializer
     # Public for landing page consumption
     permission_classes = [permissions.AllowAny]
     # Убрали фильтрацию по стране; оставили только город
     filterset_fields = ['city']
-    search_fields = ['name', 'description']
+    filter_backends = SEARCH_FILTER_BACKENDS
+    search_entity = 'university'
     ordering_fields = ['name']
-    ordering = ['name']
-    # Убираем пагинацию для получения всех университетов
-    pagination_class = None
+    # id makes the cursor position unique for universities with the same name
+    ordering = ['name', 'id']
+    # Курсорная пагинация; ?paginate=false возвращает весь список как раньше
+    pagination_class = UniversityCursorPagination
+    # Params that do not change the unpaginated catalog response
+    snapshot_ignored_params = {'is_active', 'paginate'}
+
+    @property
+    def paginate(self):
+        return not pagination_disabled(self.request)
+
+    def list(self, request, *args, **kwargs):
+        # Unfiltered full-catalog requests are served from the cached snapshot (ETag/304)
+        if not self.paginate and not set(request.query_params) - self.snapshot_ignored_params:
+            return catalog_snapshot_response(request)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        data = UniversityCatalogSerializer(
+            page if page is not None else queryset,
+            context=self.get_serializer_context(),
+            fields=self.get_projection(),
+        ).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def paginate_queryset(self, queryset):
+        if not self.paginate:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_projection(self):
+        """Field names requested via ?fields=id,name,city or None for all fields."""
+        raw = self.request.query_params.get('fields', '')
+        fields = [f.strip() for f in raw.split(',') if f.strip()]
+        return fields or None
 
     def get_queryset(self):
         queryset = super().get_queryset()
+
+        # Load only the columns the projection needs
+        fields = self.get_projection()
+        if fields is not None:
+            model_fields = {f.name for f in University._meta.concrete_fields}
+            columns = {'id', 'name'} | (set(fields) & model_fields)
+            if 'logo_url' in fields:
+                columns.add('logo')
+            queryset = queryset.only(*columns)
         
-        # Фильтрация по специальности
+        # Фильтрация по специальности (через поисковый индекс, без join fan-out)
         major = self.request.query_params.get('major')
         if major:
-            queryset = queryset.filter(majors__major__name__icontains=major)
+            major_ids = search_ids('major', major)
+            queryset = queryset.filter(
+                id__in=UniversityMajor.objects.filter(major_id__in=major_ids).values('university_id')
+            )
         
         return queryset
 
 
-class UniversityDetailView(generics.RetrieveAPIView):
+GEO_MARKER_FIELDS = ['id', 'name', 'city', 'latitude', 'longitude', 'logo_url']
+GEO_MAX_MARKERS = 1000
+
+
+def _geo_param(request, name, cast=float, required=False):
+    raw = request.query_params.get(name)
+    if raw in (None, ''):
+        if required:
+            raise ValidationError({name: 'Обязательный параметр'})
+        return None
+    try:
+        return cast(raw)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Неверное значение'})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def university_geo(request):
+    """Map markers for universities.
+
+    - ``bbox=min_lng,min_lat,max_lng,max_lat`` — points in the visible area;
+      with ``zoom`` below the cluster threshold, geohash clusters instead.
+    - ``lat``, ``lng``, ``radius`` (km) — points within the radius, nearest first.
+    - ``lat``, ``lng``, ``k`` — the k nearest points.
+    """
+    queryset = University.objects.filter(is_active=True).exclude(latitude=None).exclude(longitude=None)
+    context = {'request': request}
+    bbox = request.query_params.get('bbox')
+
+    if bbox:
+        try:
+            min_lng, min_lat, max_lng, max_lat = [float(v) for v in bbox.split(',')]
+        except ValueError:
+            raise ValidationError({'bbox': 'Ожидается min_lng,min_lat,max_lng,max_lat'})
+        queryset = geo.within_bbox(queryset, min_lat, min_lng, max_lat, max_lng)
+        zoom = _geo_param(request, 'zoom', int)
+        if zoom is not None and zoom < geo.CLUSTER_MAX_ZOOM:
+            return Response({'type': 'clusters', 'results': geo.clusters(queryset, zoom)})
+        universities = list(queryset.order_by('id')[:GEO_MAX_MARKERS + 1])
+        truncated = len(universities) > GEO_MAX_MARKERS
+        results = UniversityCatalogSerializer(
+            universities[:GEO_MAX_MARKERS], context=context, fields=GEO_MARKER_FIELDS
+        ).data
+        return Response({'type': 'markers', 'truncated': truncated, 'results': results})
+
+    lat = _geo_param(request, 'lat', required=True)
+    lng = _geo_param(request, 'lng', required=True)
+    radius = _geo_param(request, 'radius')
+    k = _geo_param(request, 'k', int)
+    if radius is not None:
+        found = geo.within_radius(queryset, lat, lng, radius, limit=GEO_MAX_MARKERS)
+    elif k is not None:
+        found = geo.nearest(queryset, lat, lng, max(1, min(k, GEO_MAX_MARKERS)))
+    else:
+        raise ValidationError({'detail': 'Укажите bbox, radius или k'})
+
+    results = UniversityCatalogSerializer(
+        [u for u, _ in found], context=context, fields=GEO_MARKER_FIELDS
+    ).data
+    for row, (_, distance) in zip(results, found):
+        row['distance_km'] = round(distance, 3)
+    return Response({'type': 'markers', 'truncated': False, 'results': results})
+
+
+class UniversityDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = University.objects.filter(is_active=True)
     serializer_class = UniversitySerializer
     permission_classes = [permissions.AllowAny]
@@ -54,28 +178,30 @@ class MajorListView(generics.ListAPIView):
     queryset = Major.objects.filter(is_active=True)
     serializer_class = MajorSerializer
     permission_classes = [permissions.IsAuthenticated]
-    search_fields = ['name', 'description']
+    filter_backends = SEARCH_FILTER_BACKENDS
+    search_entity = 'major'
     ordering_fields = ['name']
     ordering = ['name']
 
 
-class CourseListView(generics.ListAPIView):
+class CourseListView(EagerLoadingMixin, generics.ListAPIView):
     queryset = Course.objects.filter(is_active=True)
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_fields = ['university', 'major', 'difficulty_level', 'is_free']
-    search_fields = ['title', 'description']
+    filter_backends = SEARCH_FILTER_BACKENDS
+    search_entity = 'course'
     ordering_fields = ['title', 'price', 'created_at']
     ordering = ['-created_at']
 
 
-class CourseDetailView(generics.RetrieveAPIView):
+class CourseDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = Course.objects.filter(is_active=True)
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
-class EnrollmentListView(generics.ListCreateAPIView):
+class EnrollmentListView(EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -86,7 +212,7 @@ class EnrollmentListView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class EnrollmentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class EnrollmentDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -94,7 +220,7 @@ class EnrollmentDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Enrollment.objects.filter(user=self.request.user)
 
 
-class ApplicationListView(generics.ListCreateAPIView):
+class ApplicationListView(EagerLoadingMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_serializer_class(self):
@@ -109,7 +235,7 @@ class ApplicationListView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class ApplicationDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ApplicationDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ApplicationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -123,7 +249,7 @@ class AchievementListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class UserAchievementListView(generics.ListAPIView):
+class UserAchievementListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = UserAchievementSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -136,7 +262,7 @@ class AIRecommendationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return AIRecommendation.objects.filter(user=self.request.user).order_by('-created_at')
+        return AIRecommendation.objects.filter(user=self.request.user).order_by('priority', '-updated_at')
 
 
 class AIRecommendationDetailView(generics.RetrieveUpdateAPIView):
@@ -147,7 +273,7 @@ class AIRecommendationDetailView(generics.RetrieveUpdateAPIView):
         return AIRecommendation.objects.filter(user=self.request.user)
 
 
-class StudyPlanListView(generics.ListCreateAPIView):
+class StudyPlanListView(EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = StudyPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -158,7 +284,7 @@ class StudyPlanListView(generics.ListCreateAPIView):
         serializer.save(user=self.request.user)
 
 
-class StudyPlanDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StudyPlanDetailView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = StudyPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -188,77 +314,12 @@ class DocumentDetailView(generics.RetrieveUpdateDestroyAPIView):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
-    user = request.user
-    
-    # Get or create student progress
-    try:
-        progress = StudentProgress.objects.get(user=user)
-    except StudentProgress.DoesNotExist:
-        progress = StudentProgress.objects.create(user=user)
-    except Exception as e:
-        print(f"Error getting student progress: {e}")
-        progress = None
-    
-    # Calculate overall progress
-    overall_progress = progress.calculate_progress() if progress else 0
-    
-    # Course statistics
-    total_courses = Course.objects.filter(is_active=True).count()
-    completed_courses = Enrollment.objects.filter(
-        user=user, is_completed=True
-    ).count()
-    
-    # Upcoming deadlines (from study plans)
-    upcoming_deadlines = StudyPlanItem.objects.filter(
-        study_plan__user=user,
-        is_completed=False,
-        due_date__gte=timezone.now().date()
-    ).count()
-    
-    # Achievements
-    achievements_unlocked = UserAchievement.objects.filter(user=user).count()
-    
-    # Current streak
-    current_streak = 7  # Mock value
-    
-    # Study time statistics (mock values for now)
-    total_study_time = 45
-    weekly_goal = 20
-    weekly_progress = 12
-    
-    # Get recommended courses
-    recommended_courses = Course.objects.filter(is_active=True)[:3]
-    
-    # Calculate total points with proper null handling
-    total_points = UserAchievement.objects.filter(user=user).annotate(
-        points=Coalesce(F('achievement__points'), 0)
-    ).aggregate(total=Sum('points'))['total'] or 0
-    
-    # Get number of submitted applications
-    applications_submitted = Application.objects.filter(user=user).count()
-    
-    stats = {
-        'overall_progress': overall_progress,
-        'ielts_completed': progress.ielts_completed,
-        'dov_completed': progress.dov_completed,
-        'universities_selected': progress.universities_selected,
-        'universitaly_registration': progress.universitaly_registration,
-        'visa_obtained': progress.visa_obtained,
-        'total_courses': total_courses,
-        'completed_courses': completed_courses,
-        'upcoming_deadlines': upcoming_deadlines,
-        'achievements_unlocked': achievements_unlocked,
-        'current_streak': current_streak,
-        'total_study_time': total_study_time,
-        'weekly_goal': weekly_goal,
-        'weekly_progress': weekly_progress,
-        'recommended_courses': recommended_courses,
-        'total_points': total_points,
-        'applications_submitted': applications_submitted
-    }
-    
-    serializer = DashboardStatsSerializer(stats)
-    return Response(serializer.data)
+    data, hit, elapsed_ms = get_dashboard_stats(request.user, request)
+    return Response({
+        **data,
+        'cache_status': 'hit' if hit else 'miss',
+        'compute_time_ms': round(elapsed_ms, 2),
+    })
 
 
 @api_view(['GET'])
@@ -316,37 +377,13 @@ class UserEventDetailView(generics.DestroyAPIView):
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def generate_ai_recommendations(request):
-    user = request.user
-    
-    # Генерируем рекомендации на основе профиля пользователя
-    recommendations = [
-        {
-            'title': 'Рекомендуемые университеты',
-            'content': 'На основе ваших интересов рекомендуем рассмотреть университеты в Италии.',
-            'category': 'university',
-            'priority': 1
-        },
-        {
-            'title': 'Подготовка к IELTS',
-            'content': 'Начните подготовку к IELTS за 6 месяцев до подачи заявки.',
-            'category': 'preparation',
-            'priority': 2
-        },
-        {
-            'title': 'Сбор документов',
-            'content': 'Подготовьте все необходимые документы заранее.',
-            'category': 'documents',
-            'priority': 3
-        }
-    ]
-    
-    for rec_data in recommendations:
-        AIRecommendation.objects.create(
-            user=user,
-            title=rec_data['title'],
-            content=rec_data['content'],
-            category=rec_data['category'],
-            priority=rec_data['priority']
-        )
-    
-    return Response({'message': 'Рекомендации сгенерированы'})
+    # Ранжирование выполняет фоновый воркер (education.tasks); повторные запросы,
+    # пока задача в очереди, возвращают ту же задачу
+    job = enqueue(
+        'education.generate_recommendations', {'user_id': request.user.pk},
+        idempotency_key=f'recommendations:{request.user.pk}', user=request.user,
+    )
+    return Response({
+        'message': 'Генерация рекомендаций запущена',
+        'job': JobSerializer(job).data,
+    }, status=status.HTTP_202_ACCEPTED)
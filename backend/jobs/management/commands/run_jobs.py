@@ -0,0 +1,57 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import Worker, autodiscover, prune_finished
+
+# Stale-lock release and pruning of old succeeded jobs
+MAINTENANCE_INTERVAL = 300
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue (see jobs.queue)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", action="append", dest="queues", help="Queue to consume (repeatable; default: all)")
+        parser.add_argument("--batch-size", type=int, default=10, help="Jobs run per poll, claimed one at a time (default: 10)")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty (default: 1)")
+        parser.add_argument("--once", action="store_true", help="Run all due jobs, then exit")
+        parser.add_argument("--max-jobs", type=int, default=None, help="Exit after running N jobs")
+
+    def handle(self, *args, **options):
+        autodiscover()
+        worker = Worker(queues=options["queues"], batch_size=max(options["batch_size"], 1))
+        self.stopping = False
+        # Finish the current job on SIGTERM/SIGINT instead of dying mid-task
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._stop)
+
+        queues = ", ".join(options["queues"] or ["all"])
+        self.stdout.write(self.style.NOTICE(f"Worker {worker.worker_id} consuming: {queues}"))
+        succeeded = failed = 0
+        started = time.perf_counter()
+        next_maintenance = 0.0
+        while not self.stopping:
+            if time.monotonic() >= next_maintenance:
+                released = worker.release_stale()
+                pruned = prune_finished()
+                if released or pruned:
+                    self.stdout.write(f"Released {released} stale job(s), pruned {pruned} finished job(s)")
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+
+            ok, bad = worker.run_batch()
+            succeeded += ok
+            failed += bad
+            if options["max_jobs"] and succeeded + failed >= options["max_jobs"]:
+                break
+            if not ok and not bad:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Stopped: {succeeded} succeeded, {failed} failed in {elapsed:.1f}s"))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,270 @@
+"""
+Database-backed background jobs.
+
+Request handlers call ``enqueue`` and return; ``manage.py run_jobs`` workers
+execute the jobs. Everything runs on the project database, so no broker is
+needed locally or in production.
+
+- Tasks are plain functions registered with ``@task`` in an app's
+  ``tasks.py`` (imported by ``autodiscover``); they take JSON-serializable
+  keyword arguments and should be safe to run more than once.
+- ``idempotency_key``: while a job with the key is pending or running,
+  enqueueing the same key returns that job instead of adding another one
+  (partial unique index on ``Job``).
+- Failures are retried with exponential backoff (``JOBS_BACKOFF_BASE`` doubled
+  per attempt, capped by ``JOBS_BACKOFF_MAX``, with jitter) up to
+  ``max_attempts``; then the job stays ``failed`` for inspection in the admin.
+- Workers claim one job at a time with ``SELECT ... FOR UPDATE SKIP LOCKED``
+  where the database supports it and a conditional UPDATE on ``status``, so
+  several workers never run the same job, and a claimed job never waits
+  unheartbeated behind another one. While a job runs, a heartbeat thread
+  refreshes its ``locked_at`` (every ``JOBS_HEARTBEAT_INTERVAL`` seconds), so
+  only jobs of a crashed worker go ``JOBS_LOCK_TIMEOUT`` without a heartbeat
+  and are released; a long import is not re-queued while it is still running.
+- ``run_job`` starts and finishes a job only while it is still ``running``
+  and locked by this worker (conditional UPDATEs), so a job released and
+  claimed elsewhere in between is skipped rather than run twice.
+
+``JOBS_EAGER = True`` runs jobs right after the request's transaction commits,
+in-process (tests, or a dev setup without a worker).
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from dataclasses import dataclass
+from datetime import timedelta
+from importlib import import_module
+from typing import Callable, Optional
+
+from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+ERROR_LENGTH = 4000
+
+
+@dataclass
+class Task:
+    name: str
+    func: Callable
+    queue: str
+    max_attempts: int
+
+
+_registry = {}
+
+
+def task(name=None, queue='default', max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Register ``func`` as a task; ``func.task_name`` is what ``enqueue`` stores."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = Task(task_name, func, queue, max_attempts)
+        func.task_name = task_name
+        return func
+    return decorator
+
+
+def autodiscover() -> None:
+    """Import ``<app>.tasks`` for every installed app so their tasks are registered."""
+    for app_config in apps.get_app_configs():
+        module = f'{app_config.name}.tasks'
+        try:
+            import_module(module)
+        except ModuleNotFoundError as e:
+            if e.name != module:
+                raise
+
+
+def get_task(name) -> Optional[Task]:
+    if name not in _registry:
+        autodiscover()
+    return _registry.get(name)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(task, kwargs=None, *, idempotency_key=None, user=None, delay=0, queue=None, max_attempts=None) -> Job:
+    """Queue a call of ``task`` (a registered function or its name) and return the ``Job``."""
+    name = getattr(task, 'task_name', task)
+    spec = get_task(name)
+    if spec is None:
+        raise ValueError(f'Unknown task: {name}')
+
+    fields = {
+        'name': name,
+        'kwargs': kwargs or {},
+        'queue': queue or spec.queue,
+        'max_attempts': max_attempts or spec.max_attempts,
+        'idempotency_key': idempotency_key,
+        'user': user if getattr(user, 'pk', None) else None,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+    }
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(**fields)
+            break
+        except IntegrityError:
+            if not idempotency_key:
+                raise
+            existing = Job.objects.filter(idempotency_key=idempotency_key, status__in=Job.ACTIVE_STATUSES).first()
+            if existing is not None:
+                return existing
+            # The active job finished in between; the key is free again
+    else:
+        raise IntegrityError(f'Could not enqueue {name} with key {idempotency_key}')
+
+    if _setting('JOBS_EAGER', False):
+        transaction.on_commit(lambda: Worker(worker_id='eager').run_now(job.pk))
+    return job
+
+
+def backoff(attempts) -> float:
+    """Seconds to wait before retry number ``attempts`` (1-based)."""
+    base = _setting('JOBS_BACKOFF_BASE', 10)
+    delay = min(base * 2 ** (attempts - 1), _setting('JOBS_BACKOFF_MAX', 3600))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def heartbeat_interval() -> float:
+    timeout = _setting('JOBS_LOCK_TIMEOUT', 600)
+    # Several heartbeats fit in the lock timeout, so one slow UPDATE does not release the job
+    return min(_setting('JOBS_HEARTBEAT_INTERVAL', timeout / 4), timeout / 2)
+
+
+class Heartbeat(threading.Thread):
+    """Keeps ``locked_at`` of a running job fresh so ``release_stale`` leaves it alone."""
+
+    def __init__(self, pk, worker_id, interval=None):
+        super().__init__(name=f'job-heartbeat-{pk}', daemon=True)
+        self.pk = pk
+        self.worker_id = worker_id
+        self.interval = interval if interval is not None else heartbeat_interval()
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                Job.objects.filter(pk=self.pk, status=Job.STATUS_RUNNING, locked_by=self.worker_id).update(
+                    locked_at=timezone.now(),
+                )
+        except Exception:
+            logger.exception('Heartbeat of job #%s failed', self.pk)
+        finally:
+            # The thread has its own connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Worker:
+    def __init__(self, queues=None, batch_size=10, worker_id=None):
+        self.queues = list(queues or [])
+        self.batch_size = batch_size
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+
+    def release_stale(self) -> int:
+        """Put running jobs whose heartbeat stopped (crashed worker) back in the queue."""
+        cutoff = timezone.now() - timedelta(seconds=_setting('JOBS_LOCK_TIMEOUT', 600))
+        return Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff).update(
+            status=Job.STATUS_PENDING, locked_by='', locked_at=None,
+        )
+
+    def _lock(self, pk, now) -> bool:
+        # The status condition keeps the claim exclusive where row locks are not available (SQLite)
+        return bool(Job.objects.filter(pk=pk, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING, locked_by=self.worker_id, locked_at=now,
+        ))
+
+    def claim(self) -> Optional[int]:
+        """Lock the next due job for this worker; returns its id or None."""
+        now = timezone.now()
+        due = Job.objects.filter(status=Job.STATUS_PENDING, run_at__lte=now)
+        if self.queues:
+            due = due.filter(queue__in=self.queues)
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).order_by('run_at', 'id').values_list('id', flat=True)[:1])
+            if ids and self._lock(ids[0], now):
+                return ids[0]
+        return None
+
+    def run_now(self, pk) -> bool:
+        """Lock and run pending job ``pk`` regardless of its queue (eager mode)."""
+        return self._lock(pk, timezone.now()) and self.run_job(pk)
+
+    def run_job(self, pk) -> bool:
+        """Execute job ``pk`` claimed by this worker; returns True on success.
+
+        A job that is no longer running under this worker's lock (released as
+        stale and claimed by another worker, or finished) is skipped.
+        """
+        owned = Job.objects.filter(pk=pk, status=Job.STATUS_RUNNING, locked_by=self.worker_id)
+        if not owned.update(locked_at=timezone.now()):
+            logger.warning('Job #%s is not locked by %s anymore, skipped', pk, self.worker_id)
+            return False
+        job = Job.objects.get(pk=pk)
+        attempts = job.attempts + 1
+        spec = get_task(job.name)
+        heartbeat = Heartbeat(pk, self.worker_id)
+        heartbeat.start()
+        try:
+            if spec is None:
+                raise LookupError(f'Unknown task: {job.name}')
+            spec.func(**job.kwargs)
+        except Exception:
+            error = traceback.format_exc()[-ERROR_LENGTH:]
+            if spec is not None and attempts < job.max_attempts:
+                delay = backoff(attempts)
+                logger.warning('Job %s #%s failed (attempt %s/%s), retrying in %.0fs', job.name, pk, attempts, job.max_attempts, delay)
+                owned.update(
+                    status=Job.STATUS_PENDING, attempts=attempts, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=delay), locked_by='', locked_at=None,
+                )
+            else:
+                logger.error('Job %s #%s failed permanently after %s attempt(s)', job.name, pk, attempts)
+                owned.update(
+                    status=Job.STATUS_FAILED, attempts=attempts, last_error=error, finished_at=timezone.now(),
+                )
+            return False
+        finally:
+            heartbeat.stop()
+        owned.update(
+            status=Job.STATUS_SUCCEEDED, attempts=attempts, last_error='', finished_at=timezone.now(),
+        )
+        return True
+
+    def run_batch(self) -> tuple:
+        """Claim and run up to ``batch_size`` jobs one by one; returns ``(succeeded, failed)``."""
+        succeeded = failed = 0
+        for _ in range(self.batch_size):
+            pk = self.claim()
+            if pk is None:
+                break
+            if self.run_job(pk):
+                succeeded += 1
+            else:
+                failed += 1
+            # Same connection hygiene as between HTTP requests
+            close_old_connections()
+        return succeeded, failed
+
+
+def prune_finished(days=None) -> int:
+    """Delete succeeded jobs older than ``JOBS_KEEP_DAYS``; failed ones are kept."""
+    days = days if days is not None else _setting('JOBS_KEEP_DAYS', 7)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status=Job.STATUS_SUCCEEDED, finished_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,138 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue
+from jobs.models import Job
+from jobs.queue import Worker, enqueue, task
+
+calls = []
+
+
+@task(name='jobs.tests.record')
+def record(value=None, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError('boom')
+
+
+@task(name='jobs.tests.running')
+def running():
+    calls.append(list(Job.objects.filter(status=Job.STATUS_RUNNING).values_list('locked_by', flat=True)))
+
+
+@override_settings(JOBS_EAGER=False, JOBS_BACKOFF_BASE=10, JOBS_BACKOFF_MAX=3600, JOBS_LOCK_TIMEOUT=600)
+class WorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        self.worker = Worker(worker_id='worker-a')
+
+    def test_enqueue_with_idempotency_key(self):
+        first = enqueue(record, {'value': 1}, idempotency_key='k')
+        self.assertEqual(enqueue(record, {'value': 2}, idempotency_key='k').pk, first.pk)
+        self.worker.run_batch()
+        # Finished jobs free the key
+        self.assertNotEqual(enqueue(record, {'value': 3}, idempotency_key='k').pk, first.pk)
+
+    def test_unknown_task_is_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('jobs.tests.missing')
+
+    def test_claim_takes_one_due_job(self):
+        later = enqueue(record, delay=60)
+        other = enqueue(record, queue='other')
+        job = enqueue(record)
+        worker = Worker(queues=['default'], worker_id='worker-a')
+        self.assertEqual(worker.claim(), job.pk)
+        self.assertIsNone(worker.claim())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.STATUS_RUNNING, 'worker-a'))
+        later.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((later.status, other.status), (Job.STATUS_PENDING, Job.STATUS_PENDING))
+
+    def test_batch_claims_one_job_at_a_time(self):
+        for _ in range(3):
+            enqueue(running)
+        worker = Worker(batch_size=3, worker_id='worker-a')
+        self.assertEqual(worker.run_batch(), (3, 0))
+        # No job waits locked (and without heartbeat) while another one runs
+        self.assertEqual(calls, [['worker-a']] * 3)
+
+    def test_success(self):
+        job = enqueue(record, {'value': 'ok'})
+        self.assertEqual(self.worker.run_batch(), (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_SUCCEEDED, 1))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(calls, ['ok'])
+
+    def test_retry_with_backoff_then_fail(self):
+        job = enqueue(record, {'fail': True}, max_attempts=2)
+        started = timezone.now()
+        self.assertEqual(self.worker.run_batch(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.STATUS_PENDING, 1, ''))
+        self.assertIn('boom', job.last_error)
+        # 10 s base with +-20% jitter
+        self.assertGreaterEqual(job.run_at, started + timedelta(seconds=8))
+        self.assertLessEqual(job.run_at, timezone.now() + timedelta(seconds=12))
+        # Not due yet
+        self.assertEqual(self.worker.run_batch(), (0, 0))
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(self.worker.run_batch(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        with mock.patch.object(queue.random, 'uniform', return_value=1.0):
+            self.assertEqual([queue.backoff(n) for n in (1, 2, 3)], [10, 20, 40])
+            self.assertEqual(queue.backoff(20), 3600)
+
+    def test_release_stale(self):
+        stale = enqueue(record)
+        fresh = enqueue(record)
+        Job.objects.filter(pk=stale.pk).update(
+            status=Job.STATUS_RUNNING, locked_by='crashed', locked_at=timezone.now() - timedelta(seconds=601),
+        )
+        Job.objects.filter(pk=fresh.pk).update(status=Job.STATUS_RUNNING, locked_by='alive', locked_at=timezone.now())
+        self.assertEqual(self.worker.release_stale(), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_by), (Job.STATUS_PENDING, ''))
+        self.assertEqual((fresh.status, fresh.locked_by), (Job.STATUS_RUNNING, 'alive'))
+
+    def test_job_claimed_elsewhere_is_not_run_twice(self):
+        job = enqueue(record, {'value': 'once'})
+        self.assertEqual(self.worker.claim(), job.pk)
+        # Worker A stalls past the lock timeout; its job is released and claimed by B
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+        other = Worker(worker_id='worker-b')
+        other.release_stale()
+        self.assertEqual(other.claim(), job.pk)
+
+        self.assertFalse(self.worker.run_job(job.pk))
+        self.assertEqual(calls, [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.STATUS_RUNNING, 'worker-b', 0))
+
+        self.assertTrue(other.run_job(job.pk))
+        self.assertEqual(calls, ['once'])
+
+    def test_finished_job_is_not_run_again(self):
+        job = enqueue(record)
+        self.worker.run_batch()
+        self.assertFalse(self.worker.run_job(job.pk))
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = enqueue(record, {'value': 'eager'})
+            self.assertEqual(calls, [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.STATUS_SUCCEEDED, 'eager'))
+        self.assertEqual(calls, ['eager'])
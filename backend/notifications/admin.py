@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationTemplate
+from .models import Notification, NotificationArchive, NotificationCounter, NotificationTemplate
 
 
 @admin.register(Notification)
@@ -15,3 +15,18 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
     list_display = ('name', 'notification_type', 'is_active', 'created_at')
     list_filter = ('notification_type', 'is_active')
     search_fields = ('name', 'title_template', 'message_template')
+
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ('user', 'unread', 'updated_at')
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ('user', 'title', 'notification_type', 'created_at', 'archived_at')
+    list_filter = ('notification_type',)
+    search_fields = ('user__email', 'title')
+    raw_id_fields = ('user',)
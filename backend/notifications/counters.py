@@ -0,0 +1,108 @@
+"""
+Per-user unread-notification counter.
+
+``NotificationCounter.unread`` is kept next to the ``Notification`` table so
+the badge (``unread-count/`` and the first event of ``stream/``) is a primary
+key lookup instead of a ``COUNT(*)`` over the user's history.
+
+- Every change goes through ``adjust``: a single ``UPDATE ... SET unread =
+  unread + d``, so concurrent requests never lose increments. It also pushes
+  the delta to open streams (``realtime.publish_unread_delta``).
+- ``notifications.signals`` adjusts on create/delete and on ``save()`` that
+  flips ``is_read``; bulk ``.update()`` paths (``mark_all_as_read``) call
+  ``adjust`` themselves, ``bulk_create`` paths (``notifications.fanout``)
+  call ``adjust_many``.
+- A missing row is initialised from the table on first use; ``reconcile``
+  (``manage.py reconcile_notification_counters``) rewrites counters that
+  drifted, e.g. after raw SQL or ``bulk_create`` without ``adjust``.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from . import realtime
+from .models import Notification, NotificationCounter
+
+
+def _count(user_id) -> int:
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def _initialise(user_id) -> int:
+    try:
+        with transaction.atomic():
+            counter = NotificationCounter.objects.create(user_id=user_id, unread=_count(user_id))
+        return counter.unread
+    except IntegrityError:
+        # Created concurrently; that row already reflects the table
+        return NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first() or 0
+
+
+def unread_count(user_id) -> int:
+    unread = NotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+    if unread is None:
+        unread = _initialise(user_id)
+    return max(unread, 0)
+
+
+def adjust(user_id, delta, publish=True) -> None:
+    """Apply ``delta`` to the user's counter (the table change is already written)."""
+    if not delta:
+        return
+    if not NotificationCounter.objects.filter(user_id=user_id).update(unread=F('unread') + delta):
+        # First change for this user: the count already includes it
+        _initialise(user_id)
+    if publish:
+        realtime.publish_unread_delta(user_id, delta)
+
+
+def adjust_many(deltas, publish=True) -> None:
+    """``adjust`` for ``{user_id: delta}`` with one UPDATE per distinct delta (bulk inserts)."""
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    for delta, user_ids in by_delta.items():
+        # Users without a row yet are initialised from the table on first read
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread=F('unread') + delta)
+        if publish:
+            realtime.publish_many((user_id, {'type': 'unread', 'unread_delta': delta}) for user_id in user_ids)
+
+
+def reconcile(user_ids=None, batch_size=1000) -> tuple:
+    """
+    Rewrite counters that differ from the table. Returns ``(checked, fixed)``.
+    Rows of each batch are locked while counting, so ``adjust`` calls wait
+    instead of being overwritten.
+    """
+    if user_ids is None:
+        user_ids = set(NotificationCounter.objects.values_list('user_id', flat=True))
+        user_ids.update(Notification.objects.filter(is_read=False).order_by().values_list('user_id', flat=True).distinct())
+    ids = sorted(set(user_ids))
+    checked = fixed = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        with transaction.atomic():
+            stored = dict(
+                NotificationCounter.objects.select_for_update()
+                .filter(user_id__in=batch).values_list('user_id', 'unread')
+            )
+            actual = dict(
+                Notification.objects.filter(user_id__in=batch, is_read=False)
+                .values('user_id').annotate(n=Count('id'))
+                .values_list('user_id', 'n')
+            )
+            stale = [
+                NotificationCounter(user_id=user_id, unread=actual.get(user_id, 0))
+                for user_id in batch
+                # Users without a row and without unread notifications need none
+                if stored.get(user_id, 0) != actual.get(user_id, 0)
+            ]
+            if stale:
+                NotificationCounter.objects.bulk_create(
+                    stale, update_conflicts=True, unique_fields=['user'], update_fields=['unread', 'updated_at'],
+                )
+            checked += len(batch)
+            fixed += len(stale)
+    return checked, fixed
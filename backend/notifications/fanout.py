@@ -0,0 +1,209 @@
+"""
+Bulk notifications from a ``NotificationTemplate``.
+
+``fan_out`` renders the template for every row of a segment (a named user
+query, see ``SEGMENTS``) and inserts the notifications with chunked
+``bulk_create``:
+
+- rows are streamed with ``QuerySet.iterator()`` as plain ``values()``
+  tuples (server-side cursor on PostgreSQL), so memory stays flat for any
+  segment size;
+- ``title_template``/``message_template`` use ``str.format`` placeholders,
+  e.g. ``"{first_name}, до дедлайна {university_name} осталось {days_left} дн."``;
+  unknown placeholders are left as is; ``validate`` renders the first row of
+  the segment before anything is sent, so a placeholder the segment does not
+  provide cannot fail the job halfway (e.g. ``{days_left:d}`` on ``all``);
+- each chunk is one transaction: the insert plus the unread counters
+  (``counters.adjust_many``), which also pushes the badge change to open
+  streams. ``bulk_create`` sends no ``post_save``, so nothing else fires.
+
+Entry points: ``manage.py send_notifications`` and the admin endpoint
+``POST /api/notifications/templates/<id>/send/`` (runs as a background job).
+"""
+import string
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+from typing import Callable
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import counters
+from .models import Notification
+
+DEFAULT_BATCH_SIZE = 2000
+TITLE_LENGTH = Notification._meta.get_field('title').max_length
+
+
+@dataclass
+class Segment:
+    name: str
+    description: str
+    # (today, days) -> QuerySet.values(); every row has user_id
+    rows: Callable
+    # Keys of a row that are also stored in Notification.data
+    data_keys: tuple = ()
+
+
+USER_FIELDS = ('first_name', 'last_name', 'email')
+
+
+def _users(filters=None, exclude=None, **fields):
+    users = get_user_model().objects.filter(is_active=True, **(filters or {}))
+    if exclude:
+        users = users.exclude(**exclude)
+    return users.values(*USER_FIELDS, user_id=F('id'), **fields)
+
+
+def _all(today, days):
+    return _users()
+
+
+def _unverified(today, days):
+    return _users({'is_verified': False})
+
+
+def _onboarding_incomplete(today, days):
+    return _users(exclude={'profile__onboarding_completed': True})
+
+
+def _deadline_soon(today, days):
+    from education.models import Application
+
+    return Application.objects.filter(
+        user__is_active=True,
+        status='draft',
+        university__deadline__range=(today, today + timedelta(days=days)),
+    ).values(
+        'user_id',
+        application_id=F('id'),
+        first_name=F('user__first_name'),
+        last_name=F('user__last_name'),
+        email=F('user__email'),
+        university_name=F('university__name'),
+        major_name=F('major__name'),
+        deadline=F('university__deadline'),
+    )
+
+
+def _exam_soon(field):
+    def rows(today, days):
+        return _users(
+            {f'profile__{field}__range': (today, today + timedelta(days=days))},
+            exam_date=F(f'profile__{field}'),
+        )
+    return rows
+
+
+SEGMENTS = {s.name: s for s in [
+    Segment('all', 'All active users', _all),
+    Segment('unverified', 'Users who have not confirmed their email', _unverified),
+    Segment('onboarding_incomplete', 'Users who have not finished onboarding', _onboarding_incomplete),
+    Segment(
+        'deadline_soon', 'Draft applications whose university deadline is within --days',
+        _deadline_soon, data_keys=('application_id',),
+    ),
+    Segment('ielts_soon', 'Users with an IELTS exam within --days', _exam_soon('ielts_exam_date')),
+    Segment('tolc_soon', 'Users with a TOLC exam within --days', _exam_soon('tolc_exam_date')),
+]}
+
+
+class _Context(dict):
+    def __missing__(self, key):
+        return '{' + key + '}'
+
+
+def _variables(row, extra, today) -> dict:
+    variables = {**row, **extra}
+    deadline = row.get('deadline') or row.get('exam_date')
+    if deadline is not None:
+        variables.setdefault('days_left', (deadline - today).days)
+    return variables
+
+
+def validate(template, segment=None, *, days=7, context=None) -> None:
+    """
+    Raise ``ValueError`` if a template string is not valid ``str.format``
+    syntax or, given ``segment``, does not render for its first row.
+    """
+    for text in (template.title_template, template.message_template):
+        list(string.Formatter().parse(text))
+    if segment is None:
+        return
+    row = segment_rows(segment, days).first()
+    if row is None:
+        return
+    try:
+        render(template, _variables(row, dict(context or {}), timezone.localdate()))
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f'Template does not render for segment {segment}: {e!r}') from e
+
+
+def render(template, context) -> tuple:
+    """``(title, message)`` of ``template`` for ``context``."""
+    context = _Context(context)
+    title = template.title_template.format_map(context)[:TITLE_LENGTH]
+    return title, template.message_template.format_map(context)
+
+
+@dataclass
+class FanOutResult:
+    rows: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def segment_rows(segment, days=7, today=None):
+    if segment not in SEGMENTS:
+        raise ValueError(f'Unknown segment: {segment} (choices: {", ".join(SEGMENTS)})')
+    return SEGMENTS[segment].rows(today or timezone.localdate(), days)
+
+
+def fan_out(template, segment, *, days=7, context=None, batch_size=DEFAULT_BATCH_SIZE, limit=None, push=True, progress=None) -> FanOutResult:
+    """
+    Create one notification per row of ``segment``. ``context`` adds/overrides
+    template variables for every row; ``progress(rows, elapsed)`` is called
+    after each chunk.
+    """
+    validate(template, segment, days=days, context=context)
+    spec = SEGMENTS.get(segment)
+    rows = segment_rows(segment, days)
+    if limit:
+        rows = rows[:limit]
+    extra = dict(context or {})
+    base_data = {'template': template.name, 'segment': segment}
+    today = timezone.localdate()
+
+    started = time.perf_counter()
+    total = 0
+    stream = rows.iterator(chunk_size=batch_size)
+    while True:
+        chunk = list(islice(stream, batch_size))
+        if not chunk:
+            break
+        objs = []
+        deltas = Counter()
+        for row in chunk:
+            title, message = render(template, _variables(row, extra, today))
+            data = dict(base_data)
+            data.update((key, row[key]) for key in spec.data_keys if key in row)
+            objs.append(Notification(
+                user_id=row['user_id'], title=title, message=message,
+                notification_type=template.notification_type, data=data,
+            ))
+            deltas[row['user_id']] += 1
+        with transaction.atomic():
+            Notification.objects.bulk_create(objs, batch_size=batch_size)
+            counters.adjust_many(deltas, publish=push)
+        total += len(objs)
+        if progress is not None:
+            progress(total, time.perf_counter() - started)
+    return FanOutResult(total, time.perf_counter() - started)
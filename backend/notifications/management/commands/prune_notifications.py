@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from notifications.models import Notification
+from notifications.retention import DEFAULT_BATCH_SIZE, prune, ttl_days
+
+
+class Command(BaseCommand):
+    help = "Archive or delete read notifications past NOTIFICATIONS_RETENTION_DAYS (run daily)."
+
+    def add_arguments(self, parser):
+        types = [t for t, _ in Notification.NOTIFICATION_TYPES]
+        parser.add_argument("--type", action="append", dest="types", choices=types, help="Only this notification_type (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Rows per transaction (default: {DEFAULT_BATCH_SIZE})")
+        parser.add_argument("--no-archive", action="store_true", help="Delete without copying to NotificationArchive")
+        parser.add_argument("--dry-run", action="store_true", help="Only count expired rows")
+
+    def handle(self, *args, **options):
+        def progress(notification_type, rows, elapsed):
+            self.stdout.write(f"  {notification_type}: {rows} ({rows / elapsed:,.0f} rows/sec)")
+
+        result = prune(
+            options["types"], archive=False if options["no_archive"] else None,
+            batch_size=max(options["batch_size"], 1), dry_run=options["dry_run"], progress=progress,
+        )
+        verb = "Would remove" if options["dry_run"] else "Removed"
+        for name, rows in result.items():
+            ttl = "archive" if name == "archive" else f"{ttl_days(name)} days"
+            self.stdout.write(f"{verb} {rows} {name} ({ttl})")
+        self.stdout.write(self.style.SUCCESS(f"{verb} {sum(result.values())} row(s)"))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications import counters
+
+
+class Command(BaseCommand):
+    help = "Recount unread notifications and fix drifted NotificationCounter rows (run periodically, e.g. hourly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only this user id (repeatable)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Users per locked batch (default: 1000)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked, fixed = counters.reconcile(options["users"], batch_size=max(options["batch_size"], 1))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} counter(s), fixed {fixed} in {elapsed:.2f}s"))
@@ -29,6 +29,57 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read'], name='notif_user_read_idx'),
+            # Лента пользователя (ORDER BY created_at DESC, курсорная пагинация)
+            models.Index(fields=['user', '-created_at', '-id'], name='notif_user_created_idx'),
+            # Поиск устаревших прочитанных уведомлений (notifications.retention)
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notif_read_created_idx'),
+        ]
+
+
+class NotificationArchive(models.Model):
+    """Прочитанные уведомления после истечения срока хранения (notifications.retention)"""
+    # id исходного Notification
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications', db_index=False)
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.title}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notif_archive_user_idx'),
+            models.Index(fields=['archived_at'], name='notif_archive_at_idx'),
+        ]
+
+
+class NotificationCounter(models.Model):
+    """Денормализованный счётчик непрочитанных (см. notifications.counters)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread}"
+
+
+class StreamTicket(models.Model):
+    """Одноразовый короткоживущий билет для подключения к stream/ (notifications.tickets)"""
+    # SHA-256 билета: сам билет в базе не хранится
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stream_tickets')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} до {self.expires_at}"
 
 
 class NotificationTemplate(models.Model):
@@ -0,0 +1,6 @@
+from aieducation.pagination import KeysetCursorPagination
+
+
+class NotificationCursorPagination(KeysetCursorPagination):
+    page_size = 20
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,166 @@
+"""
+Push channel for notifications (Server-Sent Events).
+
+Instead of polling ``unread-count/`` and the list, the frontend keeps one
+``EventSource`` open on ``/api/notifications/stream/`` (served by the ASGI
+process, like the AI chat stream) and receives:
+
+- ``unread``: ``{"unread_count": n}`` once on connect, then
+  ``{"unread_delta": d}`` when notifications are read;
+- ``notification``: a new ``Notification`` (serialized) with
+  ``"unread_delta": 1``;
+- ``resync``: events were dropped for a slow client, refetch the list.
+
+Events are published after commit by ``notifications.signals`` and the
+read endpoints. The default broker is in-process, which is enough only when
+the notification is created by the process that holds the stream (single
+process, dev; ``NOTIFICATIONS_LOCAL_BROKER``). With more than one process set
+``NOTIFICATIONS_REDIS_URL`` (requires the ``redis`` package) to fan out from
+gunicorn workers and ``run_jobs``; without either the stream answers 501 and
+the frontend polls ``unread-count/``. So does a WSGI worker, which would be
+held for the whole life of the stream.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # optional: only needed for NOTIFICATIONS_REDIS_URL
+    redis = aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'notifications:{user_id}'
+# Events buffered per connection; a slow client gets a resync instead of unbounded memory
+QUEUE_SIZE = 100
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # user id -> {(queue, loop)}
+
+    def publish(self, user_id, event) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Loop already closed; the subscription is dropped on exit
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        """Yields ``get(timeout)`` returning the next event or None on timeout."""
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        entry = (queue, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[user_id].add(entry)
+
+        async def get(timeout):
+            try:
+                return await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+        try:
+            yield get
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(entry)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+
+class RedisBroker:
+    def __init__(self, url):
+        if redis is None:
+            raise ImproperlyConfigured('NOTIFICATIONS_REDIS_URL requires the redis package (pip install redis)')
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, user_id, event) -> None:
+        self._client.publish(CHANNEL.format(user_id=user_id), json.dumps(event, ensure_ascii=False))
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(CHANNEL.format(user_id=user_id))
+
+        async def get(timeout):
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+            return json.loads(message['data']) if message else None
+
+        try:
+            yield get
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # Drop the backlog and ask the client to refetch
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'type': 'resync'})
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = getattr(settings, 'NOTIFICATIONS_REDIS_URL', '')
+                _broker = RedisBroker(url) if url else InProcessBroker()
+    return _broker
+
+
+def stream_available() -> bool:
+    """Whether streams receive every event: a shared broker, or a single-process setup."""
+    return bool(getattr(settings, 'NOTIFICATIONS_REDIS_URL', '')) or getattr(settings, 'NOTIFICATIONS_LOCAL_BROKER', False)
+
+
+def publish(user_id, event) -> None:
+    """Send ``event`` to the user's open streams once the current transaction commits."""
+    publish_many([(user_id, event)])
+
+
+def publish_many(events) -> None:
+    """``publish`` for ``[(user_id, event), ...]`` with a single on-commit callback."""
+    events = list(events)
+    if not events:
+        return
+
+    def send():
+        broker = get_broker()
+        for user_id, event in events:
+            try:
+                broker.publish(user_id, event)
+            except Exception:
+                # Push is best effort; clients still load state on connect
+                logger.exception('Notification publish failed')
+    transaction.on_commit(send)
+
+
+def publish_unread_delta(user_id, delta) -> None:
+    if delta:
+        publish(user_id, {'type': 'unread', 'unread_delta': delta})
@@ -0,0 +1,105 @@
+"""
+Retention of old notifications.
+
+Read notifications expire ``NOTIFICATIONS_RETENTION_DAYS[notification_type]``
+days after creation (``'default'`` for types not listed, ``None`` keeps them).
+Unread ones are never removed, so the unread counters stay valid.
+``prune`` works in batches of the oldest rows, each a single transaction:
+
+- copy the rows into ``NotificationArchive`` (when ``NOTIFICATIONS_ARCHIVE``),
+- delete them by primary key with ``QuerySet.delete()``, so a row marked
+  unread meanwhile still adjusts the counter through ``post_delete``.
+
+Archived rows are dropped after ``NOTIFICATIONS_ARCHIVE_DAYS`` (``None``
+keeps them). Run
+``manage.py prune_notifications`` daily; each run only touches the expired
+tail, found through the partial ``(created_at) WHERE is_read`` index.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification, NotificationArchive
+
+DEFAULT_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = ('id', 'user_id', 'notification_type', 'title', 'message', 'data', 'created_at')
+
+
+def ttl_days(notification_type):
+    policy = getattr(settings, 'NOTIFICATIONS_RETENTION_DAYS', {})
+    return policy.get(notification_type, policy.get('default'))
+
+
+def expired(notification_type, now=None):
+    """Read notifications of ``notification_type`` past their retention, or None if kept forever."""
+    days = ttl_days(notification_type)
+    if days is None:
+        return None
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Notification.objects.filter(is_read=True, notification_type=notification_type, created_at__lt=cutoff)
+
+
+def _delete_ids(model, ids) -> int:
+    deleted, _ = model.objects.filter(pk__in=ids).delete()
+    return deleted
+
+
+def _archive_batch(queryset, batch_size, archive) -> int:
+    with transaction.atomic():
+        rows = list(queryset.order_by('created_at').values(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        if archive:
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive(archived_at=timezone.now(), **row) for row in rows],
+                ignore_conflicts=True,
+            )
+        return _delete_ids(Notification, [row['id'] for row in rows])
+
+
+def prune(types=None, *, archive=None, batch_size=DEFAULT_BATCH_SIZE, now=None, dry_run=False, progress=None) -> dict:
+    """
+    Archive/delete expired notifications. Returns ``{notification_type: rows}``
+    (plus ``'archive'``: archived rows dropped). ``progress(type, rows, elapsed)``
+    is called after every batch.
+    """
+    archive = getattr(settings, 'NOTIFICATIONS_ARCHIVE', True) if archive is None else archive
+    now = now or timezone.now()
+    started = time.perf_counter()
+    result = {}
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        if types and notification_type not in types:
+            continue
+        queryset = expired(notification_type, now)
+        if queryset is None:
+            continue
+        if dry_run:
+            result[notification_type] = queryset.count()
+            continue
+        total = 0
+        while True:
+            removed = _archive_batch(queryset, batch_size, archive)
+            if not removed:
+                break
+            total += removed
+            if progress is not None:
+                progress(notification_type, total, time.perf_counter() - started)
+        result[notification_type] = total
+
+    archive_days = getattr(settings, 'NOTIFICATIONS_ARCHIVE_DAYS', None)
+    if archive_days is not None and not types:
+        old = NotificationArchive.objects.filter(archived_at__lt=now - timedelta(days=archive_days))
+        if dry_run:
+            result['archive'] = old.count()
+        else:
+            dropped = 0
+            while True:
+                ids = list(old.order_by('archived_at').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                dropped += _delete_ids(NotificationArchive, ids)
+            result['archive'] = dropped
+    return result
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import counters, realtime
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+@receiver(post_init, sender=Notification)
+def remember_read_state(sender, instance, **kwargs):
+    # Deferred is_read (.only()/.defer()) stays unknown instead of costing a query
+    instance._loaded_is_read = instance.__dict__.get('is_read') if instance.pk else None
+
+
+@receiver(post_save, sender=Notification)
+def push_new_notification(sender, instance, created, **kwargs):
+    if created:
+        delta = 0 if instance.is_read else 1
+        counters.adjust(instance.user_id, delta, publish=False)
+        realtime.publish(instance.user_id, {
+            'type': 'notification',
+            'notification': NotificationSerializer(instance).data,
+            'unread_delta': delta,
+        })
+    elif instance._loaded_is_read is not None and instance._loaded_is_read != instance.is_read:
+        counters.adjust(instance.user_id, int(instance._loaded_is_read) - int(instance.is_read))
+    instance._loaded_is_read = instance.is_read
+
+
+@receiver(post_delete, sender=Notification)
+def push_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        counters.adjust(instance.user_id, -1)
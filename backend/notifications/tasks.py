@@ -0,0 +1,11 @@
+from jobs.queue import task
+
+from .fanout import fan_out
+from .models import NotificationTemplate
+
+
+@task(name='notifications.fan_out', queue='bulk', max_attempts=1)
+def send_template(template_id, segment, days=7, context=None):
+    # Not retried: a second run would notify the already covered rows again
+    template = NotificationTemplate.objects.get(pk=template_id)
+    fan_out(template, segment, days=days, context=context)
@@ -1,3 +1,365 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts.models import User
+from education.models import Application, Major, University
+from jobs.queue import Worker
+from notifications import counters, fanout, realtime, retention, tickets
+from notifications.models import (
+    Notification, NotificationArchive, NotificationCounter, NotificationTemplate, StreamTicket,
+)
+
+
+class InProcessBrokerTests(TestCase):
+    def test_publish_reaches_subscribers_of_the_user(self):
+        async def scenario():
+            broker = realtime.InProcessBroker()
+            async with broker.subscribe(1) as mine, broker.subscribe(2) as other:
+                broker.publish(1, {'type': 'unread', 'unread_delta': 1})
+                return await mine(1), await other(0.01)
+
+        self.assertEqual(asyncio.run(scenario()), ({'type': 'unread', 'unread_delta': 1}, None))
+
+    def test_slow_subscriber_gets_resync(self):
+        async def scenario():
+            broker = realtime.InProcessBroker()
+            async with broker.subscribe(1) as get:
+                for i in range(3):
+                    broker.publish(1, {'type': 'notification', 'i': i})
+                await asyncio.sleep(0)
+                return await get(1), await get(0.01)
+
+        with mock.patch.object(realtime, 'QUEUE_SIZE', 2):
+            self.assertEqual(asyncio.run(scenario()), ({'type': 'resync'}, None))
+
+    def test_unsubscribe_on_exit(self):
+        async def scenario():
+            broker = realtime.InProcessBroker()
+            async with broker.subscribe(1):
+                pass
+            return broker
+
+        broker = asyncio.run(scenario())
+        self.assertEqual(dict(broker._subscribers), {})
+        # Nobody listens: publishing is a no-op
+        broker.publish(1, {'type': 'unread'})
+
+    def test_publish_waits_for_commit(self):
+        broker = realtime.InProcessBroker()
+        with mock.patch.object(realtime, 'get_broker', return_value=broker), \
+                mock.patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                realtime.publish_unread_delta(7, -2)
+                realtime.publish_unread_delta(7, 0)
+                publish.assert_not_called()
+        publish.assert_called_once_with(7, {'type': 'unread', 'unread_delta': -2})
+
+
+class StreamTicketTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='stream@example.com', username='stream', password='x')
+
+    def test_ticket_endpoint_requires_authentication(self):
+        url = reverse('notification-stream-ticket')
+        self.assertEqual(self.client.post(url).status_code, 401)
+        self.client.force_authenticate(self.user)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(tickets.redeem(response.data['ticket']), self.user.pk)
+
+    def test_ticket_is_single_use(self):
+        ticket, _ = tickets.issue(self.user)
+        # Only the hash is stored
+        self.assertFalse(StreamTicket.objects.filter(key=ticket).exists())
+        self.assertEqual(tickets.redeem(ticket), self.user.pk)
+        self.assertIsNone(tickets.redeem(ticket))
+        self.assertIsNone(tickets.redeem('made-up'))
+
+    def test_expired_ticket_is_rejected_and_pruned(self):
+        ticket, _ = tickets.issue(self.user)
+        StreamTicket.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(tickets.redeem(ticket))
+
+        tickets.issue(self.user)
+        StreamTicket.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        tickets.issue(self.user)
+        self.assertEqual(StreamTicket.objects.count(), 1)
+
+
+@override_settings(NOTIFICATIONS_REDIS_URL='', NOTIFICATIONS_LOCAL_BROKER=True)
+class NotificationStreamTests(TestCase):
+    url = '/api/notifications/stream/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='sse@example.com', username='sse', password='x')
+
+    def test_wsgi_answers_501(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.json()['code'], 'stream_unavailable')
+
+    @override_settings(NOTIFICATIONS_LOCAL_BROKER=False)
+    async def test_without_shared_broker_answers_501_before_redeeming(self):
+        ticket, _ = await sync_to_async(tickets.issue)(self.user)
+        response = await AsyncClient().get(self.url, {'ticket': ticket})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_used_ticket_is_rejected(self):
+        response = await AsyncClient().get(self.url, {'ticket': 'made-up'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'ticket_invalid')
+
+    async def test_access_token_in_query_is_not_accepted(self):
+        response = await AsyncClient().get(self.url, {'token': 'anything'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_ticket_opens_stream(self):
+        ticket, _ = await sync_to_async(tickets.issue)(self.user)
+        response = await AsyncClient().get(self.url, {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        received = []
+
+        async def consume():
+            async for part in response.streaming_content:
+                received.append(part)
+
+        # Like a client disconnect: the ASGI handler cancels the streaming task
+        async def first_event():
+            while not received:
+                await asyncio.sleep(0.01)
+
+        reader = asyncio.create_task(consume())
+        await asyncio.wait_for(first_event(), 5)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(received, [b'event: unread\ndata: {"unread_count": 0}\n\n'])
+
+
+class UnreadCounterTests(APITestCase):
+    """NotificationCounter follows creates, reads and deletes without COUNT queries."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='count@example.com', username='count', password='x')
+        self.client.force_authenticate(self.user)
+
+    def _notify(self, **fields):
+        return Notification.objects.create(user=self.user, title='t', message='m', **fields)
+
+    def _stored(self):
+        return NotificationCounter.objects.get(user=self.user).unread
+
+    def _badge(self):
+        response = self.client.get(reverse('unread-notifications-count'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def test_create_read_and_delete(self):
+        first = self._notify()
+        self._notify()
+        self._notify(is_read=True)
+        self.assertEqual(self._stored(), 2)
+
+        response = self.client.post(reverse('mark-as-read', args=[first.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._stored(), 1)
+        # Marking it again changes nothing
+        self.client.post(reverse('mark-as-read', args=[first.pk]))
+        self.assertEqual(self._badge(), 1)
+
+        first = Notification.objects.get(pk=first.pk)
+        first.is_read = False
+        first.save()
+        self.assertEqual(self._stored(), 2)
+        first.delete()
+        self.assertEqual(self._stored(), 1)
+        Notification.objects.filter(is_read=True).get().delete()
+        self.assertEqual(self._stored(), 1)
+
+    def test_mark_all_read(self):
+        for _ in range(3):
+            self._notify()
+        self.client.post(reverse('mark-all-read'))
+        self.assertEqual(self._stored(), 0)
+        self.assertEqual(self._badge(), 0)
+
+    def test_create_endpoint(self):
+        response = self.client.post(reverse('create-notification'), {'title': 't', 'message': 'm'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self._badge(), 1)
+
+    def test_badge_is_one_primary_key_lookup(self):
+        self._notify()
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.unread_count(self.user.pk), 1)
+
+    def test_missing_row_is_initialised_from_the_table(self):
+        self._notify()
+        self._notify()
+        NotificationCounter.objects.all().delete()
+        self.assertEqual(self._badge(), 2)
+        self.assertEqual(self._stored(), 2)
+
+    def test_reconcile_fixes_drift(self):
+        self._notify()
+        NotificationCounter.objects.filter(user=self.user).update(unread=5)
+        other = User.objects.create_user(email='other@example.com', username='other', password='x')
+        Notification.objects.bulk_create([Notification(user=other, title='t', message='m')])
+        self.assertEqual(counters.reconcile(), (2, 2))
+        self.assertEqual(self._stored(), 1)
+        self.assertEqual(NotificationCounter.objects.get(user=other).unread, 1)
+        self.assertEqual(counters.reconcile(), (2, 0))
+
+
+class FanOutTests(APITestCase):
+    """fan_out: one notification per segment row, inserted in chunks with the counters."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f'fan{i}@example.com', username=f'fan{i}', password='x', first_name=f'User{i}')
+            for i in range(5)
+        ]
+        User.objects.filter(pk=self.users[-1].pk).update(is_active=False)
+        self.template = NotificationTemplate.objects.create(
+            name='hello', title_template='{first_name}, hi', notification_type='info',
+            message_template='{first_name}: {unknown} {extra}',
+        )
+
+    def test_one_row_per_active_user(self):
+        # One user already has a counter row, the others are initialised on read
+        counters.unread_count(self.users[0].pk)
+        result = fanout.fan_out(self.template, 'all', context={'extra': '!'}, batch_size=2)
+        self.assertEqual(result.rows, 4)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_id', flat=True)),
+            sorted(u.pk for u in self.users[:4]),
+        )
+        notification = Notification.objects.get(user=self.users[1])
+        self.assertEqual((notification.title, notification.message), ('User1, hi', 'User1: {unknown} !'))
+        self.assertEqual(notification.data, {'template': 'hello', 'segment': 'all'})
+        for user in self.users[:4]:
+            self.assertEqual(counters.unread_count(user.pk), 1)
+
+    def test_query_count_per_chunk_is_flat(self):
+        counts = []
+        for limit in (2, 4):
+            Notification.objects.all().delete()
+            with CaptureQueriesContext(connection) as ctx:
+                fanout.fan_out(self.template, 'all', batch_size=limit, limit=limit)
+            counts.append(len(ctx))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_deadline_segment(self):
+        today = timezone.localdate()
+        university = University.objects.create(
+            name='Padova', country='Italy', city='Padova', description='d', deadline=today + timedelta(days=3),
+        )
+        major = Major.objects.create(name='Law', description='d', category='law')
+        application = Application.objects.create(
+            user=self.users[0], university=university, major=major, motivation_letter='m',
+        )
+        template = NotificationTemplate.objects.create(
+            name='deadline', title_template='{university_name}', notification_type='application',
+            message_template='{days_left:d} дн.',
+        )
+        self.assertEqual(fanout.fan_out(template, 'deadline_soon', days=7).rows, 1)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.title, notification.message), ('Padova', '3 дн.'))
+        self.assertEqual(notification.data['application_id'], application.pk)
+
+    def test_template_is_validated_before_sending(self):
+        template = NotificationTemplate.objects.create(
+            name='bad', title_template='t', message_template='{days_left:d}', notification_type='info',
+        )
+        with self.assertRaises(ValueError):
+            fanout.fan_out(template, 'all')
+        self.assertFalse(Notification.objects.exists())
+
+    def test_send_endpoint_queues_a_job(self):
+        admin = User.objects.create_user(email='admin@example.com', username='admin', password='x', is_staff=True)
+        self.client.force_authenticate(admin)
+        url = reverse('notification-template-send', args=[self.template.pk])
+        self.assertEqual(self.client.post(url, {'segment': 'nope'}, format='json').status_code, 400)
+        response = self.client.post(url, {'segment': 'unverified'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        Worker(worker_id='test').run_batch()
+        # Four unverified active users plus the admin
+        self.assertEqual(Notification.objects.count(), 5)
+
+
+@override_settings(
+    NOTIFICATIONS_RETENTION_DAYS={'default': 90, 'info': 30, 'payment': None},
+    NOTIFICATIONS_ARCHIVE=True, NOTIFICATIONS_ARCHIVE_DAYS=730,
+)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='old@example.com', username='old', password='x')
+        self.now = timezone.now()
+
+    def _notify(self, days_ago, notification_type='info', is_read=True):
+        notification = Notification.objects.create(
+            user=self.user, title='t', message='m', notification_type=notification_type, is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=self.now - timedelta(days=days_ago))
+        return notification.pk
+
+    def _remaining(self):
+        return set(Notification.objects.values_list('pk', flat=True))
+
+    def test_only_read_rows_past_the_cutoff_are_archived(self):
+        expired = [self._notify(31), self._notify(100, 'course')]
+        kept = {
+            self._notify(29),
+            self._notify(31, is_read=False),
+            self._notify(80, 'course'),
+            self._notify(1000, 'payment'),
+        }
+        result = retention.prune(batch_size=1, now=self.now)
+        self.assertEqual((result['info'], result['course']), (1, 1))
+        self.assertNotIn('payment', result)
+        self.assertEqual(self._remaining(), kept)
+        self.assertEqual(set(NotificationArchive.objects.values_list('pk', flat=True)), set(expired))
+        self.assertEqual(counters.unread_count(self.user.pk), 1)
+
+    def test_without_archive(self):
+        self._notify(31)
+        self.assertEqual(retention.prune(archive=False, now=self.now)['info'], 1)
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_dry_run_counts_only(self):
+        self._notify(31)
+        self.assertEqual(retention.prune(dry_run=True, now=self.now)['info'], 1)
+        self.assertEqual(len(self._remaining()), 1)
+
+    def test_row_marked_unread_meanwhile_keeps_counter(self):
+        pk = self._notify(31)
+        Notification.objects.filter(pk=pk).update(is_read=False)
+        counters.adjust(self.user.pk, 1)
+        # Deleted through the ORM, so post_delete sees the unread row
+        retention._delete_ids(Notification, [pk])
+        self.assertEqual(counters.unread_count(self.user.pk), 0)
+
+    def test_old_archive_rows_are_dropped(self):
+        self._notify(31)
+        retention.prune(now=self.now)
+        self.assertEqual(retention.prune(now=self.now + timedelta(days=729))['archive'], 0)
+        self.assertEqual(retention.prune(now=self.now + timedelta(days=731))['archive'], 1)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    @override_settings(NOTIFICATIONS_ARCHIVE_DAYS=None)
+    def test_archive_kept_when_archive_days_is_none(self):
+        self._notify(31)
+        retention.prune(now=self.now)
+        self.assertNotIn('archive', retention.prune(now=self.now + timedelta(days=10000)))
+        self.assertEqual(NotificationArchive.objects.count(), 1)
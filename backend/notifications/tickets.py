@@ -0,0 +1,52 @@
+"""
+Tickets for opening the notification stream.
+
+``EventSource`` cannot send an Authorization header, and an access token in
+the query string ends up in proxy logs and browser history while it stays
+valid for its whole lifetime. Instead the client asks for a ticket with an
+authenticated ``POST stream/ticket/`` and opens ``stream/?ticket=...``:
+
+- a ticket is valid for ``NOTIFICATIONS_STREAM_TICKET_TTL`` seconds and can
+  be redeemed once (a conditional DELETE, so two redemptions never both win);
+- it lives in the database, so it can be issued by a WSGI worker and redeemed
+  by the ASGI process; only its SHA-256 is stored.
+
+Expired tickets are deleted whenever a new one is issued.
+"""
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import StreamTicket
+
+
+def _ttl() -> int:
+    return getattr(settings, 'NOTIFICATIONS_STREAM_TICKET_TTL', 30)
+
+
+def _key(raw) -> str:
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def issue(user) -> tuple:
+    """``(ticket, ttl)`` for ``user``."""
+    now = timezone.now()
+    StreamTicket.objects.filter(expires_at__lt=now).delete()
+    raw = secrets.token_urlsafe(32)
+    StreamTicket.objects.create(key=_key(raw), user=user, expires_at=now + timedelta(seconds=_ttl()))
+    return raw, _ttl()
+
+
+def redeem(raw):
+    """User id of ticket ``raw``, or None when it is unknown, expired or already used."""
+    ticket = StreamTicket.objects.filter(key=_key(raw)).values_list('pk', 'user_id', 'expires_at').first()
+    if ticket is None:
+        return None
+    pk, user_id, expires_at = ticket
+    deleted, _ = StreamTicket.objects.filter(pk=pk).delete()
+    if not deleted or expires_at <= timezone.now():
+        return None
+    return user_id
@@ -1,16 +1,44 @@
+import json
+
+from asgiref.sync import sync_to_async
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+
+from accounts.authentication import ClaimsJWTAuthentication
+from accounts.models import User
+from jobs.queue import enqueue
+from jobs.serializers import JobSerializer
 
+from . import counters, realtime, tickets
+from .fanout import SEGMENTS, validate
 from .models import Notification, NotificationTemplate
+from .pagination import NotificationCursorPagination
 from .serializers import NotificationSerializer, NotificationTemplateSerializer
 
+# Comment line interval that keeps idle streams open through proxies
+STREAM_HEARTBEAT = 25
+
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    @property
+    def paginator(self):
+        # ?paginate=cursor: keyset-страницы без COUNT/OFFSET по всей истории
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('paginate') == 'cursor':
+                self._paginator = NotificationCursorPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
     def get_queryset(self):
         return Notification.objects.filter(user=self.request.user).order_by('-created_at')
 
@@ -29,24 +57,55 @@ class NotificationTemplateListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAdminUser])
+def send_template(request, pk):
+    """Разослать шаблон сегменту пользователей (фоновая задача, см. notifications.fanout)"""
+    try:
+        template = NotificationTemplate.objects.get(pk=pk, is_active=True)
+    except NotificationTemplate.DoesNotExist:
+        return Response({'error': 'Шаблон не найден'}, status=status.HTTP_404_NOT_FOUND)
+
+    segment = request.data.get('segment')
+    if segment not in SEGMENTS:
+        return Response(
+            {'error': 'Неизвестный сегмент', 'segments': {s.name: s.description for s in SEGMENTS.values()}},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    context = request.data.get('context') or {}
+    try:
+        days = int(request.data.get('days', 7))
+        if not isinstance(context, dict):
+            raise ValueError('context must be an object')
+        validate(template, segment, days=days, context=context)
+    except (TypeError, ValueError) as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = enqueue(
+        'notifications.fan_out',
+        {'template_id': template.pk, 'segment': segment, 'days': days, 'context': context},
+        user=request.user,
+    )
+    return Response({'job': JobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def unread_notifications_count(request):
-    count = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).count()
-    
-    return Response({'unread_count': count})
+    # Счётчик из NotificationCounter, без COUNT по всей истории
+    return Response({'unread_count': counters.unread_count(request.user.pk)})
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def mark_all_as_read(request):
-    Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).update(is_read=True)
+    with transaction.atomic():
+        updated = Notification.objects.filter(
+            user=request.user,
+            is_read=False
+        ).update(is_read=True)
+        # .update() не вызывает сигналы
+        counters.adjust(request.user.pk, -updated)
     
     return Response({'message': 'Все уведомления отмечены как прочитанные'})
 
@@ -59,8 +118,9 @@ def mark_as_read(request, notification_id):
             id=notification_id,
             user=request.user
         )
-        notification.is_read = True
-        notification.save()
+        if not notification.is_read:
+            notification.is_read = True
+            notification.save(update_fields=['is_read'])
         serializer = NotificationSerializer(notification)
         return Response(serializer.data)
     except Notification.DoesNotExist:
@@ -78,3 +138,62 @@ def create_notification(request):
         serializer.save(user=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def stream_ticket(request):
+    # EventSource не умеет слать заголовки: одноразовый билет вместо access-токена в URL
+    ticket, ttl = tickets.issue(request.user)
+    return Response({'ticket': ticket, 'expires_in': ttl})
+
+
+def _stream_user(request):
+    """User from ``?ticket=`` (see notifications.tickets) or the Authorization header."""
+    raw = request.GET.get('ticket')
+    if raw:
+        user_id = tickets.redeem(raw)
+        user = User.objects.filter(pk=user_id, is_active=True).only('pk').first() if user_id else None
+        if user is None:
+            raise AuthenticationFailed({'detail': 'Билет недействителен или уже использован', 'code': 'ticket_invalid'})
+        return user
+    result = ClaimsJWTAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+def _sse(data, event=None) -> str:
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events with new notifications and unread-count changes
+    (see notifications.realtime). Replaces polling ``unread-count/``.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not isinstance(request, ASGIRequest) or not realtime.stream_available():
+        # Under WSGI the stream would hold a worker for good; the frontend polls instead
+        return JsonResponse({'detail': 'Поток уведомлений недоступен', 'code': 'stream_unavailable'}, status=501)
+    try:
+        user = await sync_to_async(_stream_user)(request)
+    except AuthenticationFailed as e:
+        detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        return JsonResponse(detail, status=401)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    async def events():
+        async with realtime.get_broker().subscribe(user.pk) as next_event:
+            # Subscribed before counting, so no change between the two is missed
+            unread = await sync_to_async(counters.unread_count)(user.pk)
+            yield _sse({'unread_count': unread}, 'unread')
+            while True:
+                event = await next_event(STREAM_HEARTBEAT)
+                yield _sse(event, event.get('type')) if event else ': ping\n\n'
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,104 @@
+"""
+Minimal OpenAI-compatible server for local testing of the AI chat endpoints.
+
+Implements POST /v1/chat/completions (plain and ``stream: true``) and echoes
+the last user message back, word by word, with configurable latency.
+
+Usage:
+    python scripts/fake_openai_server.py --port 8089 --ttft 0.3 --token-delay 0.05
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python -m uvicorn aieducation.asgi:application
+"""
+import argparse
+import json
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def reply_words(body):
+    last_user = ''
+    for m in reversed(body.get('messages') or []):
+        if m.get('role') == 'user':
+            last_user = m.get('content', '')
+            break
+    words = f"Echo: {last_user}".split(' ')
+    limit = body.get('max_tokens')
+    return words[:limit] if limit else words
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    ttft = 0.0
+    token_delay = 0.0
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status, payload):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _chunk(self, text):
+        raw = text.encode()
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            return self._json(404, {'error': {'message': 'not found'}})
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        words = reply_words(body)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {'id': completion_id, 'created': int(time.time()), 'model': body.get('model', 'fake')}
+        time.sleep(self.ttft)
+
+        if not body.get('stream'):
+            time.sleep(self.token_delay * len(words))
+            return self._json(200, {
+                **base,
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': ' '.join(words)}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(words), 'total_tokens': len(words)},
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i, word in enumerate(words):
+            delta = {'content': word if i == 0 else ' ' + word}
+            if i == 0:
+                delta['role'] = 'assistant'
+            chunk = {**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+            self._chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(self.token_delay)
+        final = {**base, 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+        self._chunk(f"data: {json.dumps(final)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--ttft', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.03, help='Seconds between tokens')
+    args = parser.parse_args()
+
+    Handler.ttft = args.ttft
+    Handler.token_delay = args.token_delay
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Fake OpenAI server on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
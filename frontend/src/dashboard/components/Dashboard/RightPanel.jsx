@@ -69,6 +69,7 @@ import {
 } from '@tabler/icons-react';
 import { motion } from 'framer-motion';
 import api, { API_BASE_URL } from '../../../shared/services/api';
+import educationApi from '../../../shared/api/educationApi';
 import { useDashboardStore } from '../../../store/dashboardStore';
 import AIMentorChat from './components/AIMentorChat.jsx';
 
@@ -94,7 +95,7 @@ const RightPanel = ({ activeSection, currentProgress, isMobile = false, activeTa
   const loadingNotif = useNotificationsStore((s) => s.loading?.notifications);
   const errorNotif = useNotificationsStore((s) => s.errors?.notifications);
   const fetchNotifications = useNotificationsStore((s) => s.fetchNotifications);
-  const fetchUnreadCount = useNotificationsStore((s) => s.fetchUnreadCount);
+  const subscribeNotifications = useNotificationsStore((s) => s.subscribe);
   const markAllAsReadZ = useNotificationsStore((s) => s.markAllAsRead);
   const markAsReadZ = useNotificationsStore((s) => s.markAsRead);
 
@@ -112,20 +113,29 @@ const RightPanel = ({ activeSection, currentProgress, isMobile = false, activeTa
     if (isAuthenticated) {
       dispatch(fetchAIRecommendations());
       fetchNotifications();
-      fetchUnreadCount();
       dispatch(fetchAchievements());
       dispatch(fetchDashboardStats());
     }
     // fetch* are stable from zustand; do not include full store
-  }, [dispatch, isAuthenticated, fetchNotifications, fetchUnreadCount]);
+  }, [dispatch, isAuthenticated, fetchNotifications]);
 
-  // Fallback: if no AI recommendations were returned, ask backend to generate demo ones once
+  // Unread count and new notifications arrive over the push stream (no polling)
+  useEffect(() => {
+    if (!isAuthenticated) return undefined;
+    return subscribeNotifications();
+  }, [isAuthenticated, subscribeNotifications]);
+
+  // Fallback: if no AI recommendations were returned, ask backend to generate them once
+  const generateRequested = useRef(false);
   useEffect(() => {
     if (!isAuthenticated) return;
     const tryGenerate = async () => {
       try {
-        if (Array.isArray(aiRecommendations) && aiRecommendations.length === 0) {
-          await api.post('/api/education/generate-ai-recommendations/', {});
+        if (Array.isArray(aiRecommendations) && aiRecommendations.length === 0 && !generateRequested.current) {
+          generateRequested.current = true;
+          // Generation runs as a background job; refetch once it has finished
+          const { data } = await api.post('/api/education/generate-ai-recommendations/', {});
+          await educationApi.waitForJob(data?.job);
           dispatch(fetchAIRecommendations());
         }
     } catch {
@@ -51,7 +51,7 @@ const TopActionButtons = ({ isMobile = false, isTablet = false }) => {
   const loadingNotif = useNotificationsStore((s) => s.loading?.notifications);
   const errorNotif = useNotificationsStore((s) => s.errors?.notifications);
   const fetchNotifications = useNotificationsStore((s) => s.fetchNotifications);
-  const fetchUnreadCount = useNotificationsStore((s) => s.fetchUnreadCount);
+  const subscribeNotifications = useNotificationsStore((s) => s.subscribe);
   const markAllAsReadZ = useNotificationsStore((s) => s.markAllAsRead);
   const markAsReadZ = useNotificationsStore((s) => s.markAsRead);
 
@@ -60,9 +60,14 @@ const TopActionButtons = ({ isMobile = false, isTablet = false }) => {
     if (isAuthenticated) {
       dispatch(fetchAIRecommendations());
       fetchNotifications();
-      fetchUnreadCount();
     }
-  }, [dispatch, isAuthenticated, fetchNotifications, fetchUnreadCount]);
+  }, [dispatch, isAuthenticated, fetchNotifications]);
+
+  // Unread count and new notifications arrive over the push stream (no polling)
+  useEffect(() => {
+    if (!isAuthenticated) return undefined;
+    return subscribeNotifications();
+  }, [isAuthenticated, subscribeNotifications]);
 
   const isLoadingAI = Boolean(loadingEdu?.aiRecommendations);
   const isLoadingNotif = Boolean(loadingNotif);
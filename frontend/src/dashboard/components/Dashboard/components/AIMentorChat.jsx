@@ -3,7 +3,8 @@ import { useSelector, useDispatch } from 'react-redux';
 import { Box, Stack, Text, Group, Textarea, ActionIcon, Avatar, ScrollArea, Alert, ThemeIcon, Card } from '@mantine/core';
 import { IconRobot, IconSend, IconChecks, IconAlertCircle, IconBulb, IconMessageCircle, IconX } from '@tabler/icons-react';
 import styles from '../RightPanel.module.css';
-import api, { API_BASE_URL } from '../../../../shared/services/api';
+import { API_BASE_URL } from '../../../../shared/services/api';
+import educationApi from '../../../../shared/api/educationApi';
 import { useAuth } from '../../../../shared/hooks/useAuth';
 import { useDashboardStore } from '../../../../store/dashboardStore';
 import { fetchAIRecommendations, fetchAchievements, fetchDashboardStats, fetchUniversities } from '../../../../store/educationSlice';
@@ -45,21 +46,25 @@ const AIMentorChat = ({ showHeader = false, title = 'Чат с AIMentor', fullHe
     } catch {}
   }, [user?.id]);
 
-  // Persist chat to localStorage and best-effort backend save
+  // Persist chat to localStorage (for display; the backend keeps the history itself)
   useEffect(() => {
     const key = user?.id ? `aimentor_chat_${user.id}` : 'aimentor_chat_guest';
     try {
       localStorage.setItem(key, JSON.stringify(chatHistory));
     } catch {}
-    // Optional backend persistence (ignore errors)
-    const save = async () => {
-      try {
-        await api.post('/api/education/ai/conversations/save/', { messages: chatHistory });
-      } catch {}
-    };
-    if (chatHistory.length) save();
   }, [chatHistory, user?.id]);
 
+  // Server-side conversation id: only the new message is sent each turn
+  const conversationKey = user?.id ? `aimentor_conversation_${user.id}` : null;
+  const [conversationId, setConversationId] = useState(null);
+  useEffect(() => {
+    let stored = null;
+    try {
+      stored = conversationKey ? localStorage.getItem(conversationKey) : null;
+    } catch {}
+    setConversationId(stored);
+  }, [conversationKey]);
+
   // Ensure base data exists
   useEffect(() => {
     if (!isAuthenticated) return;
@@ -182,22 +187,53 @@ const AIMentorChat = ({ showHeader = false, title = 'Чат с AIMentor', fullHe
 
     setIsTyping(true);
     try {
-      const payload = {
-        messages: [
-          { role: 'system', content: 'Ты — дружелюбный помощник по учебе. Отвечай кратко и по делу. Обращайся по имени.' },
-          ...(studentContext ? [{ role: 'system', content: studentContext }] : []),
-          ...chatHistory.map(m => ({ role: m.role, content: m.content })),
-          { role: 'user', content: message }
-        ],
-        model: 'gpt-4o-mini',
-        temperature: 0.7,
-        max_tokens: 1650,
+      const system = [
+        'Ты — дружелюбный помощник по учебе. Отвечай кратко и по делу. Обращайся по имени.',
+        ...(studentContext ? [studentContext] : []),
+      ];
+      const options = { model: 'gpt-4o-mini', temperature: 0.7, max_tokens: 1650 };
+      // Авторизованные пользователи: история хранится на сервере, отправляем только новое сообщение
+      const payload = conversationKey
+        ? { ...options, message, system, ...(conversationId && { conversation_id: conversationId }) }
+        : {
+            ...options,
+            messages: [
+              ...system.map((content) => ({ role: 'system', content })),
+              ...chatHistory.map(m => ({ role: m.role, content: m.content })),
+              { role: 'user', content: message }
+            ],
+          };
+      const onDone = (data) => {
+        if (!conversationKey || !data.conversation_id) return;
+        const id = String(data.conversation_id);
+        setConversationId(id);
+        try {
+          localStorage.setItem(conversationKey, id);
+        } catch {}
       };
-      const res = await api.post('/api/education/ai/chat/', payload);
-      const assistant = res.data?.content || 'Не удалось получить ответ.';
+      // Ответ приходит потоком: показываем текст по мере генерации
       const ts = Date.now();
-      setChatHistory((prev) => [...prev, { id: ts, role: 'assistant', content: assistant, timestamp: ts }]);
+      let started = false;
+      const assistant = await educationApi.streamChat(payload, (_delta, content) => {
+        if (!started) {
+          started = true;
+          setIsTyping(false);
+          setChatHistory((prev) => [...prev, { id: ts, role: 'assistant', content, timestamp: ts }]);
+        } else {
+          setChatHistory((prev) => prev.map((m) => (m.id === ts ? { ...m, content } : m)));
+        }
+      }, { onDone });
+      if (!started) {
+        setChatHistory((prev) => [...prev, { id: ts, role: 'assistant', content: assistant || 'Не удалось получить ответ.', timestamp: ts }]);
+      }
     } catch (e) {
+      // Разговор удалён на сервере: следующее сообщение начнёт новый
+      if (conversationKey && String(e?.message).includes('404')) {
+        setConversationId(null);
+        try {
+          localStorage.removeItem(conversationKey);
+        } catch {}
+      }
       const fallback = 'Произошла ошибка сервиса ИИ. Попробуйте позже.';
       const ts = Date.now();
       setChatHistory((prev) => [...prev, { id: ts, role: 'assistant', content: fallback, timestamp: ts }]);
@@ -60,7 +60,7 @@ const GeographyStep = ({ value, onChange, error }) => {
       
       try {
         console.log('GeographyStep: Fetching universities from real database...');
-        const res = await fetch(`${API_BASE_URL}/api/education/universities/?is_active=true&limit=1000`);
+        const res = await fetch(`${API_BASE_URL}/api/education/universities/?is_active=true&paginate=false`);
         
         if (!res.ok) {
           throw new Error(`Ошибка сети: ${res.status} ${res.statusText}`);
@@ -146,7 +146,7 @@ const ItalyMap = ({ selectedCity, onSelectCity, universities: propUniversities,
       try {
          console.log('ItalyMap: Fallback loading universities from real database...');
          // Получаем все университеты с увеличенным лимитом
-         const res = await fetch(`${API_BASE_URL}/api/education/universities/?is_active=true&limit=1000`);
+         const res = await fetch(`${API_BASE_URL}/api/education/universities/?is_active=true&paginate=false`);
          
          if (!res.ok) {
            throw new Error(`HTTP error! status: ${res.status}`);
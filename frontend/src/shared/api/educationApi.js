@@ -16,6 +16,13 @@ const detectBaseUrl = () => {
 };
 
 const API_BASE_URL = detectBaseUrl();
+// Статусы фоновых задач (/api/jobs/)
+const JOBS_BASE_URL = API_BASE_URL.replace(/\/education$/, '/jobs');
+// Стриминговый чат может обслуживаться отдельным ASGI-процессом (VITE_AI_STREAM_URL)
+const AI_STREAM_BASE_URL = (() => {
+  const envUrl = (import.meta.env?.VITE_AI_STREAM_URL || '').trim().replace(/\/$/, '');
+  return envUrl ? `${envUrl}/api/education` : API_BASE_URL;
+})();
 
 class EducationAPI {
   constructor() {
@@ -29,7 +36,7 @@ class EducationAPI {
 
   // Базовый метод для HTTP запросов с автоматическим обновлением токена
   async request(endpoint, options = {}) {
-    const url = `${this.baseURL}${endpoint}`;
+    const url = /^https?:\/\//.test(endpoint) ? endpoint : `${this.baseURL}${endpoint}`;
     let token = this.getAuthToken();
 
     console.log('EducationAPI request:', url, 'token:', !!token);
@@ -106,9 +113,9 @@ class EducationAPI {
 
   // Университеты
   async getUniversities(params = {}) {
-    // Устанавливаем большой лимит, чтобы получить все университеты
-    const paramsWithLimit = { ...params, limit: 1000 };
-    const queryString = new URLSearchParams(paramsWithLimit).toString();
+    // Отключаем курсорную пагинацию, чтобы получить все университеты
+    const paramsAll = { ...params, paginate: 'false' };
+    const queryString = new URLSearchParams(paramsAll).toString();
     return this.request(`/universities/${queryString ? '?' + queryString : ''}`);
   }
 
@@ -204,6 +211,17 @@ class EducationAPI {
     });
   }
 
+  // Фоновая задача: опрашиваем статус, пока она не завершится (или не выйдет время)
+  async waitForJob(job, { interval = 1000, timeout = 30000 } = {}) {
+    const deadline = Date.now() + timeout;
+    let current = job;
+    while (current && !['succeeded', 'failed'].includes(current.status) && Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, interval));
+      current = await this.request(`${JOBS_BASE_URL}/${job.id}/`);
+    }
+    return current;
+  }
+
   async updateAIRecommendation(id, data) {
     return this.request(`/ai-recommendations/${id}/`, {
       method: 'PUT',
@@ -267,6 +285,52 @@ class EducationAPI {
   async getDashboardStats() {
     return this.request('/dashboard/stats/');
   }
+
+  // Стриминговый ответ ИИ (SSE): onDelta вызывается для каждого фрагмента текста.
+  // onDone получает данные события done (например, conversation_id). Возвращает полный текст ответа.
+  async streamChat(payload, onDelta, { signal, onDone } = {}) {
+    let token = this.getAuthToken();
+    if (token && isTokenExpired(token)) {
+      token = await refreshToken();
+    }
+    const response = await fetch(`${AI_STREAM_BASE_URL}/ai/chat/stream/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        ...(token && { Authorization: `Bearer ${token}` }),
+      },
+      body: JSON.stringify(payload),
+      signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let content = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const event of events) {
+        const dataLine = event.split('\n').find((line) => line.startsWith('data:'));
+        if (!dataLine) continue;
+        const data = JSON.parse(dataLine.slice(5));
+        if (data.error) throw new Error(data.error);
+        if (data.delta) {
+          content += data.delta;
+          onDelta?.(data.delta, content);
+        }
+        if (data.done) onDone?.(data);
+      }
+    }
+    return content;
+  }
 }
 
 export default new EducationAPI();
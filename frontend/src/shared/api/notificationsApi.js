@@ -16,6 +16,13 @@ const detectBaseUrl = () => {
 };
 
 const API_BASE_URL = detectBaseUrl();
+// Push-канал обслуживает ASGI-процесс (как и стриминговый чат), если он вынесен отдельно
+const STREAM_BASE_URL = (() => {
+  const envUrl = (import.meta.env?.VITE_STREAM_URL || import.meta.env?.VITE_AI_STREAM_URL || '').trim().replace(/\/$/, '');
+  return envUrl ? `${envUrl}/api/notifications` : API_BASE_URL;
+})();
+// Пауза перед переподключением после обрыва потока
+const STREAM_RETRY_MS = 5000;
 
 class NotificationsAPI {
   constructor() {
@@ -29,7 +36,7 @@ class NotificationsAPI {
 
   // Базовый метод для HTTP запросов с автоматическим обновлением токена
   async request(endpoint, options = {}) {
-    const url = `${this.baseURL}${endpoint}`;
+    const url = /^https?:\/\//.test(endpoint) ? endpoint : `${this.baseURL}${endpoint}`;
     let token = this.getAuthToken();
 
     // Проверяем, не истек ли токен
@@ -101,8 +108,9 @@ class NotificationsAPI {
   }
 
   // Уведомления
-  async getNotifications() {
-    return this.request('/');
+  // Курсорная пагинация: первая страница без COUNT по всей истории
+  async getNotifications(cursorUrl = null) {
+    return this.request(cursorUrl || '/?paginate=cursor');
   }
 
   async getNotification(id) {
@@ -125,6 +133,75 @@ class NotificationsAPI {
     return this.request('/unread-count/');
   }
 
+  // 501 от stream/: поток не обслуживается (WSGI без ASGI-процесса или нет общего брокера).
+  // EventSource не показывает статус ответа, поэтому он проверяется отдельным запросом.
+  async isStreamUnavailable(url) {
+    const controller = new AbortController();
+    try {
+      const response = await fetch(url, { signal: controller.signal });
+      return response.status === 501;
+    } catch {
+      return false;
+    } finally {
+      // Тело (если поток всё же открылся) не читаем
+      controller.abort();
+    }
+  }
+
+  // Server-Sent Events: onEvent(type, data) для 'unread', 'notification', 'resync';
+  // 'unavailable' — поток не поддерживается сервером, нужно перейти на опрос.
+  // EventSource не умеет слать заголовки, поэтому в ?ticket= передаётся одноразовый
+  // билет на несколько секунд (POST stream/ticket/), а не access-токен.
+  // Возвращает функцию, закрывающую поток.
+  openStream(onEvent) {
+    let source = null;
+    let retryTimer = null;
+    let closed = false;
+
+    const connect = async () => {
+      if (closed || !this.getAuthToken()) return;
+      let ticket;
+      try {
+        ({ ticket } = await this.request('/stream/ticket/', { method: 'POST' }));
+      } catch {
+        if (!closed) retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+        return;
+      }
+      if (closed || !ticket) return;
+      const url = `${STREAM_BASE_URL}/stream/?ticket=${encodeURIComponent(ticket)}`;
+      let opened = false;
+      source = new EventSource(url);
+      source.onopen = () => {
+        opened = true;
+      };
+      ['unread', 'notification', 'resync'].forEach((type) => {
+        source.addEventListener(type, (event) => {
+          try {
+            onEvent(type, JSON.parse(event.data));
+          } catch {}
+        });
+      });
+      source.onerror = async () => {
+        // Переподключение браузера с тем же (уже использованным) билетом получит 401,
+        // поэтому после любого обрыва поток открывается заново с новым билетом
+        if (closed) return;
+        source.close();
+        if (!opened && (await this.isStreamUnavailable(url))) {
+          if (!closed) onEvent('unavailable', {});
+          return;
+        }
+        if (!closed) retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }
+
   async createNotification(data) {
     return this.request('/create/', {
       method: 'POST',
@@ -15,7 +15,19 @@ const detectBaseUrl = () => {
 
 const API_BASE_URL = detectBaseUrl();
 
-export const refreshToken = async () => {
+// Refresh-токен одноразовый (ротация на сервере): параллельные вызовы ждут один запрос
+let refreshInFlight = null;
+
+export const refreshToken = () => {
+  if (!refreshInFlight) {
+    refreshInFlight = doRefreshToken().finally(() => {
+      refreshInFlight = null;
+    });
+  }
+  return refreshInFlight;
+};
+
+const doRefreshToken = async () => {
   const refreshTokenValue = localStorage.getItem('refreshToken');
   
   if (!refreshTokenValue) {
@@ -39,8 +51,11 @@ export const refreshToken = async () => {
 
     const data = await response.json();
     
-    // Сохраняем новый токен
+    // Сохраняем новые токены (старый refresh после ротации недействителен)
     localStorage.setItem('accessToken', data.access);
+    if (data.refresh) {
+      localStorage.setItem('refreshToken', data.refresh);
+    }
     
     return data.access;
   } catch (error) {
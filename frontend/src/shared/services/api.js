@@ -1,6 +1,7 @@
 // DEBUG: Updated at 2025-09-07T07:46:52.964Z
 // This should show the correct URL: /api/auth/profile/
 import axios from 'axios';
+import { refreshToken as refreshAccessToken } from '../api/tokenUtils';
 
 // Resolve API base URL
 const getApiUrl = () => {
@@ -88,20 +89,8 @@ api.interceptors.response.use(
       originalRequest._retry = true;
       
       try {
-        const refreshToken = localStorage.getItem('refreshToken');
-        if (!refreshToken) {
-          throw new Error('No refresh token');
-        }
-        
-        const response = await api.post('/api/auth/token/refresh/', {
-          refresh: refreshToken
-        });
-
-        const { access, refresh } = response.data;
-        localStorage.setItem('accessToken', access);
-        if (refresh) {
-          localStorage.setItem('refreshToken', refresh);
-        }
+        // Общий запрос ротации: параллельные 401 не тратят один refresh дважды
+        const access = await refreshAccessToken();
         
         originalRequest.headers.Authorization = `Bearer ${access}`;
         return api(originalRequest);
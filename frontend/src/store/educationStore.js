@@ -291,8 +291,9 @@ const useEducationStore = create((set, get) => ({
 
   generateAIRecommendations: async () => {
     try {
-      await educationApi.generateAIRecommendations();
-      // Обновляем список рекомендаций после генерации
+      const result = await educationApi.generateAIRecommendations();
+      // Генерация идёт в фоне: ждём завершения задачи и обновляем список
+      await educationApi.waitForJob(result?.job);
       get().fetchAIRecommendations();
     } catch (error) {
       throw error;
@@ -1,11 +1,20 @@
 import { create } from 'zustand';
 import notificationsApi from '../shared/api/notificationsApi';
 
+// Один поток на вкладку, сколько бы компонентов его ни запросили
+let streamSubscribers = 0;
+let closeStream = null;
+// Опрос счётчика, если сервер не отдаёт поток (WSGI или нет общего брокера)
+let pollTimer = null;
+const POLL_INTERVAL_MS = 30000;
+
 const useNotificationsStore = create((set, get) => ({
   // Состояние
   notifications: [],
   templates: [],
   unreadCount: 0,
+  // Пока открыт push-поток, счётчик приходит с сервера и локально не меняется
+  streaming: false,
   
   // Состояние загрузки
   loading: {
@@ -69,7 +78,7 @@ const useNotificationsStore = create((set, get) => ({
     try {
       const result = await notificationsApi.createNotification(data);
       set((state) => ({
-        notifications: [result, ...state.notifications],
+        notifications: [result, ...state.notifications.filter((n) => n.id !== result.id)],
       }));
       return result;
     } catch (error) {
@@ -105,7 +114,7 @@ const useNotificationsStore = create((set, get) => ({
           ...notification,
           is_read: true,
         })),
-        unreadCount: 0,
+        unreadCount: state.streaming ? state.unreadCount : 0,
       }));
     } catch (error) {
       throw error;
@@ -121,13 +130,50 @@ const useNotificationsStore = create((set, get) => ({
             ? { ...notification, is_read: true }
             : notification
         ),
-        unreadCount: Math.max(0, state.unreadCount - 1),
+        unreadCount: state.streaming ? state.unreadCount : Math.max(0, state.unreadCount - 1),
       }));
     } catch (error) {
       throw error;
     }
   },
 
+  // Push-канал (SSE) вместо опроса unread-count; возвращает функцию отписки
+  subscribe: () => {
+    streamSubscribers += 1;
+    if (!closeStream) {
+      set({ streaming: true });
+      closeStream = notificationsApi.openStream((type, data) => {
+        if (type === 'unread') {
+          set((state) => ({
+            unreadCount: data.unread_count ?? Math.max(0, state.unreadCount + (data.unread_delta || 0)),
+          }));
+        } else if (type === 'notification') {
+          set((state) => ({
+            notifications: [data.notification, ...state.notifications.filter((n) => n.id !== data.notification.id)],
+            unreadCount: state.unreadCount + (data.unread_delta || 0),
+          }));
+        } else if (type === 'resync') {
+          get().fetchNotifications();
+          get().fetchUnreadCount();
+        } else if (type === 'unavailable') {
+          set({ streaming: false });
+          get().fetchUnreadCount();
+          pollTimer = setInterval(() => get().fetchUnreadCount(), POLL_INTERVAL_MS);
+        }
+      });
+    }
+    return () => {
+      streamSubscribers -= 1;
+      if (streamSubscribers === 0 && closeStream) {
+        closeStream();
+        closeStream = null;
+        clearInterval(pollTimer);
+        pollTimer = null;
+        set({ streaming: false });
+      }
+    };
+  },
+
   // Действия для шаблонов
   fetchTemplates: async () => {
     set((state) => ({
@@ -162,6 +208,7 @@ const useNotificationsStore = create((set, get) => ({
       notifications: [],
       templates: [],
       unreadCount: 0,
+      streaming: Boolean(closeStream) && !pollTimer,
       loading: {
         notifications: false,
         templates: false,